@@ -28,6 +28,15 @@ setup(
             'pyaudio',
             'pydub'
         ],
+        # Optional ONNX Runtime backends for the VectorDB text embedding model
+        'onnx': [
+            'onnx',
+            'onnxruntime'
+        ],
+        # Optional HTTP/2 connections of the provider HTTP clients
+        'http2': [
+            'h2'
+        ],
         # Packaged for tool chain, Claude tools and model training libraries
         # These are axperimental and not implemented in the verbalai run flow at the moment
         # but there are tests that can be run with the trained intent prediction model
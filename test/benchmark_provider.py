@@ -0,0 +1,83 @@
+# benchmark_provider.py - A module to benchmark the language model providers offline against the local fake provider server
+import time
+import argparse
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+# Library imports
+from verbalai.LLMProvider import AnthropicProvider, OpenAIProvider, create_anthropic_client, create_openai_client, http2_available
+from verbalai.HedgedProvider import HedgedProvider
+from verbalai.fake_provider_server import ServerThread
+from verbalai.RateLimiter import configure_rate_limiter, parse_rate_limit, report as rate_limit_report
+
+
+def stream_request(provider, model, prompt, max_tokens):
+    """Stream a single response and measure the time to the first token and the total time."""
+    messages = [{"role": "user", "content": [{"type": "text", "text": prompt}]}]
+    start_time = time.perf_counter()
+    first_token_time = None
+    with provider.stream(model, "You are a benchmark assistant.", messages, max_tokens, purpose="response") as stream:
+        for _ in stream.text_stream:
+            if first_token_time is None:
+                first_token_time = time.perf_counter() - start_time
+    return first_token_time, time.perf_counter() - start_time, stream.usage is not None
+
+
+def percentiles(values):
+    """Get the P50, P95, and maximum of the values in milliseconds."""
+    return f"p50 {np.percentile(values, 50) * 1000:.1f} ms, p95 {np.percentile(values, 95) * 1000:.1f} ms, max {np.max(values) * 1000:.1f} ms"
+
+
+def run_benchmark(provider, model, requests, concurrency, max_tokens):
+    """Run the requests with the concurrency and print the latency percentiles."""
+    start_time = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(lambda i: stream_request(provider, model, f"Benchmark prompt {i}", max_tokens), range(requests)))
+    elapsed = time.perf_counter() - start_time
+    print(f"\n{provider.name}: {requests} requests, concurrency {concurrency}, {requests / elapsed:.1f} requests/s")
+    print(f"    Time to first token: {percentiles([result[0] for result in results])}")
+    print(f"    Total time: {percentiles([result[1] for result in results])}")
+    print(f"    Usage reported: {sum(result[2] for result in results)}/{requests}")
+    if isinstance(provider, HedgedProvider):
+        print(f"    {provider.report()}")
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Benchmark the streamed responses of the language model providers against the local fake provider server, without network.")
+
+    parser.add_argument("-n", "--requests", type=int, default=50, help="Number of the requests per provider.")
+    parser.add_argument("-c", "--concurrency", type=int, default=4, help="Number of the concurrent requests.")
+    parser.add_argument("-r", "--recordings", type=str, default=None, help="JSON Lines file of the recorded responses to replay.")
+    parser.add_argument("-ff", "--first_token_delay", type=float, default=0.3, help="Seconds before the first token of the fake response.")
+    parser.add_argument("-ft", "--token_delay", type=float, default=0.02, help="Seconds between the tokens of the fake response.")
+    parser.add_argument("-sr", "--stall_rate", type=float, default=0.0, help="Share of the fake responses stalled before the first token.")
+    parser.add_argument("-sd", "--stall_delay", type=float, default=5.0, help="Seconds a stalled fake response waits before the first token.")
+    parser.add_argument("-hs", "--hedge_slo", type=float, default=None, help="Time to the first token in seconds after which a hedged request is sent. Requests are not hedged by default.")
+    parser.add_argument("-mt", "--max_tokens", type=int, default=256, help="Maximum tokens of the response.")
+    parser.add_argument("-rl", "--rate_limits", type=str, nargs="+", default=[], help="Rate limits of the providers in the format provider=requests:tokens:in_flight per minute, for example: anthropic=600:200000:2")
+    parser.add_argument("-p", "--providers", type=str, nargs="+", default=["anthropic", "openai"], help="Providers to benchmark: anthropic, openai.")
+
+    args = parser.parse_args()
+
+    for rate_limit in args.rate_limits:
+        configure_rate_limiter(*parse_rate_limit(rate_limit))
+
+    server = ServerThread(recordings_file=args.recordings, first_token_delay=args.first_token_delay, token_delay=args.token_delay, stall_rate=args.stall_rate, stall_delay=args.stall_delay)
+    server.start()
+    print(f"HTTP/2 available: {http2_available()}")
+
+    def hedged(provider):
+        """Hedge the provider with duplicate requests, when the SLO is given."""
+        return HedgedProvider(provider, latency_slos={"response": args.hedge_slo}) if args.hedge_slo else provider
+
+    if "anthropic" in args.providers:
+        provider = hedged(AnthropicProvider(create_anthropic_client(server.url, "fake")))
+        run_benchmark(provider, "claude-3-haiku-20240307", args.requests, args.concurrency, args.max_tokens)
+    if "openai" in args.providers:
+        provider = hedged(OpenAIProvider(create_openai_client(f"{server.url}/v1", "fake")))
+        run_benchmark(provider, "gpt-3.5-turbo", args.requests, args.concurrency, args.max_tokens)
+
+    if args.rate_limits:
+        print(f"\n{rate_limit_report()}")
+
+    server.shutdown()
@@ -0,0 +1,85 @@
+# test_embedder.py - A module to test parity and benchmark the text embedding backends
+import sys
+import time
+import argparse
+import yaml
+import numpy as np
+# Library imports
+from verbalai.TextEmbedder import create_embedder, embedding_backends
+# Import log lonfig as a side effect only
+from verbalai.log_config import setup_logging
+import logging
+logger = logging.getLogger(__name__)
+log_level = logging.INFO
+# Only set up logging if no handlers are configured yet
+if not logging.getLogger().hasHandlers():
+    setup_logging(log_level)
+
+
+def load_phrases(file_path):
+    """Load the test phrases from the commands data file."""
+    with open(file_path, 'r') as file:
+        data = yaml.safe_load(file)
+    return [phrase for phrases in data['commands'].values() for phrase in phrases]
+
+
+def cosine_similarity(a, b):
+    """Calculate the cosine similarity of two vectors."""
+    return float(np.dot(a, b) / (np.linalg.norm(a) * np.linalg.norm(b)))
+
+
+def benchmark_backend(backend, model_name, phrases, repeat):
+    """Load the backend and measure the model load time and per-query latencies."""
+    start_time = time.perf_counter()
+    embedder = create_embedder(backend, model_name)
+    load_time = time.perf_counter() - start_time
+
+    # The first query pays the lazy kernel initialization, exclude it from the latencies
+    embedder.encode(phrases[0])
+
+    vectors, times = [], []
+    for _ in range(repeat):
+        vectors = []
+        for phrase in phrases:
+            start_time = time.perf_counter()
+            vectors.append(np.asarray(embedder.encode(phrase), dtype=np.float32))
+            times.append(time.perf_counter() - start_time)
+    return vectors, load_time, times
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Test the cosine similarity parity of the embedding backends against the torch backend and benchmark their latency.")
+    parser.add_argument("-b", "--backends", type=str, nargs='+', choices=embedding_backends, default=embedding_backends, help="Embedding backends to test")
+    parser.add_argument("-m", "--model_name", type=str, default="sentence-transformers/all-MiniLM-L6-v2", help="Hugging Face model name or path")
+    parser.add_argument("-f", "--test_file", type=str, default="data/test_commands.yaml", help="Path to the file with the test phrases")
+    parser.add_argument("-r", "--repeat", type=int, default=3, help="How many times the test phrases are vectorized for the latency benchmark")
+    parser.add_argument("-st", "--similarity_threshold", type=float, default=0.99, help="Minimum accepted cosine similarity against the torch backend")
+    args = parser.parse_args()
+
+    phrases = load_phrases(args.test_file)
+    print(f"Loaded {len(phrases)} test phrases")
+
+    # Reference vectors are always produced with the original torch backend
+    backends = ["torch"] + [backend for backend in args.backends if backend != "torch"]
+
+    results = {}
+    for backend in backends:
+        print(f"\n-----Benchmarking backend: {backend}-----")
+        results[backend] = benchmark_backend(backend, args.model_name, phrases, args.repeat)
+
+    failed = False
+    reference_vectors = results["torch"][0]
+    print("\nSummary:")
+    for backend, (vectors, load_time, times) in results.items():
+        similarities = [cosine_similarity(a, b) for a, b in zip(reference_vectors, vectors)]
+        passed = min(similarities) >= args.similarity_threshold
+        failed = failed or not passed
+        print(f"    {backend}:")
+        print(f"        Model load time: {load_time:.4f} seconds")
+        print(f"        Average query latency: {np.mean(times) * 1000:.2f} ms")
+        print(f"        P50 / P95 query latency: {np.percentile(times, 50) * 1000:.2f} / {np.percentile(times, 95) * 1000:.2f} ms")
+        print(f"        Cosine similarity to torch (min / mean): {min(similarities):.5f} / {np.mean(similarities):.5f} {'✓' if passed else '✗'}")
+        logger.info(f"Embedding backend {backend}: load {load_time:.4f} s, average query {np.mean(times):.4f} s, min similarity {min(similarities):.5f}")
+
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,54 @@
+# test_json_stream.py - A module to test the incremental JSON stream parser with randomly chunked metadata responses
+import sys
+import json
+import random
+import argparse
+# Library imports
+from verbalai.json_stream import JSONStreamParser
+
+# Metadata response with an intro text, nested arguments, and escaped characters in the strings
+test_response = 'Here is the metadata {for you}:\n' + json.dumps({
+    "topics": ["databases", "tools"],
+    "sentiment": {"positive_score": 0.7, "negative_score": 0.1},
+    "intent": "retrieve",
+    "system_requires_more_information_to_use_tools": False,
+    "tools": [
+        {"tool": "find_dialogue_units", "arguments": {"phrase": "brace } and [bracket]", "sentiment": {"positive_score": ">0.5"}}, "details_are_missing": False, "arguments_relies_on_previous_tool_results": False},
+        {"tool": "retrieve_data_entry", "arguments": {"field": "key", "value": "quote \" and comma, here"}, "details_are_missing": False, "arguments_relies_on_previous_tool_results": False},
+        {"tool": "find_discussions", "arguments": {"category": ["a", "b"]}, "details_are_missing": True, "arguments_relies_on_previous_tool_results": True}
+    ]
+}, indent=2) + '\nAnything after the JSON block is ignored: {"tools": [{"tool": "extra"}]}'
+
+
+def chunk_text(text, max_chunk_size):
+    """Split the text to random sized chunks, like the tokens of a language model stream."""
+    chunks, position = [], 0
+    while position < len(text):
+        size = random.randint(1, max_chunk_size)
+        chunks.append(text[position:position + size])
+        position += size
+    return chunks
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Test that the incremental JSON stream parser reports each tools[i] entry as soon as it is complete, for randomly chunked text streams.")
+    parser.add_argument("-r", "--repeat", type=int, default=200, help="How many randomly chunked streams are tested")
+    parser.add_argument("-c", "--max_chunk_size", type=int, default=12, help="Maximum size of a chunk in characters")
+    args = parser.parse_args()
+
+    expected_tools = json.loads(test_response[test_response.index("{\n"):test_response.rindex("}\nAnything") + 1])["tools"]
+    failed = 0
+    for _ in range(args.repeat):
+        chunks = chunk_text(test_response, args.max_chunk_size)
+        reported = []
+        stream_parser = JSONStreamParser("tools", lambda index, item: reported.append((index, item, stream_parser.position)))
+        for chunk in chunks:
+            stream_parser.feed(chunk)
+        # Each tool must be reported before the whole top level object has been streamed
+        end_of_object = test_response.rindex("}\nAnything")
+        if [(index, item) for index, item, _ in reported] != list(enumerate(expected_tools)) or any(position > end_of_object for _, _, position in reported):
+            failed += 1
+            print(f"✗ Unexpected tools for the chunks: {chunks}")
+    print(f"{'✓' if not failed else '✗'} {args.repeat - failed}/{args.repeat} randomly chunked streams parsed correctly.")
+    sys.exit(1 if failed else 0)
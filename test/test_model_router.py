@@ -0,0 +1,105 @@
+# test_model_router.py - A module to evaluate the response model routing rules offline against the recorded sessions
+import sys
+import glob
+import json
+import argparse
+import numpy as np
+# Library imports
+from verbalai.ModelRouter import ModelRouter, load_router_rules
+from verbalai.gpt_token_calculator import token_prices, count_tokens
+from verbalai.prompts import tool_schemas
+
+
+def load_sessions(pattern):
+    """Load the turns of each recorded inference.jsonl session file."""
+    sessions = []
+    for file_path in sorted(glob.glob(pattern)):
+        with open(file_path, 'r') as file:
+            turns = [json.loads(line) for line in file if line.strip()]
+        if turns:
+            sessions.append((file_path, turns))
+    return sessions
+
+
+def replay_session(router, turns, tool_names):
+    """Route the recorded turns and estimate the input and output tokens of each turn."""
+    results, history_tokens = [], 0
+    for i, turn in enumerate(turns):
+        # Intent is the tool name, when a tool was called in the turn
+        signals = {
+            "words": len(turn["prompt"].split()),
+            "intent": turn.get("intent", ""),
+            "tools": 1 if turn.get("intent", "") in tool_names else 0,
+            # Each turn adds a user and an assistant message to the history
+            "history": 2 * i,
+            "final": turn.get("final", True)
+        }
+        model, rule = router.route(signals)
+        input_tokens = history_tokens + count_tokens(turn["prompt"])
+        output_tokens = count_tokens(turn["response"])
+        history_tokens = input_tokens + output_tokens
+        results.append({
+            "model": model,
+            "rule": rule,
+            "recorded": turn.get("route", {}),
+            "timing": turn.get("timing", {}),
+            "input_tokens": input_tokens,
+            "output_tokens": output_tokens,
+            "prompt": turn["prompt"]
+        })
+    return results
+
+
+def estimate_cost(model, input_tokens, output_tokens):
+    """Estimate the cost of a call in dollars."""
+    prices = token_prices.get(model, {"input": 0.0, "output": 0.0})
+    return (prices["input"] * input_tokens + prices["output"] * output_tokens) / 1000000
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Evaluate the response model routing rules offline against the recorded inference.jsonl sessions.")
+    parser.add_argument("-r", "--router_rules", type=str, default="data/router_rules.json", help="JSON file of the routing rules")
+    parser.add_argument("-m", "--gpt_model", type=str, default="claude-3-sonnet-20240229", help="Default model of the turns no rule matches, and the baseline model")
+    parser.add_argument("-s", "--sessions", type=str, default="archive/*/inference.jsonl", help="Glob pattern of the recorded session files")
+    parser.add_argument("-e", "--examples", type=int, default=3, help="How many example prompts are printed per rule")
+    args = parser.parse_args()
+
+    router = ModelRouter(load_router_rules(args.router_rules), args.gpt_model)
+    tool_names = {tool for group in tool_schemas.values() for tool in group["schemas"]}
+
+    sessions = load_sessions(args.sessions)
+    if not sessions:
+        print(f"No recorded sessions found: {args.sessions}")
+        sys.exit(1)
+
+    results = [result for _, turns in sessions for result in replay_session(router, turns, tool_names)]
+    print(f"Loaded {len(results)} turns from {len(sessions)} sessions")
+
+    print("\nRouted turns by rule:")
+    for rule in dict.fromkeys(result["rule"] for result in results):
+        routed = [result for result in results if result["rule"] == rule]
+        print(f"    {rule} → {routed[0]['model']}: {len(routed)} turns ({len(routed) / len(results) * 100:.1f}%)")
+        for result in routed[:args.examples]:
+            print(f"        - {result['prompt'][:80]}")
+
+    routed_cost = sum(estimate_cost(result["model"], result["input_tokens"], result["output_tokens"]) for result in results)
+    baseline_cost = sum(estimate_cost(args.gpt_model, result["input_tokens"], result["output_tokens"]) for result in results)
+    print("\nEstimated cost:")
+    print(f"    Baseline ({args.gpt_model}): ${baseline_cost:.4f}")
+    print(f"    Routed: ${routed_cost:.4f} ({(1 - routed_cost / baseline_cost) * 100 if baseline_cost else 0:.1f}% saved)")
+
+    # Sessions recorded with a router include the routed rule and model of each turn
+    recorded = [result for result in results if result["recorded"]]
+    if recorded:
+        agreement = sum(result["recorded"].get("rule") == result["rule"] for result in recorded) / len(recorded)
+        print(f"\nAgreement with the recorded routing: {agreement * 100:.1f}% of {len(recorded)} turns")
+        print("\nRecorded response latency by model:")
+        for model in dict.fromkeys(result["recorded"].get("model") for result in recorded):
+            durations = [
+                result["timing"].get("response_duration", result["timing"].get("restarted_response_duration"))
+                for result in recorded if result["recorded"].get("model") == model
+            ]
+            durations = [duration for duration in durations if duration is not None]
+            if durations:
+                print(f"    {model}: P50 / P95 {np.percentile(durations, 50):.3f} / {np.percentile(durations, 95):.3f} seconds ({len(durations)} turns)")
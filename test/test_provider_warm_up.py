@@ -0,0 +1,51 @@
+# test_provider_warm_up.py - A module to test the connection warm-up of the language model providers against the local fake provider server
+import sys
+import time
+import argparse
+# Library imports
+from verbalai.LLMProvider import AnthropicProvider, OpenAIProvider, create_anthropic_client, create_openai_client
+from verbalai.fake_provider_server import ServerThread
+from verbalai.startup import LazyComponent
+
+
+def warm_up(provider):
+    """Warm up the connection of the provider, and return the error, or None when the warm-up succeeded."""
+    start_time = time.perf_counter()
+    try:
+        provider.warm_up()
+    except Exception as e:
+        print(f"{provider.name}: warm-up failed; {e}")
+        return e
+    print(f"{provider.name}: warm-up succeeded in {(time.perf_counter() - start_time) * 1000:.1f} ms")
+    return None
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Test the connection warm-up of the language model providers against the local fake provider server, without network.")
+
+    parser.add_argument("-p", "--providers", type=str, nargs="+", default=["anthropic", "openai"], help="Providers to test: anthropic, openai.")
+
+    args = parser.parse_args()
+
+    server = ServerThread()
+    server.start()
+
+    factories = {
+        "anthropic": (AnthropicProvider, lambda: create_anthropic_client(server.url, "fake")),
+        "openai": (OpenAIProvider, lambda: create_openai_client(f"{server.url}/v1", "fake"))
+    }
+
+    errors = []
+    for name in args.providers:
+        provider_class, factory = factories[name]
+        # Application creates the clients lazily on the first use, test also the plain client
+        for client in [LazyComponent(f"{name} client", factory), factory()]:
+            error = warm_up(provider_class(client))
+            if error:
+                errors.append(error)
+
+    server.shutdown()
+
+    print(f"\n{len(errors)} warm-up errors.")
+    sys.exit(1 if errors else 0)
@@ -0,0 +1,85 @@
+# BudgetGovernor.py - A Python module for limiting the language model spending of a session.
+import threading
+
+# Import log lonfig as a side effect only
+from verbalai import log_config
+import logging
+logger = logging.getLogger(__name__)
+
+
+class BudgetExceededError(Exception):
+    """ Raised when a language model call is not allowed by the session budget. """
+
+
+class BudgetGovernor:
+    """
+    Limits the language model spending of a session based on the actual cost of the calls.
+
+    Spending is recorded by the token calculator, see GPTTokenCalculator. As the spending
+    approaches the soft limit, the response requests are planned with a smaller context window.
+    After the soft limit, the responses are also shorter and generated with the fallback model.
+    After the hard limit, or a purpose specific limit (response, feedback, metadata, summary, tool),
+    the calls are refused with BudgetExceededError. Limits are in dollars, None is unlimited.
+    """
+
+    def __init__(self, soft_limit=None, hard_limit=None, purpose_limits={}, fallback_model=None, approach_ratio=0.8):
+        self.hard_limit = hard_limit
+        # Without a soft limit, the economy starts before the hard limit
+        self.soft_limit = soft_limit if soft_limit is not None or hard_limit is None else hard_limit * approach_ratio
+        self.purpose_limits = dict(purpose_limits)
+        self.fallback_model = fallback_model
+        self.approach_ratio = approach_ratio
+        self.spent = 0.0
+        self.spent_by_purpose = {}
+        self.level = "normal"
+        self.lock = threading.Lock()
+
+    def record(self, purpose, cost):
+        """ Record the cost of a call. """
+        with self.lock:
+            self.spent += cost
+            self.spent_by_purpose[purpose] = self.spent_by_purpose.get(purpose, 0.0) + cost
+            level = self.get_level()
+            if level != self.level:
+                logger.info(f"Budget level changed from {self.level} to {level}, spent ${self.spent:.4f} (soft limit: {self.soft_limit}, hard limit: {self.hard_limit}).")
+                self.level = level
+
+    def get_level(self):
+        """ Get the spending level: normal, approaching, soft_limit, or hard_limit. """
+        if self.hard_limit is not None and self.spent >= self.hard_limit:
+            return "hard_limit"
+        if self.soft_limit is not None and self.spent >= self.soft_limit:
+            return "soft_limit"
+        if self.soft_limit is not None and self.spent >= self.soft_limit * self.approach_ratio:
+            return "approaching"
+        return "normal"
+
+    def check(self, purpose):
+        """ Raise BudgetExceededError, if the call of the purpose is not allowed. """
+        with self.lock:
+            if self.hard_limit is not None and self.spent >= self.hard_limit:
+                reason = f"session hard limit ${self.hard_limit} reached"
+            elif purpose in self.purpose_limits and self.spent_by_purpose.get(purpose, 0.0) >= self.purpose_limits[purpose]:
+                reason = f"{purpose} limit ${self.purpose_limits[purpose]} reached"
+            else:
+                return
+        logger.info(f"Budget refused a {purpose} call: {reason}.")
+        raise BudgetExceededError(f"Budget exceeded: {reason}.")
+
+    def plan(self, purpose, model, max_tokens, context_token_budget):
+        """
+        Check the budget and plan the model, the maximum output tokens, and the context token
+        budget of a response request. Returns them as a tuple, downgraded as the limits approach.
+        """
+        self.check(purpose)
+        with self.lock:
+            level = self.get_level()
+        if level == "normal":
+            return model, max_tokens, context_token_budget
+        planned_model, planned_max_tokens = model, max_tokens
+        planned_context_token_budget = context_token_budget // 2
+        if level in ["soft_limit", "hard_limit"]:
+            planned_model = self.fallback_model or model
+            planned_max_tokens = max(50, max_tokens // 2)
+        logger.info(f"Budget {level} (spent ${self.spent:.4f}): {purpose} planned with model {planned_model} instead of {model}, {planned_max_tokens}/{max_tokens} max tokens, and {planned_context_token_budget}/{context_token_budget} context tokens.")
+        return planned_model, planned_max_tokens, planned_context_token_budget
@@ -0,0 +1,206 @@
+# ContextWindowManager.py - A Python module for keeping the conversation messages sent to the language model under a token budget.
+import json
+import threading
+
+# Import log lonfig as a side effect only
+from verbalai import log_config
+import logging
+logger = logging.getLogger(__name__)
+
+# Input token budgets for the conversation messages and the system message per model name prefix.
+# Budget does not limit the conversation length, older turns are sent as a rolling summary.
+context_token_budgets = {
+    "claude-3-haiku": 16000,
+    "claude-3-sonnet": 8000,
+    "claude-3-opus": 6000,
+    "gpt-3.5-turbo": 8000,
+    "gpt-4": 6000,
+}
+
+# Budget for the models not listed above
+default_context_token_budget = 8000
+
+# Tool outputs are given to the language model as user messages with this prefix
+tool_output_prefix = "User role: system. Output:"
+
+
+def get_context_token_budget(model):
+    """ Get the input token budget of the model. """
+    for prefix, budget in context_token_budgets.items():
+        if model.startswith(prefix):
+            return budget
+    return default_context_token_budget
+
+
+class ContextWindowManager:
+    """
+    Builds the messages of a language model request from the conversation history under a token budget.
+
+    The most recent messages are kept verbatim, and the older messages are replaced by a rolling
+    summary of the conversation, see add_summary. Consecutive messages of the same role, and their
+    text blocks, are merged into one. Tokens are estimated as four characters per token.
+
+    Tool outputs older than tool_output_turns user turns, or older tool outputs when the budget is
+    tight, are replaced by a stub telling the tool and the arguments to call the tool again, see
+    register_tool_output. Session messages are not modified.
+    """
+
+    def __init__(self, token_budget=default_context_token_budget, summary_share=0.25, tool_output_turns=2):
+        self.token_budget = token_budget
+        # Maximum share of the budget for the rolling summary
+        self.summary_share = summary_share
+        self.tool_output_turns = tool_output_turns
+        # Summaries of the conversation as (end index of the summarized messages, summary text)
+        self.summaries = []
+        # Tool and arguments of the tool output messages by the message id
+        self.tool_outputs = {}
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def estimate_tokens(text):
+        """ Estimate the number of tokens in the text. """
+        return len(text) // 4 + 1
+
+    def message_tokens(self, message):
+        """ Estimate the number of tokens in the message, including a small overhead for the role. """
+        return 4 + sum(self.estimate_tokens(block["text"]) for block in message["content"] if block["type"] == "text")
+
+    @staticmethod
+    def is_tool_output(block):
+        """ Is the content block a tool output. """
+        return block["type"] == "text" and block["text"].startswith(tool_output_prefix)
+
+    def register_tool_output(self, message, tool, arguments):
+        """ Register the tool and the arguments of the tool output message for its eviction stub. """
+        with self.lock:
+            self.tool_outputs[id(message)] = (tool, arguments)
+
+    def tool_output_stub(self, message):
+        """ Get the text replacing the evicted tool output of the message. """
+        with self.lock:
+            tool, arguments = self.tool_outputs.get(id(message), (None, None))
+        if tool is None:
+            return f"{tool_output_prefix} Earlier tool output was removed from the conversation history. Call the tool again, if the output is needed."
+        return f"{tool_output_prefix} Output of the tool '{tool}' with the arguments {json.dumps(arguments, ensure_ascii=False)} was removed from the conversation history. Call the tool again, if the output is needed."
+
+    def evict_tool_outputs(self, messages, budget):
+        """
+        Replace the stale tool outputs of the messages with stubs. Tool outputs are stale after
+        tool_output_turns user turns, or at the first later user turn, when the messages do not fit
+        in the budget. Tool outputs of the current turn are never evicted.
+        """
+        # Age of each message as the number of the later user prompts
+        ages, age = [0] * len(messages), 0
+        for index in range(len(messages) - 1, -1, -1):
+            ages[index] = age
+            message = messages[index]
+            if message["role"] == "user" and any(not self.is_tool_output(block) for block in message["content"]):
+                age += 1
+
+        def evict(message):
+            stub = self.tool_output_stub(message)
+            content = [
+                {"type": "text", "text": stub} if self.is_tool_output(block) and len(stub) < len(block["text"]) else block
+                for block in message["content"]
+            ]
+            return {"role": message["role"], "content": content}
+
+        candidates = [
+            index for index, message in enumerate(messages)
+            if message["role"] == "user" and ages[index] > 0 and any(self.is_tool_output(block) for block in message["content"])
+        ]
+        result, evicted = list(messages), 0
+        for index in candidates:
+            if ages[index] >= self.tool_output_turns:
+                result[index] = evict(messages[index])
+                evicted += 1
+        # Oldest tool outputs first, until the messages fit in the budget
+        total = sum(self.message_tokens(message) for message in result)
+        for index in candidates:
+            if total <= budget:
+                break
+            if result[index] is messages[index]:
+                result[index] = evict(messages[index])
+                total -= self.message_tokens(messages[index]) - self.message_tokens(result[index])
+                evicted += 1
+        if evicted:
+            logger.info(f"Context window: {evicted} stale tool outputs evicted.")
+        return result
+
+    def add_summary(self, summary, end_index):
+        """ Add the summary of the messages before the end index to the rolling summary. """
+        with self.lock:
+            self.summaries.append((end_index, summary.strip()))
+
+    def clear(self):
+        """ Clear the summaries, when the conversation history is cleared. """
+        with self.lock:
+            self.summaries = []
+            self.tool_outputs = {}
+
+    def rolling_summary(self, max_tokens):
+        """ Get the end index of the summarized messages and the latest summaries that fit in the token limit. """
+        with self.lock:
+            summaries = list(self.summaries)
+        if not summaries:
+            return 0, ""
+        texts, tokens = [], 0
+        for _, summary in reversed(summaries):
+            tokens += self.estimate_tokens(summary)
+            if texts and tokens > max_tokens:
+                break
+            texts.insert(0, summary)
+        return summaries[-1][0], "\n\n".join(texts)
+
+    @staticmethod
+    def merge_messages(messages):
+        """ Merge the consecutive messages of the same role, and the consecutive text blocks of a message. """
+        merged = []
+        for message in messages:
+            content = [dict(block) for block in message["content"] if block["type"] != "text" or block["text"].strip()]
+            if not content:
+                continue
+            if merged and merged[-1]["role"] == message["role"]:
+                merged[-1]["content"].extend(content)
+            else:
+                merged.append({"role": message["role"], "content": content})
+        for message in merged:
+            content = []
+            for block in message["content"]:
+                if content and block["type"] == "text" and content[-1]["type"] == "text":
+                    content[-1]["text"] += "\n\n" + block["text"]
+                else:
+                    content.append(block)
+            message["content"] = content
+        return merged
+
+    def build(self, messages, system="", token_budget=None):
+        """ Build the request messages from the conversation history, so that they fit with the system message in the token budget. """
+        token_budget = token_budget or self.token_budget
+        budget = token_budget - self.estimate_tokens(system)
+        summarized_index, summary = self.rolling_summary(int(budget * self.summary_share))
+        if summary:
+            summary = f"Summary of the earlier conversation:\n{summary}"
+        budget -= self.estimate_tokens(summary)
+        messages = self.evict_tool_outputs(messages, budget)
+
+        # Keep the most recent messages, newest first, until the budget is used or the messages
+        # are covered by the rolling summary. The latest message is kept in any case.
+        kept = []
+        for index in range(len(messages) - 1, -1, -1):
+            tokens = self.message_tokens(messages[index])
+            if kept and (index < summarized_index or tokens > budget):
+                break
+            kept.insert(0, messages[index])
+            budget -= tokens
+
+        dropped = len(messages) - len(kept)
+        if dropped and summary:
+            kept.insert(0, {"role": "user", "content": [{"type": "text", "text": summary}]})
+        # Conversation must start with a user message
+        while kept and kept[0]["role"] != "user":
+            kept.pop(0)
+
+        request_messages = self.merge_messages(kept)
+        logger.info(f"Context window: {len(request_messages)} messages, ~{token_budget - budget} tokens with the system message, {dropped} older messages {'summarized' if summary else 'dropped'}.")
+        return request_messages
@@ -0,0 +1,270 @@
+# ConversationOrchestrator.py - A Python module for running a conversation on an asyncio event loop.
+import time
+import asyncio
+import itertools
+import threading
+import numpy as np
+
+from .TurnScheduler import Turn
+
+# Import log lonfig as a side effect only
+from verbalai import log_config
+import logging
+logger = logging.getLogger(__name__)
+
+
+class ConversationOrchestrator:
+    """
+    Runs a conversation on an asyncio event loop of its own thread, instead of a thread per
+    hotkey and the polling loops.
+
+    Events, like the transcripts and the hotkeys, are posted from any thread with post, and
+    dispatched in order to the event handlers, which are coroutine functions that take the
+    orchestrator and the event payload. Handlers run as tasks of the loop, and the state of
+    the conversation, like the word buffer and the pending feedback, is only accessed from the
+    loop, so it needs no locks. Blocking queues, like the transcript queue of a recorder, are
+    bridged to the events with bridge.
+
+    Turns are executed one at a time by priority, like in TurnScheduler, and the blocking turn
+    functions run in a worker thread. Turn function takes the cancellation event of the turn.
+    Cancellation is structured: a cancelled task cancels its turn, the event of the turn is set,
+    and the next turn starts only after the cancelled turn function has returned. Intermediate
+    feedback is debounced, see FeedbackScheduler, and newer speech cancels the feedback task.
+    """
+
+    def __init__(self, run_feedback, feedback_debounce=0.5, name="conversation"):
+        self.run_feedback = run_feedback
+        self.feedback_debounce = feedback_debounce
+        self.name = name
+        self.handlers = {}
+        self.tasks = set()
+        self.bridges = []
+        # Conversation state owned by the loop
+        self.word_buffer = []
+        self.print_buffer = []
+        self.pending_feedback = []
+        self.feedback_task = None
+        # Queued feedback turn and its text
+        self.feedback_turn = None
+        self.feedback_text = None
+        # Turn in execution, and the queue wait times and the preempted counts by the turn kind
+        self.current = None
+        self.sequence = itertools.count()
+        self.wait_times = {}
+        self.preempted = {}
+        # Statistics of the feedback requests
+        self.feedback_started = 0
+        self.feedback_superseded = 0
+        self.loop = asyncio.new_event_loop()
+        self.ready = threading.Event()
+        self.thread = threading.Thread(target=self.run, name=f"{name}-loop", daemon=True)
+        self.thread.start()
+        self.ready.wait()
+
+    def on(self, kind, handler):
+        """ Set the coroutine function handling the events of the kind. """
+        self.handlers[kind] = handler
+
+    def post(self, kind, payload=None):
+        """ Post the event to the loop. Safe to call from any thread. """
+        if not self.loop.is_closed():
+            self.loop.call_soon_threadsafe(self.events.put_nowait, (kind, payload))
+
+    def bridge(self, queue, kind):
+        """ Post the items of the blocking queue as the events of the kind, until a None item. """
+        def forward():
+            while True:
+                item = queue.get()
+                if item is None:
+                    return
+                self.post(kind, item)
+        thread = threading.Thread(target=forward, name=f"{self.name}-{kind}", daemon=True)
+        thread.start()
+        self.bridges.append((queue, thread))
+
+    def run(self):
+        """ Run the event loop until stopped. """
+        asyncio.set_event_loop(self.loop)
+        self.events = asyncio.Queue()
+        self.turns = asyncio.PriorityQueue()
+        self.loop.create_task(self.dispatch(), name=f"{self.name}-events")
+        self.loop.create_task(self.execute_turns(), name=f"{self.name}-turns")
+        self.loop.call_soon(self.ready.set)
+        self.loop.run_forever()
+        self.loop.close()
+
+    def spawn(self, coroutine, name=None):
+        """ Run the coroutine as a task of the conversation. Errors of the task are logged. """
+        task = self.loop.create_task(coroutine, name=name)
+        self.tasks.add(task)
+        task.add_done_callback(self.task_done)
+        return task
+
+    def task_done(self, task):
+        """ Forget the finished task and log its error. """
+        self.tasks.discard(task)
+        if not task.cancelled() and task.exception():
+            logger.error(f"Error on task {task.get_name()}; {task.exception()}")
+
+    async def dispatch(self):
+        """ Dispatch the posted events to their handlers in order. """
+        while True:
+            kind, payload = await self.events.get()
+            handler = self.handlers.get(kind)
+            if handler:
+                self.spawn(handler(self, payload), name=kind)
+            else:
+                logger.warning(f"No handler for the event '{kind}'.")
+
+    async def execute_turns(self):
+        """ Execute the queued turns one at a time in a worker thread. """
+        while True:
+            _, _, turn = await self.turns.get()
+            if turn.future.done() or turn.cancelled.is_set():
+                turn.state = "skipped"
+                continue
+            turn.state = "running"
+            turn.started_time = time.perf_counter()
+            self.current = turn
+            self.wait_times.setdefault(turn.kind, []).append(turn.wait_time())
+            work = asyncio.ensure_future(asyncio.to_thread(turn.func, turn.cancelled))
+            try:
+                turn.result = await asyncio.shield(work)
+            except asyncio.CancelledError:
+                # Turn function is not interrupted, the loop stops only after it has returned
+                turn.cancelled.set()
+                await asyncio.gather(work, return_exceptions=True)
+                raise
+            except Exception as e:
+                turn.error = e
+            finally:
+                turn.state = "done"
+                self.current = None
+                turn.done.set()
+            if not turn.future.done():
+                if turn.error:
+                    turn.future.set_exception(turn.error)
+                else:
+                    turn.future.set_result(turn.result)
+
+    async def run_turn(self, kind, func, preemptible=False):
+        """
+        Queue the turn, preempt the less urgent turn in execution, and wait for its result.
+        Cancelling the waiting task cancels the turn.
+        """
+        return await self.wait_turn(self.queue_turn(kind, func, preemptible))
+
+    def queue_turn(self, kind, func, preemptible=False):
+        """ Queue the turn, and preempt the less urgent turn in execution. Returns the turn. """
+        turn = Turn(kind, func, preemptible=preemptible)
+        turn.future = self.loop.create_future()
+        current = self.current
+        if current and current.preemptible and current.priority > turn.priority and not current.cancelled.is_set():
+            current.cancelled.set()
+            self.preempted[current.kind] = self.preempted.get(current.kind, 0) + 1
+            logger.info(f"Turn '{current.kind}' preempted by '{kind}'.")
+        self.turns.put_nowait((turn.priority, next(self.sequence), turn))
+        return turn
+
+    async def wait_turn(self, turn):
+        """ Wait for the result of the queued turn. Cancelling the waiting task cancels the turn. """
+        try:
+            return await asyncio.shield(turn.future)
+        except asyncio.CancelledError:
+            turn.cancelled.set()
+            raise
+
+    async def run_blocking(self, func, *args):
+        """ Run the blocking function, like the console input, in a worker thread. """
+        return await asyncio.to_thread(func, *args)
+
+    def feedback_busy(self):
+        """ Is a feedback request pending or in flight. """
+        return bool(self.pending_feedback) or bool(self.feedback_task and not self.feedback_task.done())
+
+    def submit_feedback(self, text):
+        """ Queue the text for the feedback request, and cancel the feedback task pending or in flight. """
+        self.pending_feedback.append(text)
+        self.cancel_feedback_task()
+        self.feedback_task = self.spawn(self.debounce_feedback(), name="feedback")
+
+    def cancel_feedback_task(self):
+        """
+        Cancel the feedback task. Feedback in flight is counted as superseded. Text of the feedback
+        turn that has not started yet is put back in front of the pending feedback texts.
+        """
+        if self.feedback_task and not self.feedback_task.done():
+            if self.feedback_turn and self.feedback_turn.state == "queued":
+                # Skipped by the turn loop, even if it runs before the cancelled task
+                self.feedback_turn.cancelled.set()
+                self.pending_feedback.insert(0, self.feedback_text)
+            elif self.current and self.current.kind == "feedback":
+                self.feedback_superseded += 1
+                logger.info("Feedback request in flight cancelled.")
+            self.feedback_task.cancel()
+
+    def take_feedback(self):
+        """ Cancel the pending and in-flight feedback before a final request. Returns the pending text that was not sent yet. """
+        self.cancel_feedback_task()
+        text = " ".join(self.pending_feedback)
+        self.pending_feedback.clear()
+        return text
+
+    async def debounce_feedback(self):
+        """ Send the feedback request after no new text has arrived for the debounce seconds. """
+        await asyncio.sleep(self.feedback_debounce)
+        text = " ".join(self.pending_feedback)
+        self.pending_feedback.clear()
+        self.feedback_started += 1
+        self.feedback_turn = self.queue_turn("feedback", lambda cancelled: self.run_feedback(text, cancelled), preemptible=True)
+        self.feedback_text = text
+        return await self.wait_turn(self.feedback_turn)
+
+    def current_wait(self):
+        """ Seconds the turn in execution waited in the queue, or None. """
+        current = self.current
+        return round(current.wait_time(), 4) if current else None
+
+    def metrics(self):
+        """ Get the count, mean, P50, P95, and maximum of the queue wait in seconds, and the preempted count, by the turn kind. """
+        return {
+            kind: {
+                "count": len(waits),
+                "mean": round(float(np.mean(waits)), 4),
+                "p50": round(float(np.percentile(waits, 50)), 4),
+                "p95": round(float(np.percentile(waits, 95)), 4),
+                "max": round(float(np.max(waits)), 4),
+                "preempted": self.preempted.get(kind, 0)
+            }
+            for kind, waits in dict(self.wait_times).items()
+        }
+
+    async def shutdown(self):
+        """ Cancel the tasks of the conversation and wait for them, and the turn in execution, to finish. """
+        self.cancel_feedback_task()
+        self.pending_feedback.clear()
+        if self.current and self.current.preemptible:
+            self.current.cancelled.set()
+        tasks = [task for task in asyncio.all_tasks(self.loop) if task is not asyncio.current_task()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def stop(self, timeout=30):
+        """ Stop the bridges and the loop after the turn in execution. Queued turns are not executed. """
+        for queue, _ in self.bridges:
+            queue.put(None)
+        if self.thread.is_alive():
+            future = asyncio.run_coroutine_threadsafe(self.shutdown(), self.loop)
+            try:
+                future.result(timeout=timeout)
+            except Exception as e:
+                logger.error(f"Error shutting down the conversation {self.name}; {e}")
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self.thread.join(timeout=timeout)
+        logger.info(f"Conversation {self.name} stopped, {self.feedback_superseded}/{self.feedback_started} feedback requests cancelled.")
+        logger.info(f"Turn queue wait by kind: {self.metrics()}")
+
+    def wait(self):
+        """ Block until the loop has stopped. """
+        self.thread.join()
@@ -22,6 +22,7 @@ from deepgram import (
 # Library imports
 # Import log lonfig as a side effect only
 from .log_config import setup_logging
+from .RateLimiter import get_rate_limiter
 import logging
 logger = logging.getLogger(__name__)
 
@@ -201,7 +202,10 @@ class AudioRecorder:
             diarize=True,
         )
         
-        if self.dg_connection.start(options) is False:
+        # Opening of the live connection is counted as a request of the rate limits
+        with get_rate_limiter("deepgram").limit():
+            started = self.dg_connection.start(options)
+        if started is False:
             print("Failed to start connection")
             return
     
@@ -260,7 +264,8 @@ class AudioRecorder:
             smart_format=True,
         )
         # Call the transcribe_file method with the text payload and options
-        response = deepgram.listen.prerecorded.v("1").transcribe_file(payload, options)
+        with get_rate_limiter("deepgram").limit():
+            response = deepgram.listen.prerecorded.v("1").transcribe_file(payload, options)
         # Print the response to buffer, queue, and log
         transcript = response["results"]["channels"][0]["alternatives"][0]["transcript"]
         self.text_queue.put(transcript)
@@ -279,7 +284,8 @@ class AudioRecorder:
             smart_format=True,
         )
         # Call the transcribe_url method with the text payload and options
-        response = deepgram.listen.prerecorded.v("1").transcribe_url(payload, options)
+        with get_rate_limiter("deepgram").limit():
+            response = deepgram.listen.prerecorded.v("1").transcribe_url(payload, options)
         # Output the response to buffer, queue, and log
         transcript = response["results"]["channels"][0]["alternatives"][0]["transcript"]
         self.text_queue.put(transcript)
@@ -304,8 +310,9 @@ class AudioRecorder:
             utterance_end_ms="1500",
             vad_events=True
         )
-        # Start the Deepgram connection
-        self.dg_connection.start(options)
+        # Start the Deepgram connection, counted as a request of the rate limits
+        with get_rate_limiter("deepgram").limit():
+            self.dg_connection.start(options)
         # Create and start microphone
         self.microphone = Microphone(self.dg_connection.send)
         self.microphone.start()
@@ -316,6 +323,9 @@ class AudioRecorder:
 
         print("# Listening started. Feel free to speak your thoughts aloud.")
         
+        if kwargs.get("on_listening_started"):
+            kwargs["on_listening_started"]()
+        
         try:
             # wait until finished
             input("############################################################\n")
@@ -0,0 +1,119 @@
+# FeedbackScheduler.py - A Python module for debouncing and cancelling the intermediate feedback requests.
+import time
+import threading
+
+# Import log lonfig as a side effect only
+from verbalai import log_config
+import logging
+logger = logging.getLogger(__name__)
+
+
+class FeedbackScheduler:
+    """
+    Runs the intermediate feedback requests in a background thread, off the transcript thread.
+
+    Submitted texts are collected until no new text has arrived for debounce seconds, and then
+    sent as a single feedback request. Newer speech cancels the feedback request in flight, and
+    a final request cancels both the pending and the in-flight feedback, so that only the latest
+    feedback ever reaches the screen. A single feedback request runs at a time.
+
+    The run_feedback argument is a function that takes the text and the cancellation event. It
+    should stop, and not output anything, as soon as the event is set. It returns False, when the
+    request was cancelled before the text was sent, and the text is then put back in front of the
+    pending texts, so that the next feedback or the final request includes it.
+    """
+
+    def __init__(self, run_feedback, debounce=0.5):
+        self.run_feedback = run_feedback
+        self.debounce = debounce
+        # Texts not sent yet, and the time the latest of them was submitted
+        self.pending = []
+        self.submitted_time = None
+        # Cancellation event of the feedback request in flight
+        self.cancelled = None
+        self.running = False
+        self.active = True
+        self.condition = threading.Condition()
+        # Statistics of the feedback requests
+        self.started = 0
+        self.superseded = 0
+        self.thread = threading.Thread(target=self.run, name="feedback-scheduler", daemon=True)
+        self.thread.start()
+
+    def submit(self, text):
+        """ Queue the text for the feedback request, and cancel the feedback request in flight. """
+        with self.condition:
+            self.pending.append(text)
+            self.submitted_time = time.time()
+            self.cancel_running()
+            self.condition.notify_all()
+
+    def busy(self):
+        """ Is a feedback request pending or in flight. """
+        with self.condition:
+            return bool(self.pending) or self.running
+
+    def cancel_running(self):
+        """ Cancel the feedback request in flight. Called with the condition held. """
+        if self.running and not self.cancelled.is_set():
+            self.cancelled.set()
+            self.superseded += 1
+            logger.info("Feedback request in flight cancelled.")
+
+    def cancel(self, timeout=10):
+        """
+        Cancel the pending and in-flight feedback before a final request, and wait for the
+        cancelled request to stop. Returns the pending text that was not sent yet.
+        """
+        with self.condition:
+            self.submitted_time = None
+            self.cancel_running()
+            self.condition.notify_all()
+            # Final request must not modify the messages at the same time as the feedback
+            self.condition.wait_for(lambda: not self.running, timeout=timeout)
+            # Text of the cancelled request that was not sent is back in the pending texts
+            text = " ".join(self.pending)
+            self.pending.clear()
+        return text
+
+    def run(self):
+        """ Send the debounced feedback requests until stopped. """
+        while True:
+            with self.condition:
+                while self.active:
+                    # Pending text without the submitted time waits for the final request, see cancel
+                    if self.pending and not self.running and self.submitted_time is not None:
+                        remaining = self.submitted_time + self.debounce - time.time()
+                        if remaining <= 0:
+                            break
+                        self.condition.wait(timeout=remaining)
+                    else:
+                        self.condition.wait()
+                if not self.active:
+                    return
+                text = " ".join(self.pending)
+                self.pending.clear()
+                self.cancelled = threading.Event()
+                self.running = True
+                self.started += 1
+                cancelled = self.cancelled
+            sent = True
+            try:
+                sent = self.run_feedback(text, cancelled) is not False
+            except Exception as e:
+                logger.error(f"Error on feedback request; {e}")
+            finally:
+                with self.condition:
+                    if not sent:
+                        self.pending.insert(0, text)
+                    self.running = False
+                    self.condition.notify_all()
+
+    def stop(self):
+        """ Stop the scheduler and cancel the feedback request in flight. """
+        with self.condition:
+            self.active = False
+            self.pending.clear()
+            self.cancel_running()
+            self.condition.notify_all()
+        logger.info(f"Feedback scheduler stopped, {self.superseded}/{self.started} feedback requests cancelled.")
@@ -6,6 +6,8 @@ import wave
 import subprocess
 import urllib.request
 from queue import Empty
+from functools import lru_cache
+from contextlib import nullcontext
 from multiprocessing import Process, Queue
 from speech_recognition import (
     Recognizer, 
@@ -25,6 +27,8 @@ import logging
 logger = logging.getLogger(__name__)
 
 # Check if ffmpeg is installed
+# The result is cached so that the subprocess is spawned only once and only when needed
+@lru_cache(maxsize=None)
 def is_ffmpeg_installed():
     try:
         subprocess.run(["ffmpeg", "-version"], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
@@ -34,10 +38,9 @@ def is_ffmpeg_installed():
 
 
 # Additional imports for file and URL processing
+# Note: ffmpeg availability is checked only when MP3 files are processed
 try:
     from pydub import AudioSegment
-    if not is_ffmpeg_installed():
-        raise ImportError("ffmpeg is required for MP3 processing but not found. Download from: https://ffmpeg.org/")
 except ImportError as e:
     AudioSegment = None
     ffmpeg_error = str(e)
@@ -322,7 +325,7 @@ class AudioRecorder:
         audio_data = AudioData(frames.tobytes(), audio_segment.frame_rate, audio_segment.sample_width)
         self.audio_queue.put(audio_data)
     
-    def start_listening(self, phrase_time_limit=5, feedback_word_buffer_limit=0, calibration_time=1, save_audio_to_file=None, **kwargs):
+    def start_listening(self, phrase_time_limit=5, feedback_word_buffer_limit=0, calibration_time=1, save_audio_to_file=None, on_listening_started=None, startup_profiler=None, **kwargs):
         """
         Initiates the audio listening process, capturing audio input from the microphone in 
         the background and processing the audio data for speech recognition.
@@ -344,12 +347,16 @@ class AudioRecorder:
         including calibration for ambient noise and the setting for phrase recognition time 
         limit. It also informs the user about the interaction controls for triggering final 
         inference and exiting the listening mode.
+
+        Optional on_listening_started callback is called when the listening has started, 
+        and optional startup_profiler measures the microphone calibration time.
         """
         
         self.microphone = Microphone()
-        with self.microphone as source:
-            print(f"# Calibrating {calibration_time} seconds for ambient noise...")
-            self.recognizer.adjust_for_ambient_noise(source, duration=calibration_time)
+        with startup_profiler.measure("microphone_calibration") if startup_profiler else nullcontext():
+            with self.microphone as source:
+                print(f"# Calibrating {calibration_time} seconds for ambient noise...")
+                self.recognizer.adjust_for_ambient_noise(source, duration=calibration_time)
         
         def callback(recognizer, audio):
             if self.toggle_listener and not self.pause:
@@ -367,6 +374,9 @@ class AudioRecorder:
             print(f"# Every {feedback_word_buffer_limit} words will be analyzed for a short feedback.")
 
         self.worker_process.start()
+        
+        if on_listening_started:
+            on_listening_started()
 
     def cleanup(self):
         """
@@ -0,0 +1,278 @@
+# HedgedProvider.py - A Python module for hedging the slow language model requests against the latency SLOs.
+import time
+import threading
+from queue import Queue, Empty
+from collections import deque
+from contextlib import contextmanager
+import numpy as np
+
+from .LLMProvider import LLMProvider
+from .RateLimiter import RateLimitCancelled, cancel_poll_interval
+
+# Import log lonfig as a side effect only
+from verbalai import log_config
+import logging
+logger = logging.getLogger(__name__)
+
+# Latency SLOs in seconds by the call purpose. Streamed calls are measured by the time to
+# the first token, and completed calls by the total time. Summaries are not hedged,
+# since they are generated in the background.
+default_latency_slos = {"response": 2.0, "feedback": 1.5, "metadata": 4.0, "tool": 4.0}
+
+# End of the stream of an attempt
+done = object()
+
+# Attempt has acquired its slot of the rate limiter and the request is sent
+acquired = object()
+
+
+class LatencyStats:
+    """ Latency samples of the calls by the purpose and the metric, with the percentiles of the latest samples. """
+
+    def __init__(self, max_samples=1000):
+        self.max_samples = max_samples
+        self.samples = {}
+        self.lock = threading.Lock()
+
+    def add(self, purpose, metric, seconds):
+        """ Add the latency sample of the purpose and the metric, ttft or total. """
+        with self.lock:
+            self.samples.setdefault((purpose, metric), deque(maxlen=self.max_samples)).append(seconds)
+
+    def percentiles(self):
+        """ Get the count, P50, P90, P95, P99, and maximum of the latencies in seconds by the purpose and the metric. """
+        with self.lock:
+            samples = {key: list(values) for key, values in self.samples.items()}
+        return {
+            f"{purpose}.{metric}": {
+                "count": len(values),
+                **{f"p{q}": round(float(np.percentile(values, q)), 4) for q in (50, 90, 95, 99)},
+                "max": round(float(np.max(values)), 4)
+            }
+            for (purpose, metric), values in sorted(samples.items())
+        }
+
+
+class Attempt:
+    """ A request of the hedged call, executed in a background thread. """
+
+    def __init__(self, name, provider, model):
+        self.name = name
+        self.provider = provider
+        self.model = model
+        self.cancelled = threading.Event()
+        self.lock = threading.Lock()
+        # Stream or the response of the attempt, the error, and the state of the attempt
+        self.result = None
+        self.error = None
+        self.finished = False
+        self.discarded = False
+
+
+class HedgedProvider(LLMProvider):
+    """
+    Provider hedging the calls that exceed the latency SLO of their purpose.
+
+    When the primary request has not given its first token, or its response in the case of the
+    completed call, within the SLO, a hedged request is sent with the hedge model, or with the
+    same model, to the hedge provider. A failed primary request is hedged at once. The first
+    responder wins, and the other request is cancelled. Cancelled and late responses are given
+    to the on_discarded function with the purpose, so that their usage is counted too.
+
+    SLO clock starts when the primary request has acquired its slot of the rate limiter of the
+    provider, see RateLimiter, so that the time queued for the rate limits is not taken for
+    provider latency, and a saturated limiter does not trigger the hedges. A discarded attempt
+    still queued by the limiter leaves the queue without sending its request. Cancelling the call
+    with the cancelled event cancels all of its attempts, and on_acquired of the call is called
+    when the primary request has acquired its slot.
+
+    Latencies of all the calls, hedged or not, are recorded by the purpose for tuning the SLOs,
+    and the rate limit queue wait of the primary requests apart from them.
+    """
+
+    def __init__(self, primary, hedge=None, hedge_model=None, latency_slos=default_latency_slos, on_discarded=None):
+        self.primary = primary
+        self.hedge = hedge or primary
+        self.hedge_model = hedge_model
+        self.latency_slos = dict(latency_slos)
+        self.on_discarded = on_discarded
+        self.name = primary.name
+        self.client = primary.client
+        self.stats = LatencyStats()
+        self.lock = threading.Lock()
+        # Hedged requests sent and won by the purpose
+        self.hedged = {}
+        self.hedges_won = {}
+
+    def warm_up(self):
+        """ Open the connections of the primary and the hedge provider. """
+        self.primary.warm_up()
+        if self.hedge is not self.primary:
+            self.hedge.warm_up()
+
+    def start(self, attempts, name, provider, model, request):
+        """ Start the attempt in a background thread. """
+        attempt = Attempt(name, provider, model)
+        attempts.append(attempt)
+        threading.Thread(target=request, args=(attempt,), name=f"hedge-{name}", daemon=True).start()
+        return attempt
+
+    def start_hedge(self, attempts, model, purpose, request, reason):
+        """ Start the hedged request of the call. """
+        with self.lock:
+            self.hedged[purpose] = self.hedged.get(purpose, 0) + 1
+        logger.info(f"Hedged {purpose} request sent, {reason}.")
+        return self.start(attempts, "hedge", self.hedge, self.hedge_model or model, request)
+
+    def finish(self, attempt, purpose):
+        """ Mark the attempt finished, and give the response of a discarded attempt to on_discarded. """
+        with attempt.lock:
+            attempt.finished = True
+            discarded = attempt.discarded
+        if discarded and attempt.result is not None and self.on_discarded:
+            self.on_discarded(attempt.result, purpose)
+
+    def discard(self, attempts, winner, purpose):
+        """ Cancel the attempts other than the winner. Finished attempts are given to on_discarded. """
+        for attempt in attempts:
+            if attempt is winner:
+                continue
+            attempt.cancelled.set()
+            with attempt.lock:
+                attempt.discarded = True
+                finished = attempt.finished
+            if finished and attempt.result is not None and self.on_discarded:
+                self.on_discarded(attempt.result, purpose)
+        if winner is not None and winner.name == "hedge":
+            with self.lock:
+                self.hedges_won[purpose] = self.hedges_won.get(purpose, 0) + 1
+
+    def wait(self, items, attempts, model, purpose, request, call_time, cancelled=None, on_acquired=None):
+        """
+        Wait for the first item of an attempt that succeeds, and hedge the call when the SLO is exceeded.
+        Returns the winning attempt, its first item, and the time the primary request was sent.
+        Error of the last failed attempt is raised, and RateLimitCancelled when the call is cancelled.
+        """
+        slo = self.latency_slos.get(purpose)
+        # SLO clock starts when the primary request leaves the rate limit queue
+        start_time = None
+        while True:
+            if cancelled is not None and cancelled.is_set():
+                self.discard(attempts, None, purpose)
+                raise RateLimitCancelled(f"Hedged {purpose} request cancelled before the response.")
+            hedged = len(attempts) > 1
+            deadline = None if hedged or slo is None or start_time is None else start_time + slo
+            timeout = None if deadline is None else max(0, deadline - time.perf_counter())
+            if cancelled is not None:
+                timeout = cancel_poll_interval if timeout is None else min(timeout, cancel_poll_interval)
+            try:
+                attempt, item = items.get(timeout=timeout)
+            except Empty:
+                if deadline is not None and time.perf_counter() >= deadline:
+                    self.start_hedge(attempts, model, purpose, request, f"no response in {slo} seconds")
+                continue
+            if item is acquired:
+                if attempt.name == "primary":
+                    start_time = time.perf_counter()
+                    self.stats.add(purpose, "queue", start_time - call_time)
+                    if on_acquired:
+                        on_acquired()
+                continue
+            if isinstance(item, Exception):
+                attempt.error = item
+                if not hedged and slo is not None:
+                    self.start_hedge(attempts, model, purpose, request, f"{attempt.name} request failed: {item}")
+                    continue
+                if all(attempt.error for attempt in attempts):
+                    raise item
+                continue
+            return attempt, item, start_time or call_time
+
+    def next_item(self, items, winner, cancelled=None):
+        """ Get the next item of the winning attempt, or the end of the stream when the call is cancelled. """
+        while True:
+            if cancelled is not None and cancelled.is_set():
+                winner.cancelled.set()
+                return done
+            try:
+                attempt, item = items.get(timeout=None if cancelled is None else cancel_poll_interval)
+            except Empty:
+                continue
+            if attempt is winner:
+                return item
+
+    @contextmanager
+    def stream(self, model, system, messages, max_tokens, temperature=None, system_suffix="", prompt_caching=False, purpose=None, cancelled=None, on_acquired=None):
+        """ Stream the response text of the first attempt to give a token. """
+        items = Queue()
+        attempts = []
+
+        def request(attempt):
+            """ Read the stream of the attempt into the items. """
+            try:
+                on_acquired = lambda: items.put((attempt, acquired))
+                with attempt.provider.stream(attempt.model, system, messages, max_tokens, temperature, system_suffix, prompt_caching, purpose, attempt.cancelled, on_acquired) as stream:
+                    attempt.result = stream
+                    for token in stream.text_stream:
+                        if attempt.cancelled.is_set():
+                            break
+                        items.put((attempt, token))
+                if not attempt.cancelled.is_set():
+                    items.put((attempt, done))
+            except Exception as e:
+                items.put((attempt, e))
+            finally:
+                self.finish(attempt, purpose)
+
+        call_time = time.perf_counter()
+        self.start(attempts, "primary", self.primary, model, request)
+        winner, first, start_time = self.wait(items, attempts, model, purpose, request, call_time, cancelled, on_acquired)
+        self.stats.add(purpose, "ttft", time.perf_counter() - start_time)
+        self.discard(attempts, winner, purpose)
+
+        def text_stream():
+            item = first
+            while item is not done:
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+                item = self.next_item(items, winner, cancelled)
+            if not winner.cancelled.is_set():
+                self.stats.add(purpose, "total", time.perf_counter() - start_time)
+
+        stream = winner.result
+        stream.text_stream = text_stream()
+        try:
+            yield stream
+        finally:
+            # Winner is cancelled too, when the caller stops reading the stream
+            winner.cancelled.set()
+
+    def complete(self, model, system, messages, max_tokens, temperature=None, system_suffix="", prompt_caching=False, purpose=None, cancelled=None, on_acquired=None):
+        """ Get the whole response text of the first attempt to respond. """
+        items = Queue()
+        attempts = []
+
+        def request(attempt):
+            """ Request the response of the attempt into the items. """
+            try:
+                on_acquired = lambda: items.put((attempt, acquired))
+                attempt.result = attempt.provider.complete(attempt.model, system, messages, max_tokens, temperature, system_suffix, prompt_caching, purpose, attempt.cancelled, on_acquired)
+                items.put((attempt, attempt.result))
+            except Exception as e:
+                items.put((attempt, e))
+            finally:
+                self.finish(attempt, purpose)
+
+        call_time = time.perf_counter()
+        self.start(attempts, "primary", self.primary, model, request)
+        winner, response, start_time = self.wait(items, attempts, model, purpose, request, call_time, cancelled, on_acquired)
+        self.stats.add(purpose, "total", time.perf_counter() - start_time)
+        self.discard(attempts, winner, purpose)
+        return response
+
+    def report(self):
+        """ Get the latency percentiles and the hedged requests by the purpose as text. """
+        with self.lock:
+            hedges = {purpose: f"{self.hedges_won.get(purpose, 0)}/{count} won" for purpose, count in self.hedged.items()}
+        return f"Latency by purpose: {self.stats.percentiles()}. Hedged requests: {hedges}."
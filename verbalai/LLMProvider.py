@@ -0,0 +1,288 @@
+# LLMProvider.py - A Python module for the language model providers with pooled HTTP connections.
+import json
+import threading
+import importlib.util
+from contextlib import contextmanager
+
+from .RateLimiter import get_rate_limiter
+from .startup import LazyComponent
+
+# Import log lonfig as a side effect only
+from verbalai import log_config
+import logging
+logger = logging.getLogger(__name__)
+
+# Connection pool of the provider HTTP clients. Idle connections are kept alive
+# between the turns, so that a turn does not pay for a new TLS handshake.
+max_connections = 20
+max_keepalive_connections = 10
+keepalive_expiry = 300
+
+# Prompt caching was released as a beta feature in the Anthropic API
+prompt_caching_headers = {"anthropic-beta": "prompt-caching-2024-07-31"}
+
+
+def http2_available():
+    """ Is the h2 package, required by the HTTP/2 connections of httpx, installed. """
+    return importlib.util.find_spec("h2") is not None
+
+
+def create_http_client(sdk):
+    """ Get the HTTP client of the SDK module with the keep-alive connection pool, and HTTP/2 when available. """
+    import httpx
+    limits = httpx.Limits(
+        max_connections=max_connections,
+        max_keepalive_connections=max_keepalive_connections,
+        keepalive_expiry=keepalive_expiry
+    )
+    return sdk.DefaultHttpxClient(limits=limits, http2=http2_available())
+
+
+def create_anthropic_client(base_url=None, api_key=None, timeout=None):
+    """ Get the Anthropic client with the pooled HTTP client. Timeout is in seconds, None for the default of the SDK. """
+    import anthropic
+    kwargs = {"timeout": timeout} if timeout else {}
+    return anthropic.Anthropic(base_url=base_url, api_key=api_key, http_client=create_http_client(anthropic), **kwargs)
+
+
+def create_openai_client(base_url=None, api_key=None, timeout=None):
+    """ Get the OpenAI client with the pooled HTTP client. Timeout is in seconds, None for the default of the SDK. """
+    import openai
+    kwargs = {"timeout": timeout} if timeout else {}
+    return openai.OpenAI(base_url=base_url, api_key=api_key, http_client=create_http_client(openai), **kwargs)
+
+
+def last_user_text(messages):
+    """ Get the text of the latest user message. """
+    for message in reversed(messages):
+        if message["role"] == "user":
+            content = message["content"]
+            if isinstance(content, str):
+                return content
+            return " ".join(block["text"] for block in content if block.get("type") == "text")
+    return ""
+
+
+def estimate_tokens(system, messages):
+    """ Estimate the input tokens of the request, four characters per token. """
+    return (len(json.dumps(system, ensure_ascii=False, default=str)) + len(json.dumps(messages, ensure_ascii=False, default=str))) // 4
+
+
+def usage_tokens(usage):
+    """ Get the input and output tokens of the Anthropic or OpenAI usage message, or None. """
+    usage = getattr(usage, "usage", None)
+    if usage is None:
+        return None
+    if hasattr(usage, "input_tokens"):
+        return usage.input_tokens + usage.output_tokens
+    return usage.prompt_tokens + usage.completion_tokens
+
+
+class ProviderStream:
+    """ Text stream of a response. Text and the usage message are available after the stream has ended. """
+
+    def __init__(self, messages, model):
+        # Request messages, for counting the usage locally if the stream is cancelled
+        self.messages = messages
+        self.model = model
+        self.text_stream = None
+        self.text = ""
+        self.usage = None
+
+
+class ProviderResponse:
+    """ Text and the usage message of a completed response. """
+
+    def __init__(self, text, usage, messages, model):
+        self.text = text
+        self.usage = usage
+        self.messages = messages
+        self.model = model
+
+
+class LLMProvider:
+    """
+    Language model provider interface.
+
+    Responses are requested with the model, the system message, the messages in the Anthropic
+    format, the maximum number of tokens, and the purpose of the call. The stream method is a
+    context manager of the text stream, see ProviderStream, and the complete method returns the
+    whole response, see ProviderResponse. Usage of both is the message given to GPTTokenCalculator, or None, when
+    the stream was cancelled and the usage must be counted locally. Model of both is the model
+    that gave the response.
+
+    The client argument is the SDK client, or a LazyComponent of it. With the record file, the
+    completed responses are appended to the JSON Lines file, to be replayed by the local fake
+    provider server, see fake_provider_server.
+
+    Requests are limited by the rate limiter of the provider, shared by the process, see
+    RateLimiter. Request reserves its estimated input tokens and the maximum tokens of the
+    response, and holds its slot in flight until the stream is closed. A request queued by the
+    limiter is not sent, if the cancelled event is set, and on_acquired is called, when the
+    request leaves the queue, so that its latency can be measured without the queue wait.
+    """
+
+    name = None
+    warm_up_path = None
+
+    def __init__(self, client, record_file=None):
+        self.client = client
+        self.record_file = record_file
+        self.lock = threading.Lock()
+
+    def stream(self, model, system, messages, max_tokens, temperature=None, system_suffix="", prompt_caching=False, purpose=None, cancelled=None, on_acquired=None):
+        """ Stream the response text. """
+        raise NotImplementedError
+
+    def complete(self, model, system, messages, max_tokens, temperature=None, system_suffix="", prompt_caching=False, purpose=None, cancelled=None, on_acquired=None):
+        """ Get the whole response text. """
+        raise NotImplementedError
+
+    @contextmanager
+    def limit(self, system, messages, max_tokens, cancelled=None, on_acquired=None):
+        """ Hold a slot of the rate limiter of the provider for the request. Yields the Permit of the request. """
+        with get_rate_limiter(self.name).limit(estimate_tokens(system, messages) + max_tokens, cancelled) as permit:
+            if on_acquired:
+                on_acquired()
+            yield permit
+
+    def warm_up(self):
+        """ Open the connection to the provider API ahead of the first request. """
+        # The get method of the LazyComponent creates the client, and hides the get method of the client
+        client = self.client.get() if isinstance(self.client, LazyComponent) else self.client
+        try:
+            # Request does not consume tokens. Any HTTP response, also an error status,
+            # leaves the TLS connection open in the connection pool of the client.
+            client.get(self.warm_up_path, cast_to=object)
+        except Exception as e:
+            if getattr(e, "status_code", None) is None:
+                raise
+            logger.info(f"Model provider connection warm-up response: {e}")
+
+    def record(self, system, messages, text):
+        """ Append the response to the record file. """
+        if not self.record_file:
+            return
+        entry = {"provider": self.name, "system": system[:200], "prompt": last_user_text(messages), "text": text}
+        try:
+            with self.lock, open(self.record_file, "a") as file:
+                file.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        except OSError as e:
+            logger.error(f"Error recording the response to {self.record_file}; {e}")
+
+
+class AnthropicProvider(LLMProvider):
+    """ Anthropic Messages API provider. """
+
+    name = "anthropic"
+    warm_up_path = "/v1/models"
+
+    @staticmethod
+    def system(system, suffix="", prompt_caching=False):
+        """
+        Get the system parameter of the request. With the prompt caching, the static system message
+        is marked as a cache breakpoint, and the varying suffix is given in a separate block after it.
+        """
+        if not prompt_caching:
+            return system + suffix
+        blocks = [{"type": "text", "text": system, "cache_control": {"type": "ephemeral"}}]
+        if suffix:
+            blocks.append({"type": "text", "text": suffix})
+        return blocks
+
+    def request(self, model, system, messages, max_tokens, temperature, system_suffix, prompt_caching):
+        """ Get the request arguments. """
+        kwargs = {
+            "model": model,
+            "messages": messages,
+            "max_tokens": max_tokens,
+            "system": self.system(system, system_suffix, prompt_caching),
+            "extra_headers": prompt_caching_headers if prompt_caching else None
+        }
+        if temperature is not None:
+            kwargs["temperature"] = temperature
+        return kwargs
+
+    @contextmanager
+    def stream(self, model, system, messages, max_tokens, temperature=None, system_suffix="", prompt_caching=False, purpose=None, cancelled=None, on_acquired=None):
+        """ Stream the response text. """
+        result = ProviderStream(messages, model)
+        with self.limit(system + system_suffix, messages, max_tokens, cancelled, on_acquired) as permit, self.client.messages.stream(**self.request(model, system, messages, max_tokens, temperature, system_suffix, prompt_caching)) as stream:
+            def text_stream():
+                for text in stream.text_stream:
+                    result.text += text
+                    yield text
+                # Final message of a cancelled stream would be read to the end
+                result.usage = stream.get_final_message()
+                permit.used_tokens = usage_tokens(result.usage)
+                self.record(system, messages, result.text)
+            result.text_stream = text_stream()
+            yield result
+
+    def complete(self, model, system, messages, max_tokens, temperature=None, system_suffix="", prompt_caching=False, purpose=None, cancelled=None, on_acquired=None):
+        """ Get the whole response text. """
+        with self.limit(system + system_suffix, messages, max_tokens, cancelled, on_acquired) as permit:
+            message = self.client.messages.create(**self.request(model, system, messages, max_tokens, temperature, system_suffix, prompt_caching))
+            permit.used_tokens = usage_tokens(message)
+        text = message.content[0].text
+        self.record(system, messages, text)
+        return ProviderResponse(text, message, messages, model)
+
+
+class OpenAIProvider(LLMProvider):
+    """ OpenAI Chat Completions API provider. """
+
+    name = "openai"
+    warm_up_path = "/models"
+
+    @staticmethod
+    def chat_messages(system, messages):
+        """ Get the chat messages with the system message. """
+        return [{"role": "system", "content": system}] + messages
+
+    @contextmanager
+    def stream(self, model, system, messages, max_tokens, temperature=None, system_suffix="", prompt_caching=False, purpose=None, cancelled=None, on_acquired=None):
+        """ Stream the response text. """
+        chat_messages = self.chat_messages(system + system_suffix, messages)
+        result = ProviderStream(chat_messages, model)
+        kwargs = {"temperature": temperature} if temperature is not None else {}
+        with self.limit("", chat_messages, max_tokens, cancelled, on_acquired) as permit:
+            chunks = self.client.chat.completions.create(
+                model = model,
+                messages = chat_messages,
+                max_tokens = max_tokens,
+                stream = True,
+                # Usage is given in the last chunk without choices
+                stream_options = {"include_usage": True},
+                **kwargs
+            )
+            def text_stream():
+                for chunk in chunks:
+                    if getattr(chunk, "usage", None):
+                        result.usage = chunk
+                        permit.used_tokens = usage_tokens(chunk)
+                    if chunk.choices and chunk.choices[0].delta.content:
+                        result.text += chunk.choices[0].delta.content
+                        yield chunk.choices[0].delta.content
+                self.record(system, messages, result.text)
+            result.text_stream = text_stream()
+            try:
+                yield result
+            finally:
+                chunks.close()
+
+    def complete(self, model, system, messages, max_tokens, temperature=None, system_suffix="", prompt_caching=False, purpose=None, cancelled=None, on_acquired=None):
+        """ Get the whole response text. """
+        chat_messages = self.chat_messages(system + system_suffix, messages)
+        kwargs = {"temperature": temperature} if temperature is not None else {}
+        with self.limit("", chat_messages, max_tokens, cancelled, on_acquired) as permit:
+            message = self.client.chat.completions.create(
+                model = model,
+                messages = chat_messages,
+                max_tokens = max_tokens,
+                **kwargs
+            )
+            permit.used_tokens = usage_tokens(message)
+        text = message.choices[0].message.content
+        self.record(system, messages, text)
+        return ProviderResponse(text, message, chat_messages, model)
@@ -0,0 +1,96 @@
+# MemoryRetriever.py - A Python module for retrieving the long-term memory relevant to the user's utterance.
+import numpy as np
+
+from .ContextWindowManager import ContextWindowManager
+
+# Import log lonfig as a side effect only
+from verbalai import log_config
+import logging
+logger = logging.getLogger(__name__)
+
+
+class MemoryRetriever:
+    """
+    Retrieves the summaries and the dialogue units of the earlier discussions most relevant to the
+    user's utterance, and renders them as a compact context block within a token budget.
+
+    Summaries are the discussion summaries and the digests of the summary tree, see SummaryTree, and
+    the dialogue units, including the chunk summaries, are searched from the vector index. Memory of
+    the current discussion is left out, since it is already in the messages or the rolling summary.
+    Items below the minimum cosine similarity are not injected.
+    """
+
+    def __init__(self, vector_db, top_k=5, token_budget=400, min_similarity=0.3, summary_levels=["discussion", "week", "month"], max_item_tokens=150):
+        self.vector_db = vector_db
+        self.top_k = top_k
+        self.token_budget = token_budget
+        self.min_similarity = min_similarity
+        self.summary_levels = summary_levels
+        self.max_item_tokens = max_item_tokens
+
+    def find_summaries(self, vector):
+        """ Get the summary nodes of the earlier discussions with their similarity to the vector. """
+        nodes = [
+            node for level in self.summary_levels for node in self.vector_db.retrieve_summary_nodes(level)
+            if node["embedding"] and node["discussion_id"] != self.vector_db.current_discussion_id
+        ]
+        if not nodes:
+            return []
+        vectors = np.stack([np.frombuffer(node["embedding"], dtype=np.float32) for node in nodes])
+        similarities = vectors @ vector / (np.linalg.norm(vectors, axis=1) * np.linalg.norm(vector) + 1e-9)
+        return [
+            {"kind": f"{node['level']} {node['period']}", "text": node["summary"], "similarity": float(similarity)}
+            for node, similarity in zip(nodes, similarities)
+        ]
+
+    def find_dialogue_units(self, vector):
+        """ Get the nearest dialogue units of the earlier discussions in the vector index with their similarity. """
+        index = self.vector_db.load_or_initialize_index()
+        if index.get_n_items() == 0:
+            return []
+        ids, distances = self.vector_db.find_similar_within_ids(vector, self.top_k, None)
+        # Angular distance of the index is the euclidean distance of the normalized vectors
+        similarities = {id: 1 - distance ** 2 / 2 for id, distance in zip(ids, distances)}
+        units = [
+            unit for unit in self.vector_db.retrieve_dialogue_units_by_ids(list(similarities)[:self.top_k * 2])
+            if str(unit["discussion_id"]) != str(self.vector_db.current_discussion_id)
+        ]
+        return [
+            {
+                "kind": "summary" if unit["intent"] == "create_summary" else "dialogue",
+                "timestamp": unit["timestamp"],
+                "text": unit["prompt"] if unit["intent"] == "create_summary" else f"User: {unit['prompt']} Assistant: {unit['response']}",
+                "similarity": similarities[unit["id"]]
+            }
+            for unit in units
+        ]
+
+    def retrieve(self, text):
+        """ Get the most relevant memory items of the text, most similar first. """
+        vector = np.asarray(self.vector_db.vectorize_text(text), dtype=np.float32)
+        items = self.find_summaries(vector) + self.find_dialogue_units(vector)
+        items = [item for item in items if item["similarity"] >= self.min_similarity]
+        return sorted(items, key=lambda item: item["similarity"], reverse=True)[:self.top_k]
+
+    def render(self, items):
+        """ Render the memory items as compact lines within the token budget. """
+        lines, tokens = [], 0
+        for item in items:
+            text = " ".join(item["text"].split())
+            # Long items are cut to a share of the budget
+            text = text[:self.max_item_tokens * 4]
+            label = f"{item['kind']}, {item['timestamp'][:10]}" if item.get("timestamp") else item["kind"]
+            line = f"- [{label}] {text}"
+            line_tokens = ContextWindowManager.estimate_tokens(line)
+            if tokens + line_tokens > self.token_budget:
+                break
+            lines.append(line)
+            tokens += line_tokens
+        return "\n".join(lines)
+
+    def build_context(self, text):
+        """ Get the memory context block of the text, or an empty string, if nothing relevant was found. """
+        items = self.retrieve(text)
+        context = self.render(items)
+        logger.info(f"Memory retrieved: {len(context.splitlines())}/{len(items)} items, {ContextWindowManager.estimate_tokens(context) if context else 0} tokens.")
+        return context
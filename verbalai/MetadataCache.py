@@ -0,0 +1,111 @@
+# MetadataCache.py - A Python module for caching the metadata of the repeated message windows.
+import os
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+
+# Import log lonfig as a side effect only
+from verbalai import log_config
+import logging
+logger = logging.getLogger(__name__)
+
+
+def normalize_messages(messages):
+    """ Get the roles and the text blocks of the messages in lower case, with the whitespace collapsed. """
+    return [
+        [message["role"]] + [" ".join(block["text"].lower().split()) for block in message["content"] if block["type"] == "text"]
+        for message in messages
+    ]
+
+
+class MetadataCache:
+    """
+    Bounded LRU cache of the metadata retrieved for a message window.
+
+    Metadata is retrieved with the temperature 0, so the same window gives the same metadata. Keys
+    are hashes of the model, the system message, the normalized message window, and the date, since
+    the relative dates of the messages are resolved to the absolute dates of the tool arguments.
+    Entries expire after ttl seconds at the latest. With a file path, the cache is loaded from and
+    saved to a JSON file.
+    """
+
+    def __init__(self, max_entries=256, ttl=3600, file_path=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.file_path = file_path
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        # Hit rate counters
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        if file_path and os.path.exists(file_path):
+            self.load()
+
+    @staticmethod
+    def create_key(model, system_message, messages, date=None):
+        """ Get the cache key of the model, the system message version, the message window, and the date, by default the current date. """
+        date = date or time.strftime("%Y-%m-%d")
+        data = json.dumps([model, hashlib.sha256(system_message.encode("utf-8")).hexdigest(), normalize_messages(messages), date], ensure_ascii=False)
+        return hashlib.sha256(data.encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        """ Get the cached metadata of the key, or None. """
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and time.time() - entry["timestamp"] > self.ttl:
+                del self.entries[key]
+                self.expired += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry["metadata"]
+
+    def put(self, key, metadata):
+        """ Cache the metadata of the key, the least recently used entry is removed when the cache is full. """
+        with self.lock:
+            self.entries[key] = {"metadata": metadata, "timestamp": time.time()}
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def load(self):
+        """ Load the unexpired entries from the file. """
+        try:
+            with open(self.file_path, "r") as file:
+                entries = json.load(file)
+        except (OSError, ValueError) as e:
+            logger.error(f"Error loading the metadata cache from {self.file_path}; {e}")
+            return
+        now = time.time()
+        with self.lock:
+            for key, entry in entries.items():
+                if now - entry["timestamp"] <= self.ttl:
+                    self.entries[key] = entry
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+        logger.info(f"Metadata cache loaded with {len(self.entries)} entries.")
+
+    def save(self):
+        """ Save the entries to the file. """
+        if not self.file_path:
+            return
+        with self.lock:
+            entries = dict(self.entries)
+        try:
+            with open(self.file_path, "w") as file:
+                json.dump(entries, file)
+        except OSError as e:
+            logger.error(f"Error saving the metadata cache to {self.file_path}; {e}")
+
+    def report(self):
+        """ Get the hit rate of the cache as text. """
+        with self.lock:
+            lookups = self.hits + self.misses
+            hit_rate = self.hits / lookups if lookups else 0.0
+            return f"Metadata cache: {self.hits}/{lookups} hits ({hit_rate * 100:.1f}%), {self.expired} expired, {len(self.entries)} entries."
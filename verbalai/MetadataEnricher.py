@@ -0,0 +1,120 @@
+# MetadataEnricher.py - A Python module for deducing the metadata of the stored dialogue units in background batches.
+import json
+import time
+import threading
+from queue import Queue, Empty
+
+from .prompts import system_message_metadata_batch
+
+# Import log lonfig as a side effect only
+from verbalai import log_config
+import logging
+logger = logging.getLogger(__name__)
+
+
+def extract_json_array(text):
+    """ Extract and parse the outermost JSON array from a text string. """
+    start_index, end_index = text.find("["), text.rfind("]")
+    if start_index == -1 or end_index < start_index:
+        return []
+    try:
+        result = json.loads(text[start_index:end_index + 1])
+    except json.JSONDecodeError:
+        return []
+    return [item for item in result if isinstance(item, dict)] if isinstance(result, list) else []
+
+
+class MetadataEnricher:
+    """
+    Deduces the topics, sentiment, and intent of the stored dialogue units in a background thread.
+
+    Dialogue units are stored without the metadata while the user waits, and the worker
+    annotates them later, several units per language model request. Units are collected to
+    a batch until the batch is full, or the first unit of the batch has waited for max_wait seconds.
+
+    The retrieve_content argument is a function that takes the messages, the system message,
+    and the maximum number of tokens, and returns the response text of the language model.
+    """
+
+    def __init__(self, vector_db, retrieve_content, batch_size=5, max_wait=30, max_text_length=1000, max_tokens_per_unit=100):
+        self.vector_db = vector_db
+        self.retrieve_content = retrieve_content
+        self.batch_size = batch_size
+        self.max_wait = max_wait
+        # Long prompts and responses are truncated, metadata does not need the whole text
+        self.max_text_length = max_text_length
+        self.max_tokens_per_unit = max_tokens_per_unit
+        self.queue = Queue()
+        self.active = True
+        self.thread = threading.Thread(target=self.run, name="metadata-enricher", daemon=True)
+        self.thread.start()
+
+    def add(self, dialogue_unit_id, prompt, response):
+        """ Queue the stored dialogue unit for the metadata enrichment. """
+        self.queue.put((dialogue_unit_id, prompt, response))
+
+    def run(self):
+        """ Collect the queued dialogue units to batches and enrich them until stopped. """
+        batch = []
+        deadline = None
+        while self.active or batch:
+            try:
+                timeout = 1 if deadline is None else max(0, min(1, deadline - time.time()))
+                item = self.queue.get(timeout=timeout)
+                if item is None:
+                    # Stop signal, enrich the rest of the queued units
+                    break
+                batch.append(item)
+                if deadline is None:
+                    deadline = time.time() + self.max_wait
+            except Empty:
+                pass
+            if batch and (len(batch) >= self.batch_size or time.time() >= deadline):
+                self.enrich_batch(batch)
+                batch, deadline = [], None
+        while True:
+            try:
+                item = self.queue.get_nowait()
+            except Empty:
+                break
+            if item is not None:
+                batch.append(item)
+        for start in range(0, len(batch), self.batch_size):
+            self.enrich_batch(batch[start:start + self.batch_size])
+
+    def enrich_batch(self, batch):
+        """ Deduce the metadata of the dialogue units with a single request and update them to the database. """
+        units = "\n\n".join(
+            f"Dialogue unit id: {dialogue_unit_id}\nUser: {prompt[:self.max_text_length]}\nAssistant: {response[:self.max_text_length]}"
+            for dialogue_unit_id, prompt, response in batch
+        )
+        messages = [{"role": "user", "content": [{"type": "text", "text": units}]}]
+        try:
+            result = self.retrieve_content(messages, system_message_metadata_batch, self.max_tokens_per_unit * len(batch))
+        except Exception as e:
+            logger.error(f"Error retrieving metadata for dialogue units {[item[0] for item in batch]}; {e}")
+            return
+        dialogue_unit_ids = {item[0] for item in batch}
+        updated = 0
+        for metadata in extract_json_array(result or ""):
+            dialogue_unit_id = metadata.get("id")
+            # Only the units of the batch may be updated, ids of the response are not trusted
+            if dialogue_unit_id not in dialogue_unit_ids:
+                continue
+            try:
+                self.vector_db.update_dialogue_unit_metadata(
+                    dialogue_unit_id,
+                    metadata.get("topics", []) or [],
+                    metadata.get("sentiment", {}) or {},
+                    metadata.get("intent", "")
+                )
+                updated += 1
+            except Exception as e:
+                logger.error(f"Error updating metadata of the dialogue unit {dialogue_unit_id}; {e}")
+        logger.info(f"Metadata enriched for {updated}/{len(batch)} dialogue units.")
+
+    def stop(self, timeout=60):
+        """ Stop the worker after the queued dialogue units have been enriched. """
+        self.active = False
+        self.queue.put(None)
+        self.thread.join(timeout=timeout)
@@ -0,0 +1,79 @@
+# ModelRouter.py - A Python module for choosing the response model of each turn from cheap local signals.
+import json
+
+# Import log lonfig as a side effect only
+from verbalai import log_config
+import logging
+logger = logging.getLogger(__name__)
+
+# Conditions of a routing rule and the turn signal each of them is compared to
+rule_conditions = {
+    "min_words": "words",
+    "max_words": "words",
+    "min_tools": "tools",
+    "max_tools": "tools",
+    "min_history": "history",
+    "max_history": "history",
+    "intents": "intent",
+    "final": "final",
+}
+
+
+def load_router_rules(file_path):
+    """
+    Load the routing rules from a JSON file, see ModelRouter. Raises ValueError for invalid rules.
+
+    Example:
+        {"rules": [
+            {"name": "small_talk", "model": "claude-3-haiku-20240307", "max_words": 8, "max_tools": 0},
+            {"name": "deep", "model": "claude-3-opus-20240229", "min_words": 40}
+        ]}
+    """
+    with open(file_path, "r") as file:
+        rules = json.load(file).get("rules", [])
+    for i, rule in enumerate(rules):
+        if "model" not in rule:
+            raise ValueError(f"Routing rule #{i} has no model.")
+        unknown = set(rule) - set(rule_conditions) - {"name", "model"}
+        if unknown:
+            raise ValueError(f"Routing rule #{i} has unknown conditions: {', '.join(sorted(unknown))}.")
+    return rules
+
+
+class ModelRouter:
+    """
+    Chooses the response model of a turn with the first matching routing rule, or the default model.
+
+    Signals of a turn are the number of words in the user's utterance, the detected intent (empty
+    before the metadata is known), the number of function calling tools, the number of messages in
+    the history, and the finality of the prompt. A rule matches when all of its conditions match.
+    Intents condition is a list of intents and does not match an unknown intent.
+    """
+
+    def __init__(self, rules=[], default_model=None):
+        self.rules = list(rules)
+        self.default_model = default_model
+
+    @staticmethod
+    def matches(rule, signals):
+        """ Do the signals of a turn match all the conditions of the rule. """
+        for condition, signal in rule_conditions.items():
+            if condition not in rule:
+                continue
+            value = signals.get(signal)
+            if condition.startswith("min_") and not value >= rule[condition]:
+                return False
+            if condition.startswith("max_") and not value <= rule[condition]:
+                return False
+            if condition == "intents" and value not in rule[condition]:
+                return False
+            if condition == "final" and bool(value) != rule[condition]:
+                return False
+        return True
+
+    def route(self, signals):
+        """ Get the model and the name of the matching rule for the turn signals. """
+        for i, rule in enumerate(self.rules):
+            if self.matches(rule, signals):
+                return rule["model"], rule.get("name", f"rule_{i}")
+        return self.default_model, "default"
@@ -0,0 +1,239 @@
+# RateLimiter.py - A Python module for sharing the rate limits of the provider APIs within the process.
+import time
+import threading
+from collections import deque
+from contextlib import contextmanager
+import numpy as np
+
+# Import log lonfig as a side effect only
+from verbalai import log_config
+import logging
+logger = logging.getLogger(__name__)
+
+# Providers with a rate limiter. Tokens of the text to speech providers are the characters of the text.
+rate_limited_providers = ["anthropic", "openai", "deepgram", "elevenlabs"]
+
+# Seconds between the checks of the cancellation event of a queued request
+cancel_poll_interval = 0.05
+
+
+class RateLimitCancelled(Exception):
+    """ Request was cancelled while it was queued, and it was not sent, or a hedged call was cancelled before its response. """
+
+
+class Permit:
+    """ Acquired permit of a request. Set the used tokens, when known, to return the unused reserved tokens. """
+
+    def __init__(self, tokens, wait_time):
+        self.tokens = tokens
+        self.wait_time = wait_time
+        self.used_tokens = None
+
+
+class RateLimiter:
+    """
+    Process-wide limiter of the requests to a provider API.
+
+    Requests per minute and tokens per minute are token buckets, refilled continuously up to
+    their limit per minute, and the requests in flight are capped by the max in flight. A limit
+    of None is not enforced. Requests over the limits are queued, not failed, and served in the
+    order of arrival, so that a large request is not starved by the smaller ones. Request reserves
+    its estimated tokens, and the unused tokens are returned to the bucket after the response.
+    Tokens of a streamed request, like the text chunks sent to a text to speech websocket, are
+    taken as they are sent with acquire_tokens, without a new request or slot in flight.
+
+    Wait times of the requests and the streamed tokens are recorded for the metrics.
+    """
+
+    def __init__(self, name, requests_per_minute=None, tokens_per_minute=None, max_in_flight=None, max_samples=1000):
+        self.name = name
+        self.condition = threading.Condition()
+        self.queue = deque()
+        self.in_flight = 0
+        self.wait_times = deque(maxlen=max_samples)
+        self.token_wait_times = deque(maxlen=max_samples)
+        self.requests = 0
+        self.queued = 0
+        self.configure(requests_per_minute, tokens_per_minute, max_in_flight)
+
+    def configure(self, requests_per_minute=None, tokens_per_minute=None, max_in_flight=None):
+        """ Set the limits, and fill the buckets. """
+        with self.condition:
+            self.requests_per_minute = requests_per_minute
+            self.tokens_per_minute = tokens_per_minute
+            self.max_in_flight = max_in_flight
+            self.request_allowance = requests_per_minute or 0
+            self.token_allowance = tokens_per_minute or 0
+            self.updated = time.monotonic()
+            self.condition.notify_all()
+
+    def limited(self):
+        """ Is any of the limits enforced. """
+        return bool(self.requests_per_minute or self.tokens_per_minute or self.max_in_flight)
+
+    def refill(self):
+        """ Refill the buckets for the time passed since the last refill. """
+        now = time.monotonic()
+        elapsed, self.updated = now - self.updated, now
+        if self.requests_per_minute:
+            self.request_allowance = min(self.requests_per_minute, self.request_allowance + elapsed * self.requests_per_minute / 60)
+        if self.tokens_per_minute:
+            self.token_allowance = min(self.tokens_per_minute, self.token_allowance + elapsed * self.tokens_per_minute / 60)
+
+    def delay(self, tokens, request=True):
+        """ Seconds until the request of the tokens is allowed, 0 when it is allowed now, or None when it waits for a release. """
+        if request and self.max_in_flight and self.in_flight >= self.max_in_flight:
+            return None
+        delay = 0
+        if request and self.requests_per_minute and self.request_allowance < 1:
+            delay = max(delay, (1 - self.request_allowance) * 60 / self.requests_per_minute)
+        if self.tokens_per_minute and self.token_allowance < tokens:
+            delay = max(delay, (tokens - self.token_allowance) * 60 / self.tokens_per_minute)
+        return delay
+
+    def wait(self, tokens, request, cancelled):
+        """ Wait in the queue until the tokens, and the request if given, are allowed by the limits, and take them. Returns the wait time in seconds. """
+        start_time = time.perf_counter()
+        ticket = object()
+        with self.condition:
+            if self.tokens_per_minute:
+                # Request larger than the bucket would never be allowed
+                tokens = min(tokens, self.tokens_per_minute)
+            self.queue.append(ticket)
+            try:
+                while True:
+                    if cancelled is not None and cancelled.is_set():
+                        raise RateLimitCancelled(f"Request to {self.name} cancelled while queued.")
+                    delay = None
+                    if self.queue[0] is ticket:
+                        self.refill()
+                        delay = self.delay(tokens, request)
+                        if delay == 0:
+                            break
+                    if cancelled is not None:
+                        delay = cancel_poll_interval if delay is None else min(delay, cancel_poll_interval)
+                    self.condition.wait(delay)
+            finally:
+                self.queue.remove(ticket)
+                # Next request in the queue checks the limits
+                self.condition.notify_all()
+            if request and self.requests_per_minute:
+                self.request_allowance -= 1
+            if self.tokens_per_minute:
+                self.token_allowance -= tokens
+            if request:
+                self.in_flight += 1
+            return time.perf_counter() - start_time
+
+    def acquire(self, tokens=0, cancelled=None):
+        """
+        Wait until the request of the tokens is allowed by the limits, and take a slot in flight. Returns the wait time in seconds.
+        When the cancelled event is set while queued, the request leaves the queue and RateLimitCancelled is raised.
+        """
+        wait_time = self.wait(tokens, True, cancelled)
+        with self.condition:
+            self.requests += 1
+            self.wait_times.append(wait_time)
+            if wait_time > 0.001:
+                self.queued += 1
+        if wait_time > 1:
+            logger.info(f"Request to {self.name} waited {round(wait_time, 3)} seconds for the rate limits.")
+        return wait_time
+
+    def acquire_tokens(self, tokens):
+        """ Wait until the tokens of a streamed request in flight are allowed by the tokens per minute, and take them. Returns the wait time in seconds. """
+        if not self.tokens_per_minute:
+            return 0
+        wait_time = self.wait(tokens, False, None)
+        with self.condition:
+            self.token_wait_times.append(wait_time)
+        if wait_time > 1:
+            logger.info(f"Streamed tokens to {self.name} waited {round(wait_time, 3)} seconds for the rate limits.")
+        return wait_time
+
+    def release(self, unused_tokens=0):
+        """ Release the slot in flight, and return the unused reserved tokens to the bucket. """
+        with self.condition:
+            self.in_flight -= 1
+            if self.tokens_per_minute and unused_tokens > 0:
+                self.refill()
+                self.token_allowance = min(self.tokens_per_minute, self.token_allowance + unused_tokens)
+            self.condition.notify_all()
+
+    @contextmanager
+    def limit(self, tokens=0, cancelled=None):
+        """ Hold a slot of the limiter for the block. Yields the Permit of the request. """
+        permit = Permit(tokens, self.acquire(tokens, cancelled))
+        try:
+            yield permit
+        finally:
+            self.release(permit.tokens - permit.used_tokens if permit.used_tokens is not None else 0)
+
+    def metrics(self):
+        """
+        Get the count, queued count, mean, P50, P95, and maximum of the request wait in seconds, and the requests in flight.
+        Waits of the streamed tokens are given as the count, P95, and maximum.
+        """
+        with self.condition:
+            waits = list(self.wait_times)
+            token_waits = list(self.token_wait_times)
+            metrics = {"count": self.requests, "queued": self.queued, "in_flight": self.in_flight}
+        if waits:
+            metrics.update({
+                "mean": round(float(np.mean(waits)), 4),
+                "p50": round(float(np.percentile(waits, 50)), 4),
+                "p95": round(float(np.percentile(waits, 95)), 4),
+                "max": round(float(np.max(waits)), 4)
+            })
+        if token_waits:
+            metrics.update({
+                "token_count": len(token_waits),
+                "token_p95": round(float(np.percentile(token_waits, 95)), 4),
+                "token_max": round(float(np.max(token_waits)), 4)
+            })
+        return metrics
+
+
+# Rate limiters of the process by the provider name
+rate_limiters = {}
+rate_limiters_lock = threading.Lock()
+
+
+def get_rate_limiter(name):
+    """ Get the rate limiter of the provider. Limiter without the limits is created on the first use. """
+    with rate_limiters_lock:
+        if name not in rate_limiters:
+            rate_limiters[name] = RateLimiter(name)
+        return rate_limiters[name]
+
+
+def configure_rate_limiter(name, requests_per_minute=None, tokens_per_minute=None, max_in_flight=None):
+    """ Set the limits of the rate limiter of the provider. """
+    limiter = get_rate_limiter(name)
+    limiter.configure(requests_per_minute, tokens_per_minute, max_in_flight)
+    logger.info(f"Rate limits of {name}: {requests_per_minute} requests/min, {tokens_per_minute} tokens/min, {max_in_flight} in flight.")
+    return limiter
+
+
+def parse_rate_limit(rate_limit):
+    """
+    Parse the rate limit of the format provider=requests:tokens:in_flight, for example anthropic=50:40000:4.
+    Empty fields are not limited, for example elevenlabs=::2. Returns the provider and the limits.
+    """
+    name, limits = rate_limit.split("=")
+    name = name.strip()
+    if name not in rate_limited_providers:
+        raise ValueError(f"unknown provider '{name}'")
+    fields = limits.split(":")
+    if len(fields) > 3:
+        raise ValueError("too many fields")
+    fields += [""] * (3 - len(fields))
+    requests_per_minute, tokens_per_minute, max_in_flight = [float(field) if field.strip() else None for field in fields]
+    return name, requests_per_minute, tokens_per_minute, int(max_in_flight) if max_in_flight else None
+
+
+def report():
+    """ Get the wait metrics of the rate limiters with the limits as text. """
+    with rate_limiters_lock:
+        limiters = dict(rate_limiters)
+    return f"Rate limiter wait by provider: {({name: limiter.metrics() for name, limiter in sorted(limiters.items()) if limiter.limited()})}."
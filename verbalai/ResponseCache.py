@@ -0,0 +1,103 @@
+# ResponseCache.py - A Python module for answering repeated questions from the earlier responses.
+import time
+import calendar
+import threading
+import numpy as np
+
+# Import log lonfig as a side effect only
+from verbalai import log_config
+import logging
+logger = logging.getLogger(__name__)
+
+
+class ResponseCache:
+    """
+    Semantic cache of the final responses by the embedding of the user's prompt.
+
+    A prompt hits the cache, if the cosine similarity of its embedding to a cached prompt is above
+    the similarity threshold and the cached response is younger than ttl seconds. Only the responses
+    generated without function calling tools are cached. The cache can be loaded with the recent
+    dialogue units of the earlier discussions, see load.
+
+    The embed argument is a function that takes a text and returns its embedding vector.
+    """
+
+    def __init__(self, embed, similarity_threshold=0.92, ttl=3600, max_entries=500):
+        self.embed = embed
+        self.similarity_threshold = similarity_threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        # Cached entries as dictionaries with the normalized vector, prompt, response, metadata, and latency
+        self.entries = []
+        self.lock = threading.Lock()
+        # Statistics for the hit rate and the saved latency
+        self.lookups = 0
+        self.hits = 0
+        self.saved_latency = 0.0
+        self.latencies = []
+
+    def vectorize(self, text):
+        """ Get the normalized embedding vector of the text. """
+        vector = np.asarray(self.embed(text), dtype=np.float32)
+        return vector / (np.linalg.norm(vector) or 1.0)
+
+    def load(self, dialogue_units):
+        """ Add the recent dialogue units of the database to the cache. Latency of their responses is unknown. """
+        entries = []
+        for unit in dialogue_units:
+            timestamp = calendar.timegm(time.strptime(unit["timestamp"], "%Y-%m-%d %H:%M:%S"))
+            entries.append(self.create_entry(unit["prompt"], unit["response"], intent=unit["intent"], timestamp=timestamp))
+        with self.lock:
+            self.entries = sorted(entries + self.entries, key=lambda entry: entry["timestamp"])[-self.max_entries:]
+        logger.info(f"Response cache loaded with {len(entries)} dialogue units.")
+
+    def create_entry(self, prompt, response, topics=[], sentiment={}, intent="", latency=None, timestamp=None):
+        """ Create a cache entry. """
+        return {
+            "vector": self.vectorize(prompt),
+            "prompt": prompt,
+            "response": response,
+            "topics": topics,
+            "sentiment": sentiment,
+            "intent": intent,
+            "latency": latency,
+            "timestamp": timestamp or time.time()
+        }
+
+    def add(self, prompt, response, topics=[], sentiment={}, intent="", latency=None):
+        """ Cache the response of the prompt and record the latency of the generated response. """
+        entry = self.create_entry(prompt, response, topics, sentiment, intent, latency)
+        with self.lock:
+            self.entries = self.entries[-(self.max_entries - 1):] + [entry]
+            if latency is not None:
+                self.latencies.append(latency)
+
+    def lookup(self, prompt):
+        """ Get the most similar cached entry of the prompt with its similarity, or None on a cache miss. """
+        vector = self.vectorize(prompt)
+        with self.lock:
+            self.lookups += 1
+            entries = [entry for entry in self.entries if time.time() - entry["timestamp"] <= self.ttl]
+            best, best_similarity = None, 0.0
+            for entry in entries:
+                similarity = float(np.dot(vector, entry["vector"]))
+                if similarity > best_similarity:
+                    best, best_similarity = entry, similarity
+            if best is None or best_similarity < self.similarity_threshold:
+                logger.info(f"Response cache miss, best similarity {best_similarity:.3f}.")
+                return None
+            self.hits += 1
+        logger.info(f"Response cache hit, similarity {best_similarity:.3f} to the prompt: {best['prompt']}")
+        return dict(best, similarity=best_similarity)
+
+    def record_hit_latency(self, entry, latency):
+        """ Record the latency saved by the cache hit. Unknown latency of the entry is the average generated response latency. """
+        with self.lock:
+            original_latency = entry["latency"] if entry["latency"] is not None else (np.mean(self.latencies) if self.latencies else latency)
+            self.saved_latency += max(0.0, original_latency - latency)
+
+    def report(self):
+        """ Get the hit rate and the saved latency as text. """
+        with self.lock:
+            hit_rate = self.hits / self.lookups if self.lookups else 0.0
+            return f"Response cache: {self.hits}/{self.lookups} hits ({hit_rate * 100:.1f}%), saved latency {self.saved_latency:.2f} seconds."
@@ -0,0 +1,131 @@
+# SummaryTree.py - A Python module for building the hierarchical discussion summaries incrementally.
+import threading
+import calendar
+from datetime import datetime, date, timedelta
+import numpy as np
+
+from .prompts import summary_merge_prompt, system_message_summary
+
+# Import log lonfig as a side effect only
+from verbalai import log_config
+import logging
+logger = logging.getLogger(__name__)
+
+# Periods of the digests merged from the discussion summaries
+digest_periods = ["week", "month"]
+
+
+def period_key(day, digest_period):
+    """ Get the key of the week or the month of the date, like 2024-W15 or 2024-04. """
+    if digest_period == "week":
+        year, week, _ = day.isocalendar()
+        return f"{year}-W{week:02d}"
+    return day.strftime("%Y-%m")
+
+
+def parse_date(timestamp):
+    """ Parse the date of an ISO 8601 or an SQLite timestamp. """
+    return datetime.strptime(timestamp[:10], "%Y-%m-%d").date()
+
+
+class SummaryTree:
+    """
+    Hierarchical summaries of the discussions stored as the summary nodes of the database.
+
+    Chunk summaries of the message ranges are merged into the summary of their discussion as
+    they are created. Discussion summaries of the earlier discussions are merged into the week
+    or month digests by roll_up. Each level is merged incrementally from the level below it,
+    never from the messages, and each node is stored with the embedding of its summary.
+
+    The retrieve_content argument is a function that takes the messages, the system message,
+    and the maximum number of tokens, and returns the response text of the language model.
+    """
+
+    def __init__(self, vector_db, retrieve_content, digest_period="month", max_tokens=1024):
+        self.vector_db = vector_db
+        self.retrieve_content = retrieve_content
+        self.digest_period = digest_period
+        self.max_tokens = max_tokens
+        # Nodes are merged one at a time, chunks by the summary worker and the digests by the roll-up
+        self.lock = threading.Lock()
+
+    def vectorize(self, text):
+        """ Get the embedding of the summary as bytes. """
+        return np.asarray(self.vector_db.vectorize_text(text), dtype=np.float32).tobytes()
+
+    def merge(self, level, summary, new_summary):
+        """ Merge the new summary into the summary of the level with the language model. """
+        text = summary_merge_prompt.replace("<<level>>", level.capitalize()).replace("<<summary>>", summary).replace("<<new_summary>>", new_summary)
+        messages = [{"role": "user", "content": [{"type": "text", "text": text}]}]
+        return self.retrieve_content(messages, system_message_summary, self.max_tokens)
+
+    def merge_into(self, level, period, node, discussion_id=None):
+        """ Merge the node into its parent node of the level and the period. The first child is the summary of a new parent. """
+        parents = self.vector_db.retrieve_summary_nodes(level, period, limit=1)
+        if parents:
+            parent = parents[0]
+            merged = self.merge(level, parent["summary"], node["summary"])
+            if not merged:
+                raise ValueError(f"Empty merged summary of the {level} {period}.")
+            self.vector_db.update_summary_node(parent["id"], merged, self.vectorize(merged), parent["children"] + 1)
+            parent_id = parent["id"]
+        else:
+            parent_id = self.vector_db.add_summary_node(level, period, node["summary"], node["embedding"], discussion_id, 1)
+        self.vector_db.set_summary_node_parent(node["id"], parent_id)
+        return parent_id
+
+    def add_chunk(self, summary, discussion_id):
+        """ Store the chunk summary and merge it into the summary of the discussion. """
+        with self.lock:
+            embedding = self.vectorize(summary)
+            node_id = self.vector_db.add_summary_node("chunk", str(discussion_id), summary, embedding, discussion_id)
+            self.merge_into("discussion", str(discussion_id), {"id": node_id, "summary": summary, "embedding": embedding}, discussion_id)
+        logger.info(f"Chunk summary merged into the summary of the discussion {discussion_id}.")
+
+    def roll_up(self, current_discussion_id):
+        """ Merge the summaries of the earlier discussions, oldest first, into the digests. Returns the number of merged discussions. """
+        with self.lock:
+            nodes = [
+                node for node in reversed(self.vector_db.retrieve_summary_nodes("discussion", unmerged=True))
+                if node["discussion_id"] != current_discussion_id
+            ]
+            merged = 0
+            for node in nodes:
+                period = period_key(parse_date(node["starttime"] or node["updated"]), self.digest_period)
+                try:
+                    self.merge_into(self.digest_period, period, node)
+                    merged += 1
+                except Exception as e:
+                    # Rest of the discussions are merged on the next roll-up, in order
+                    logger.error(f"Error merging the discussion {node['discussion_id']} into the {self.digest_period} {period}; {e}")
+                    break
+        if merged:
+            logger.info(f"{merged} discussion summaries rolled up into the {self.digest_period} digests.")
+        return merged
+
+    def retrieve_summaries(self, level, day=None, discussion_id=None):
+        """
+        Retrieve the precomputed summary nodes of a discussion, or of the week or the month of the date.
+        Month is answered with its week digests, and a week with its month digest, when the digests
+        are of the other period.
+        """
+        if level in ["chunk", "discussion"]:
+            return self.vector_db.retrieve_summary_nodes(level, str(discussion_id), limit=None if level == "chunk" else 1)
+        day = day or date.today()
+        if level == self.digest_period or level == "week":
+            return self.vector_db.retrieve_summary_nodes(self.digest_period, period_key(day, self.digest_period), limit=1)
+        # Week digests of the month, by each day of the month
+        first = day.replace(day=1)
+        periods = dict.fromkeys(period_key(first + timedelta(days=i), "week") for i in range(calendar.monthrange(day.year, day.month)[1]))
+        return [node for period in periods for node in self.vector_db.retrieve_summary_nodes("week", period, limit=1)]
+
+    def find(self, phrase, level, limit=3):
+        """ Find the summary nodes of the level most similar to the phrase. Digests are searched from the stored digest period. """
+        level = self.digest_period if level in digest_periods else level
+        nodes = [node for node in self.vector_db.retrieve_summary_nodes(level) if node["embedding"]]
+        if not nodes:
+            return []
+        vector = np.frombuffer(self.vectorize(phrase), dtype=np.float32)
+        vectors = np.stack([np.frombuffer(node["embedding"], dtype=np.float32) for node in nodes])
+        similarities = vectors @ vector / (np.linalg.norm(vectors, axis=1) * np.linalg.norm(vector) + 1e-9)
+        return [nodes[i] for i in np.argsort(-similarities)[:limit]]
@@ -0,0 +1,68 @@
+# SummaryWorker.py - A Python module for generating the discussion summaries in the background.
+import threading
+from queue import Queue
+
+from .prompts import summary_generator_prompt, system_message_summary
+
+# Import log lonfig as a side effect only
+from verbalai import log_config
+import logging
+logger = logging.getLogger(__name__)
+
+
+class SummaryWorker:
+    """
+    Generates the summaries of the message ranges in a background thread, so that the turns
+    do not wait for the summarization.
+
+    Message ranges are submitted as a snapshot of the previous context text, and summarized
+    in the order of submission. The retrieve_content argument is a function that takes the
+    messages, the system message, and the maximum number of tokens, and returns the response
+    text of the language model. The on_summary argument is a function that takes the summary,
+    the end index of the summarized messages, and the finality flag, and stores the summary.
+    """
+
+    def __init__(self, retrieve_content, on_summary, max_tokens=1024):
+        self.retrieve_content = retrieve_content
+        self.on_summary = on_summary
+        self.max_tokens = max_tokens
+        self.queue = Queue()
+        self.thread = threading.Thread(target=self.run, name="summary-worker", daemon=True)
+        self.thread.start()
+
+    def submit(self, previous_context, end_index, final=False):
+        """ Queue the snapshot of the message range for the summarization. """
+        self.queue.put((previous_context, end_index, final))
+
+    def run(self):
+        """ Summarize the queued message ranges until stopped. """
+        while True:
+            item = self.queue.get()
+            try:
+                if item is None:
+                    return
+                self.summarize(*item)
+            finally:
+                self.queue.task_done()
+
+    def summarize(self, previous_context, end_index, final):
+        """ Generate the summary of the previous context and store it. """
+        messages = [{
+            "role": "user",
+            "content": [{"type": "text", "text": summary_generator_prompt.replace("<<summary>>", previous_context)}]
+        }]
+        try:
+            summary = self.retrieve_content(messages, system_message_summary, self.max_tokens)
+            if summary:
+                self.on_summary(summary, end_index, final)
+        except Exception as e:
+            logger.error(f"Error generating summary of the messages before index {end_index}; {e}")
+
+    def wait(self):
+        """ Wait until the queued summaries have been generated. """
+        self.queue.join()
+
+    def stop(self, timeout=120):
+        """ Stop the worker after the queued summaries have been generated. """
+        self.queue.put(None)
+        self.thread.join(timeout=timeout)
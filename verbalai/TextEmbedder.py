@@ -0,0 +1,151 @@
+# TextEmbedder.py - A Python module for vectorizing text with selectable CPU inference backends.
+import os
+import inspect
+import torch
+from transformers import AutoTokenizer, AutoModel
+# Backend names are listed in the lightweight VectorDB module,
+# so that they are available without importing torch
+from .VectorDB import embedding_backends
+
+# ONNX Runtime is optional and required only for the onnx backends
+try:
+    import onnxruntime
+    from onnxruntime.quantization import quantize_dynamic, QuantType
+except ImportError as e:
+    onnxruntime = None
+    onnxruntime_error = str(e)
+
+# Import log lonfig as a side effect only
+from verbalai import log_config
+import logging
+logger = logging.getLogger(__name__)
+
+# Directory for the exported ONNX models
+onnx_model_dir = os.path.join("models", "onnx")
+
+
+class TorchEmbedder:
+    """ Vectorize text with the Hugging Face model in eager PyTorch. """
+
+    def __init__(self, model_name):
+        """ Load the tokenizer and the model. """
+        self.model_name = model_name
+        self.tokenizer = AutoTokenizer.from_pretrained(self.model_name)
+        self.model = AutoModel.from_pretrained(self.model_name)
+        self.model.eval()
+
+    def encode(self, text):
+        """ Vectorize the input text using the pooled model output. """
+        inputs = self.tokenizer(text, return_tensors='pt', max_length=512, truncation=True, padding=True)
+        with torch.no_grad():
+            outputs = self.model(**inputs)
+            embeddings = outputs.pooler_output
+            embeddings = embeddings.squeeze().numpy()
+        return embeddings
+
+
+class QuantizedTorchEmbedder(TorchEmbedder):
+    """ Vectorize text with a dynamically int8 quantized PyTorch model. """
+
+    def __init__(self, model_name):
+        """ Load the model and quantize the weights of the linear layers to int8. """
+        super().__init__(model_name)
+        self.model = torch.quantization.quantize_dynamic(self.model, {torch.nn.Linear}, dtype=torch.qint8)
+
+
+class PooledOutputModel(torch.nn.Module):
+    """ Wrap a Hugging Face model to take the tokenizer outputs by name and return plain output tensors for the ONNX export. """
+
+    def __init__(self, model, input_names):
+        super().__init__()
+        self.model = model
+        self.input_names = input_names
+
+    def forward(self, *inputs):
+        outputs = self.model(**dict(zip(self.input_names, inputs)))
+        return outputs.last_hidden_state, outputs.pooler_output
+
+
+class OnnxEmbedder:
+    """
+    Vectorize text with ONNX Runtime on CPU.
+
+    The model is exported to ONNX on the first run and the exported file is reused
+    on the consecutive runs. Quantized model is derived from the exported fp32 model.
+    """
+
+    def __init__(self, model_name, quantize=False, model_dir=onnx_model_dir):
+        """ Load the tokenizer, export the model if needed, and open the inference session. """
+        if not onnxruntime:
+            raise ImportError(f"onnxruntime is required for the onnx embedding backends; {onnxruntime_error}")
+        self.model_name = model_name
+        self.quantize = quantize
+        self.model_dir = model_dir
+        self.tokenizer = AutoTokenizer.from_pretrained(self.model_name)
+        model_path = self.get_model_path(quantize=False)
+        if not os.path.exists(model_path):
+            self.export_model(model_path)
+        if quantize:
+            quantized_model_path = self.get_model_path(quantize=True)
+            if not os.path.exists(quantized_model_path):
+                logger.info(f"Quantizing ONNX model to: {quantized_model_path}")
+                quantize_dynamic(model_path, quantized_model_path, weight_type=QuantType.QInt8)
+            model_path = quantized_model_path
+        options = onnxruntime.SessionOptions()
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = onnxruntime.InferenceSession(model_path, options, providers=["CPUExecutionProvider"])
+        self.input_names = [session_input.name for session_input in self.session.get_inputs()]
+
+    def get_model_path(self, quantize=False):
+        """ Get the exported model file path for the model name. """
+        filename = self.model_name.replace("/", "__") + (".int8" if quantize else "") + ".onnx"
+        return os.path.join(self.model_dir, filename)
+
+    def export_model(self, model_path):
+        """ Export the Hugging Face model to ONNX format. """
+        logger.info(f"Exporting ONNX model to: {model_path}")
+        os.makedirs(self.model_dir, exist_ok=True)
+        model = AutoModel.from_pretrained(self.model_name)
+        model.eval()
+        inputs = self.tokenizer("VerbalAI", return_tensors='pt')
+        input_names = [name for name in ["input_ids", "attention_mask", "token_type_ids"] if name in inputs]
+        dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in input_names}
+        dynamic_axes["last_hidden_state"] = {0: "batch", 1: "sequence"}
+        dynamic_axes["pooler_output"] = {0: "batch"}
+        kwargs = {}
+        # Newer PyTorch versions default to the dynamo exporter, which does not
+        # support the dynamic axes argument, so the TorchScript exporter is requested
+        if "dynamo" in inspect.signature(torch.onnx.export).parameters:
+            kwargs["dynamo"] = False
+        with torch.no_grad():
+            torch.onnx.export(
+                PooledOutputModel(model, input_names),
+                tuple(inputs[name] for name in input_names),
+                model_path,
+                input_names=input_names,
+                output_names=["last_hidden_state", "pooler_output"],
+                dynamic_axes=dynamic_axes,
+                opset_version=14,
+                **kwargs
+            )
+
+    def encode(self, text):
+        """ Vectorize the input text using the pooled model output. """
+        inputs = self.tokenizer(text, return_tensors='np', max_length=512, truncation=True, padding=True)
+        feed = {name: inputs[name].astype("int64") for name in self.input_names}
+        embeddings = self.session.run(["pooler_output"], feed)[0]
+        return embeddings.squeeze()
+
+
+def create_embedder(backend, model_name):
+    """ Create a text embedder instance for the given backend name. """
+    if backend == "torch":
+        return TorchEmbedder(model_name)
+    elif backend == "torch-int8":
+        return QuantizedTorchEmbedder(model_name)
+    elif backend == "onnx":
+        return OnnxEmbedder(model_name)
+    elif backend == "onnx-int8":
+        return OnnxEmbedder(model_name, quantize=True)
+    else:
+        raise ValueError(f"Unsupported embedding backend: {backend}. Available backends: {embedding_backends}")
@@ -0,0 +1,133 @@
+# ToolScheduler.py - A Python module for running the function calling tools of a turn concurrently.
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+# Import log lonfig as a side effect only
+from verbalai import log_config
+import logging
+logger = logging.getLogger(__name__)
+
+
+class ToolScheduler:
+    """
+    Runs the function calling tools of a single turn on a thread pool.
+
+    Dependencies of the tools are built from the arguments_relies_on_previous_tool_results
+    flag of the metadata tool entries. Independent tools are called concurrently, and a tool
+    relying on the previous tool results waits for all the earlier tools of the turn. Tools
+    after a relying tool wait for it too, and when it is skipped, the rest of the tools are
+    skipped, like in the sequential tool loop.
+
+    Tools writing to the database are serialized by the write lock of VectorDB. Their writes
+    can not be cancelled, so the tools in write_tools are waited for without the timeout.
+    Other tools that time out are abandoned, and their worker is replaced in the pool.
+    """
+
+    def __init__(self, callbacks, max_workers=4, timeout=20, write_tools=None):
+        self.callbacks = callbacks
+        self.max_workers = max_workers
+        # Maximum seconds to wait for a single tool, see run
+        self.timeout = timeout
+        self.write_tools = set(write_tools or [])
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="tool")
+        # Tools that timed out and may still be running
+        self.abandoned = 0
+
+    def submit(self, tool, arguments):
+        """ Start the tool callback on the thread pool. Returns the future of the (answer, success) tuple. """
+        future = self.executor.submit(self.callbacks[tool], arguments)
+        # Deadline of the tool starts from the submission, also when it was started before run
+        future.submit_time = time.time()
+        return future
+
+    def abandon(self, future):
+        """ Stop waiting for the timed out tool. Pool is replaced, so that the running tool does not hold a worker of the later tools. """
+        if future.cancel():
+            return
+        self.abandoned += 1
+        executor, self.executor = self.executor, ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="tool")
+        # Running tools of the old pool finish in the background
+        executor.shutdown(wait=False)
+
+    @staticmethod
+    def build_graph(tools):
+        """ Get the indexes of the tools each tool depends on. Tools after a relying tool depend on it. """
+        relying = [i for i, entry in enumerate(tools) if entry.get("arguments_relies_on_previous_tool_results", False)]
+        return [
+            set(range(i)) if i in relying else {j for j in relying if j < i}
+            for i in range(len(tools))
+        ]
+
+    def deadline(self, tool, future):
+        """ Get the time after which the tool is abandoned, or None for the tools waited for without the timeout. """
+        if tool in self.write_tools:
+            return None
+        return getattr(future, "submit_time", time.time()) + self.timeout
+
+    def run(self, tools, resolve_arguments=None, started=None):
+        """
+        Run the tools and return their results in the original order.
+
+        Each result is a dictionary with the index, tool, arguments, and status of the tool.
+        Status is one of: called (answer and success are given), error and timeout (error is given),
+        not_found, or skipped.
+
+        Arguments of a tool with dependencies are resolved with the resolve_arguments function,
+        that takes the index, the tool entry, and the results of the dependencies, and returns the
+        arguments, or None to skip the tool and the rest of the tools. Started argument contains the
+        futures of the tools, that have been submitted already, by the tool index.
+        """
+        started = started or {}
+        dependencies = self.build_graph(tools)
+        results = [None] * len(tools)
+        futures, deadlines, arguments = {}, {}, {}
+        for i, future in started.items():
+            futures[i], deadlines[i], arguments[i] = future, self.deadline(tools[i].get("tool"), future), tools[i].get("arguments", {})
+        pending = [i for i in range(len(tools)) if i not in futures]
+
+        def result(i, status, **kwargs):
+            return dict(index=i, tool=tools[i].get("tool"), arguments=arguments.get(i, tools[i].get("arguments", {})), status=status, **kwargs)
+
+        while pending or futures:
+            # Start the tools whose dependencies have been resolved
+            for i in [i for i in pending if all(results[j] is not None for j in dependencies[i])]:
+                pending.remove(i)
+                entry = tools[i]
+                if entry.get("tool") not in self.callbacks:
+                    results[i] = result(i, "not_found")
+                    continue
+                arguments[i] = entry.get("arguments", {})
+                if entry.get("arguments_relies_on_previous_tool_results", False) and resolve_arguments:
+                    try:
+                        arguments[i] = resolve_arguments(i, entry, [results[j] for j in sorted(dependencies[i])])
+                    except Exception as e:
+                        logger.error(f"Error resolving the arguments of the tool #{i} '{entry.get('tool')}'; {e}")
+                        arguments[i] = None
+                    if arguments[i] is None:
+                        # Later tools depend on the skipped tool and are pending still
+                        for j in [i] + [j for j in pending if j > i]:
+                            results[j] = result(j, "skipped")
+                        pending = [j for j in pending if j < i]
+                        continue
+                futures[i] = self.submit(entry["tool"], arguments[i])
+                deadlines[i] = self.deadline(entry["tool"], futures[i])
+            if not futures:
+                continue
+            timed = [deadlines[i] for i in futures if deadlines[i] is not None]
+            wait(futures.values(), timeout=max(0, min(timed) - time.time()) if timed else None, return_when=FIRST_COMPLETED)
+            for i, future in list(futures.items()):
+                if future.done():
+                    try:
+                        answer, success = future.result()
+                        results[i] = result(i, "called", answer=answer, success=success)
+                    except Exception as e:
+                        results[i] = result(i, "error", error=str(e))
+                elif deadlines[i] is not None and time.time() >= deadlines[i]:
+                    # Running thread can not be stopped, but the turn does not wait for it any longer
+                    self.abandon(future)
+                    results[i] = result(i, "timeout", error=f"Tool did not respond in {self.timeout} seconds.")
+                else:
+                    continue
+                del futures[i]
+                logger.info(f"Tool #{i} '{results[i]['tool']}' {results[i]['status']}.")
+        return results
@@ -0,0 +1,152 @@
+# TurnScheduler.py - A Python module for executing the conversation turns one at a time by priority.
+import time
+import itertools
+import threading
+from queue import PriorityQueue
+import numpy as np
+
+# Import log lonfig as a side effect only
+from verbalai import log_config
+import logging
+logger = logging.getLogger(__name__)
+
+# Priorities of the turn kinds, smaller is more urgent
+turn_priorities = {
+    "final": 0,
+    "text_prompt": 1,
+    "clear": 1,
+    "summary": 2,
+    "feedback": 3,
+}
+
+
+class Turn:
+    """ A queued turn with its cancellation event, result, and timing. """
+
+    def __init__(self, kind, func, cancelled=None, preemptible=False):
+        self.kind = kind
+        self.priority = turn_priorities.get(kind, max(turn_priorities.values()))
+        self.func = func
+        self.cancelled = cancelled or threading.Event()
+        self.preemptible = preemptible
+        # State of the turn: queued, running, done, or skipped
+        self.state = "queued"
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.submitted_time = time.perf_counter()
+        self.started_time = None
+
+    def wait_time(self):
+        """ Seconds the turn waited in the queue, or has waited so far. """
+        return (self.started_time or time.perf_counter()) - self.submitted_time
+
+
+class TurnScheduler:
+    """
+    Executes the turns that read and modify the shared conversation state one at a time.
+
+    Turns are executed in the order of their priority: final response, text prompt, summary,
+    and intermediate feedback, and in the order of submission within the same priority.
+    A preemptible turn in execution, like the feedback, is cancelled when a more urgent turn
+    is submitted. The time each turn waited in the queue is recorded by the turn kind.
+
+    Turn function takes the cancellation event of the turn and returns the result of the turn.
+    """
+
+    def __init__(self):
+        self.queue = PriorityQueue()
+        self.sequence = itertools.count()
+        self.lock = threading.Lock()
+        self.current = None
+        # Queue wait times in seconds and the preempted turn counts by the turn kind
+        self.wait_times = {}
+        self.preempted = {}
+        self.thread = threading.Thread(target=self.run, name="turn-scheduler", daemon=True)
+        self.thread.start()
+
+    def submit(self, kind, func, cancelled=None, preemptible=False):
+        """ Queue the turn and preempt the less urgent turn in execution. Returns the turn. """
+        turn = Turn(kind, func, cancelled, preemptible)
+        with self.lock:
+            current = self.current
+            if current and current.preemptible and current.priority > turn.priority and not current.cancelled.is_set():
+                current.cancelled.set()
+                self.preempted[current.kind] = self.preempted.get(current.kind, 0) + 1
+                logger.info(f"Turn '{current.kind}' preempted by '{kind}'.")
+        self.queue.put((turn.priority, next(self.sequence), turn))
+        return turn
+
+    def execute(self, kind, func, cancelled=None, preemptible=False):
+        """
+        Queue the turn and wait for its result. Errors of the turn are raised to the caller.
+        Returns None, if the turn was cancelled before its execution.
+        """
+        turn = self.submit(kind, func, cancelled, preemptible)
+        while not turn.done.wait(timeout=0.05):
+            if turn.cancelled.is_set():
+                with self.lock:
+                    if turn.state == "queued":
+                        turn.state = "skipped"
+                        return None
+        if turn.error:
+            raise turn.error
+        return turn.result
+
+    def run(self):
+        """ Execute the queued turns until stopped. """
+        while True:
+            _, _, turn = self.queue.get()
+            if turn is None:
+                return
+            with self.lock:
+                if turn.state != "queued" or turn.cancelled.is_set():
+                    turn.state = "skipped"
+                    turn.done.set()
+                    continue
+                turn.state = "running"
+                turn.started_time = time.perf_counter()
+                self.current = turn
+                self.wait_times.setdefault(turn.kind, []).append(turn.wait_time())
+            try:
+                turn.result = turn.func(turn.cancelled)
+            except Exception as e:
+                turn.error = e
+            finally:
+                with self.lock:
+                    turn.state = "done"
+                    self.current = None
+                turn.done.set()
+
+    def current_wait(self):
+        """ Seconds the turn in execution waited in the queue, or None. """
+        with self.lock:
+            return round(self.current.wait_time(), 4) if self.current else None
+
+    def metrics(self):
+        """ Get the count, mean, P50, P95, and maximum of the queue wait in seconds, and the preempted count, by the turn kind. """
+        with self.lock:
+            kinds = {kind: list(waits) for kind, waits in self.wait_times.items()}
+            preempted = dict(self.preempted)
+        return {
+            kind: {
+                "count": len(waits),
+                "mean": round(float(np.mean(waits)), 4),
+                "p50": round(float(np.percentile(waits, 50)), 4),
+                "p95": round(float(np.percentile(waits, 95)), 4),
+                "max": round(float(np.max(waits)), 4),
+                "preempted": preempted.get(kind, 0)
+            }
+            for kind, waits in kinds.items()
+        }
+
+    def stop(self, timeout=30):
+        """ Stop the scheduler after the turn in execution. Queued turns are not executed. """
+        with self.lock:
+            current = self.current
+            if current and current.preemptible:
+                current.cancelled.set()
+        # Stop signal precedes all the queued turns
+        self.queue.put((-1, -1, None))
+        self.thread.join(timeout=timeout)
+        logger.info(f"Turn queue wait by kind: {self.metrics()}")
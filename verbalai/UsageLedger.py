@@ -0,0 +1,55 @@
+# UsageLedger.py - A Python module for recording the token usage of the language model calls in the background.
+import time
+import threading
+from queue import Queue, Empty
+
+# Import log lonfig as a side effect only
+from verbalai import log_config
+import logging
+logger = logging.getLogger(__name__)
+
+
+class UsageLedger:
+    """
+    Writes one usage ledger row per language model call to the database in a background thread.
+
+    Records are dictionaries with the model, purpose (response, feedback, metadata, summary, or tool),
+    input, output, cache write, and cache read tokens, latency in seconds, and cost in dollars.
+    Records queued while a write is in progress are written together in a single transaction.
+    """
+
+    def __init__(self, vector_db):
+        self.vector_db = vector_db
+        self.queue = Queue()
+        self.thread = threading.Thread(target=self.run, name="usage-ledger", daemon=True)
+        self.thread.start()
+
+    def add(self, record):
+        """ Queue the usage record of a call. """
+        # Timestamp of the call, not the write, in the format of the SQLite CURRENT_TIMESTAMP
+        self.queue.put(dict(record, timestamp=time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime())))
+
+    def run(self):
+        """ Write the queued records until stopped. """
+        active = True
+        while active:
+            records = [self.queue.get()]
+            while True:
+                try:
+                    records.append(self.queue.get_nowait())
+                except Empty:
+                    break
+            if None in records:
+                # Stop signal, write the records queued before it
+                active = False
+                records = [record for record in records if record is not None]
+            if records:
+                try:
+                    self.vector_db.add_usage_records(records)
+                except Exception as e:
+                    logger.error(f"Error writing {len(records)} usage records; {e}")
+
+    def stop(self, timeout=10):
+        """ Stop the writer after the queued records have been written. """
+        self.queue.put(None)
+        self.thread.join(timeout=timeout)
@@ -1,8 +1,7 @@
 # VectorDB.py - A Python module for storing and searching vectors using SQLite and Annoy.
 import sqlite3
+import threading
 from annoy import AnnoyIndex
-from transformers import AutoTokenizer, AutoModel
-import torch
 import os
 import pytz
 from datetime import datetime, timezone
@@ -17,6 +16,13 @@ from verbalai import log_config
 import logging
 logger = logging.getLogger(__name__)
 
+# Available text embedding backends, see TextEmbedder module:
+# - torch: full fp32 eager PyTorch model (original behaviour)
+# - torch-int8: PyTorch model with dynamic int8 quantization of the linear layers
+# - onnx: fp32 model exported once to ONNX and run with ONNX Runtime
+# - onnx-int8: exported ONNX model with dynamic int8 quantized weights
+embedding_backends = ["torch", "torch-int8", "onnx", "onnx-int8"]
+
 def get_timezone_offset(tz_name):
     """
     Returns the timezone offset in minutes from UTC for a given timezone name.
@@ -72,7 +78,7 @@ def parse_cost_condition(condition):
 class VectorDB:
     """ A Python class for storing and searching vectors using SQLite and Annoy. """
     
-    def __init__(self, db_path='verbalai_db.sqlite', index_path='verbalai_db.ann', model_name='sentence-transformers/all-MiniLM-L6-v2', embedding_dim=384, timezone="Europe/Helsinki"):
+    def __init__(self, db_path='verbalai_db.sqlite', index_path='verbalai_db.ann', model_name='sentence-transformers/all-MiniLM-L6-v2', embedding_dim=384, timezone="Europe/Helsinki", embedding_backend=os.getenv("EMBEDDING_BACKEND", "torch")):
         """ Initialize the VectorDB class. """
         self.db_path = db_path
         # Vector db (annay) attributes
@@ -82,9 +88,16 @@ class VectorDB:
         # SQLite is not so good with timezones
         # We need to adjust datetimes in each relevant query
         self.timezone = timezone
-        self.tokenizer = AutoTokenizer.from_pretrained(self.model_name)
-        self.model = AutoModel.from_pretrained(self.model_name)
-        self.index = AnnoyIndex(self.embedding_dim, 'angular')
+        # Embedding backend: torch, torch-int8, onnx, or onnx-int8
+        self.embedding_backend = embedding_backend
+        # Embedding model and vector index are loaded on the first use,
+        # or ahead of time in a background thread, see load_embedder
+        self.embedder = None
+        self.index = None
+        self.load_lock = threading.Lock()
+        # Connection is shared by the writers of the main, tool, and background threads, so every
+        # method writing and committing holds the lock, see MetadataEnricher, UsageLedger and SummaryWorker
+        self.write_lock = threading.RLock()
         # To determine, if dialogue unit indexing should be done in the clean up process
         self.new_data_added = False
         # Discussion / session related attributes
@@ -93,11 +106,13 @@ class VectorDB:
         self.current_discussion_id = None
         self.latest_discussion_id = None
         self.first_discussion_date = None
-        self.load_or_initialize_index()
         self.conn = sqlite3.connect(self.db_path, check_same_thread=False)
         self.conn.execute("PRAGMA foreign_keys = ON")
         if not self.check_tables_exist():
             self._init_db()
+        # Usage ledger and summary nodes were added later, so they are created for the existing databases too
+        self._init_usage_ledger()
+        self._init_summary_nodes()
     
     def set_first_discussion_date(self):
         cursor = self.conn.cursor()
@@ -144,15 +159,80 @@ class VectorDB:
     
     def upsert_data_entry(self, key, value, key_group):
         """ Insert or update a data entry in the database. """
-        cursor = self.conn.cursor()
-        # Update is done via primary key (id) or unique key (key, key_group) conflict check
-        cursor.execute('INSERT OR REPLACE INTO data (key, value, key_group, updated) VALUES (?, ?, ?, CURRENT_TIMESTAMP)', (key, value, key_group))
-        self.conn.commit()
+        with self.write_lock:
+            cursor = self.conn.cursor()
+            # Update is done via primary key (id) or unique key (key, key_group) conflict check
+            cursor.execute('INSERT OR REPLACE INTO data (key, value, key_group, updated) VALUES (?, ?, ?, CURRENT_TIMESTAMP)', (key, value, key_group))
+            self.conn.commit()
     
     def update_discussion_cost(self, cost):
+        with self.write_lock:
+            cursor = self.conn.cursor()
+            cursor.execute("UPDATE discussions SET cost = ? WHERE id = ?", (cost, self.current_discussion_id))
+            self.conn.commit()
+    
+    def add_usage_records(self, records):
+        """ Add the usage records of the language model calls to the current discussion and update the discussion cost. """
+        with self.write_lock:
+            cursor = self.conn.cursor()
+            cursor.executemany('''
+                INSERT INTO usage_ledger (discussion_id, timestamp, model, purpose, input_tokens, output_tokens, cache_write_tokens, cache_read_tokens, latency, cost)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''', [(
+                    self.current_discussion_id, record["timestamp"], record["model"], record["purpose"],
+                    record["input_tokens"], record["output_tokens"], record["cache_write_tokens"], record["cache_read_tokens"],
+                    record["latency"], record["cost"]
+                ) for record in records])
+            # Discussion cost is the live aggregate of its calls
+            cursor.execute("UPDATE discussions SET cost = (SELECT COALESCE(SUM(cost), 0) FROM usage_ledger WHERE discussion_id = ?) WHERE id = ?", (self.current_discussion_id, self.current_discussion_id))
+            self.conn.commit()
+    
+    def retrieve_usage_summary(self, discussion_id=None):
+        """ Retrieve the number of calls, tokens, average latency, and cost of the current (or given) discussion by purpose. """
         cursor = self.conn.cursor()
-        cursor.execute("UPDATE discussions SET cost = ? WHERE id = ?", (cost, self.current_discussion_id))
-        self.conn.commit()
+        cursor.execute('''
+            SELECT purpose, COUNT(*), SUM(input_tokens), SUM(output_tokens), SUM(cache_write_tokens), SUM(cache_read_tokens), AVG(latency), SUM(cost)
+            FROM usage_ledger
+            WHERE discussion_id = ?
+            GROUP BY purpose''', (discussion_id or self.current_discussion_id,))
+        return {
+            row[0]: {
+                "calls": row[1],
+                "input_tokens": row[2],
+                "output_tokens": row[3],
+                "cache_write_tokens": row[4],
+                "cache_read_tokens": row[5],
+                "average_latency": row[6],
+                "cost": row[7]
+            } for row in cursor.fetchall()
+        }
+    
+    def retrieve_recent_dialogue_units(self, max_age, limit=500):
+        """ Retrieve the dialogue units with a response from the last max_age seconds, newest first. Summaries are excluded. """
+        cursor = self.conn.cursor()
+        cursor.execute('''
+            SELECT id, prompt, response, COALESCE(intent, ''), timestamp
+            FROM dialogue_units
+            WHERE timestamp >= datetime('now', ?) AND COALESCE(intent, '') != 'create_summary' AND COALESCE(response, '') != ''
+            ORDER BY timestamp DESC
+            LIMIT ?''', (f"-{int(max_age)} seconds", limit))
+        return [
+            {"id": row[0], "prompt": row[1], "response": row[2], "intent": row[3], "timestamp": row[4]}
+            for row in cursor.fetchall()
+        ]
+    
+    def retrieve_dialogue_units_by_ids(self, dialogue_unit_ids):
+        """ Retrieve the prompt, response, intent, timestamp, and discussion of the dialogue units in a single query. """
+        if not dialogue_unit_ids:
+            return []
+        cursor = self.conn.cursor()
+        cursor.execute(f'''
+            SELECT id, prompt, response, COALESCE(intent, ''), timestamp, discussion_id
+            FROM dialogue_units
+            WHERE id IN ({", ".join("?" * len(dialogue_unit_ids))})''', list(dialogue_unit_ids))
+        return [
+            {"id": row[0], "prompt": row[1], "response": row[2], "intent": row[3], "timestamp": row[4], "discussion_id": row[5]}
+            for row in cursor.fetchall()
+        ]
     
     def retrieve_last_discussion_summaries(self, max_results=3):
         # SQL to retrieve last three dialogues with 'summary' intent
@@ -168,6 +248,64 @@ class VectorDB:
         cursor.execute(sql_query, params)
         return "\n\n".join([row[0] for row in cursor.fetchall()])
     
+    def add_summary_node(self, level, period, summary, embedding, discussion_id=None, children=0):
+        """ Add a summary node of the level and the period. Returns the id of the new node. """
+        with self.write_lock:
+            cursor = self.conn.cursor()
+            cursor.execute(
+                'INSERT INTO summary_nodes (level, period, discussion_id, summary, embedding, children) VALUES (?, ?, ?, ?, ?, ?)',
+                (level, period, discussion_id, summary, embedding, children)
+            )
+            self.conn.commit()
+            return cursor.lastrowid
+    
+    def update_summary_node(self, node_id, summary, embedding, children):
+        """ Replace the summary and the embedding of a summary node with the merged ones. """
+        with self.write_lock:
+            cursor = self.conn.cursor()
+            cursor.execute(
+                'UPDATE summary_nodes SET summary = ?, embedding = ?, children = ?, updated = CURRENT_TIMESTAMP WHERE id = ?',
+                (summary, embedding, children, node_id)
+            )
+            self.conn.commit()
+    
+    def set_summary_node_parent(self, node_id, parent_id):
+        """ Mark the summary node as merged into the parent node. """
+        with self.write_lock:
+            cursor = self.conn.cursor()
+            cursor.execute('UPDATE summary_nodes SET parent_id = ? WHERE id = ?', (parent_id, node_id))
+            self.conn.commit()
+    
+    def retrieve_summary_nodes(self, level, period=None, discussion_id=None, unmerged=False, limit=None):
+        """ Retrieve the summary nodes of the level, optionally by the period, the discussion, or not merged to a parent yet, newest first. """
+        conditions, params = ["level = ?"], [level]
+        if period is not None:
+            conditions.append("period = ?")
+            params.append(period)
+        if discussion_id is not None:
+            conditions.append("discussion_id = ?")
+            params.append(discussion_id)
+        if unmerged:
+            conditions.append("parent_id IS NULL")
+        sql_query = f'''
+            SELECT sn.id, sn.level, sn.period, sn.discussion_id, sn.parent_id, sn.summary, sn.embedding, sn.children, sn.updated, d.starttime
+            FROM summary_nodes AS sn
+            LEFT JOIN discussions AS d ON sn.discussion_id = d.id
+            WHERE {" AND ".join(f"sn.{condition}" for condition in conditions)}
+            ORDER BY sn.id DESC
+        '''
+        if limit:
+            sql_query += " LIMIT ?"
+            params.append(limit)
+        cursor = self.conn.cursor()
+        cursor.execute(sql_query, params)
+        return [
+            {
+                "id": row[0], "level": row[1], "period": row[2], "discussion_id": row[3], "parent_id": row[4],
+                "summary": row[5], "embedding": row[6], "children": row[7], "updated": row[8], "starttime": row[9]
+            } for row in cursor.fetchall()
+        ]
+    
     def check_tables_exist(self):
         """Check if the key tables exist in the database to determine if initialization is needed."""
         cursor = self.conn.cursor()
@@ -191,14 +329,67 @@ class VectorDB:
         
         return self.session_id
     
+    def load_embedder(self):
+        """ Load the text embedding model, unless it has been loaded already. """
+        with self.load_lock:
+            if self.embedder is None:
+                # Importing the embedder module imports torch and transformers,
+                # so it is deferred until the model is really needed
+                from .TextEmbedder import create_embedder
+                self.embedder = create_embedder(self.embedding_backend, self.model_name)
+        return self.embedder
+    
     def load_or_initialize_index(self):
-        """ Load an existing index or initialize a new one. """
-        if os.path.exists(self.index_path):
-            logger.info("Loading existing index.")
-            self.index.load(self.index_path)
-        else:
-            # File will be created only after the first insert to the index
-            logger.info("Creating a new vector index.")
+        """ Load an existing index or initialize a new one, unless it has been loaded already. """
+        with self.load_lock:
+            if self.index is None:
+                index = AnnoyIndex(self.embedding_dim, 'angular')
+                if os.path.exists(self.index_path):
+                    logger.info("Loading existing index.")
+                    index.load(self.index_path)
+                else:
+                    # File will be created only after the first insert to the index
+                    logger.info("Creating a new vector index.")
+                self.index = index
+        return self.index
+
+    def warm_up(self, phrases=["VerbalAI warm-up", "What did we discuss about the project during the previous discussion, and which topics were the most positive ones?"]):
+        """
+        Load the embedding model and the vector index, and run the first queries ahead of time.
+
+        The first encode call pays the lazy kernel initialization and tokenizer caches,
+        and the first SQL queries read the database pages from disk. Phrases of different
+        lengths are used, so that the warm-up covers more than a single input shape.
+        """
+        embedder = self.load_embedder()
+        vectors = [embedder.encode(phrase) for phrase in phrases]
+        index = self.load_or_initialize_index()
+        if index.get_n_items() > 0:
+            index.get_nns_by_vector(vectors[0], 1)
+        self.prime_cache()
+
+    def prime_cache(self, discussion_id=None):
+        """ Read the rows of the latest (or given) discussion to the SQLite page cache. """
+        cursor = self.conn.cursor()
+        if discussion_id is None:
+            cursor.execute("SELECT MAX(id) FROM discussions")
+            row = cursor.fetchone()
+            discussion_id = row[0] if row else None
+        if discussion_id is None:
+            return
+        cursor.execute('SELECT starttime, title, endtime, featured, cost FROM discussions WHERE id = ?', (discussion_id,))
+        cursor.fetchall()
+        cursor.execute('''
+        SELECT du.id, du.prompt, du.response, du.intent, du.timestamp, t.name, ss.positive_score, ss.negative_score
+        FROM dialogue_units du
+        LEFT JOIN dialogue_unit_topics dut ON du.id = dut.dialogue_unit_id
+        LEFT JOIN topics t ON dut.topic_id = t.id
+        LEFT JOIN sentiment_scores ss ON du.id = ss.dialogue_unit_id
+        WHERE du.discussion_id = ?
+        ''', (discussion_id,))
+        cursor.fetchall()
+        cursor.execute('SELECT name, score FROM categories WHERE discussion_id = ?', (discussion_id,))
+        cursor.fetchall()
 
     def _init_db(self):
         """ Initialize the SQLite database. """
@@ -263,38 +454,96 @@ class VectorDB:
         )''')
         self.conn.commit()
 
-    def vectorize_text(self, text):
-        """ Vectorize the input text using the model. """
-        inputs = self.tokenizer(text, return_tensors='pt', max_length=512, truncation=True, padding=True)
-        with torch.no_grad():
-            outputs = self.model(**inputs)
-            embeddings = outputs.pooler_output
-            embeddings = embeddings.squeeze().numpy()
-        return embeddings
+    def _init_usage_ledger(self):
+        """ Initialize the usage ledger table with one row per language model call. """
+        cursor = self.conn.cursor()
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS usage_ledger (
+            id INTEGER PRIMARY KEY,
+            discussion_id INTEGER,
+            timestamp TEXT DEFAULT CURRENT_TIMESTAMP,
+            model TEXT,
+            purpose TEXT,
+            input_tokens INTEGER,
+            output_tokens INTEGER,
+            cache_write_tokens INTEGER,
+            cache_read_tokens INTEGER,
+            latency REAL,
+            cost REAL,
+            FOREIGN KEY (discussion_id) REFERENCES discussions(id)
+        )''')
+        self.conn.commit()
 
-    def add_dialogue_unit(self, prompt, response, topics=[], sentiment={}, intent=None):
-        """ Index a new entry to the current discussion. """
+    def _init_summary_nodes(self):
+        """ Initialize the summary nodes table of the hierarchical summaries, see SummaryTree. """
         cursor = self.conn.cursor()
-        cursor.execute('INSERT INTO dialogue_units (prompt, response, intent, discussion_id) VALUES (?, ?, ?, ?)', (prompt, response, intent, self.current_discussion_id))
-        dialogue_unit_id = cursor.lastrowid
-        
-        # Insert sentiment scores
-        if sentiment and any([sentiment.get('positive_score', False), sentiment.get('negative_score', False)]):
-            cursor.execute('INSERT INTO sentiment_scores (dialogue_unit_id, positive_score, negative_score) VALUES (?, ?, ?)', 
-                (dialogue_unit_id, sentiment.get('positive_score', 0), sentiment.get('negative_score', 0)))
-        
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS summary_nodes (
+            id INTEGER PRIMARY KEY,
+            level TEXT NOT NULL,
+            period TEXT NOT NULL,
+            discussion_id INTEGER,
+            parent_id INTEGER,
+            summary TEXT,
+            embedding BLOB,
+            children INTEGER DEFAULT 0,
+            created TEXT DEFAULT CURRENT_TIMESTAMP,
+            updated TEXT DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (discussion_id) REFERENCES discussions(id),
+            FOREIGN KEY (parent_id) REFERENCES summary_nodes(id)
+        )''')
+        cursor.execute("CREATE INDEX IF NOT EXISTS summary_nodes_level_period ON summary_nodes (level, period)")
         self.conn.commit()
-        
-        # It is expensive to build index everytime new dialogue init is created
-        # Thats why, if self.new_data_added is set true, on clean-up process index is rebuilt.
-        #self.rebuild_index()
-        
-        # Insert topics
-        for topic in topics:
-            self.add_topic(topic)
-            self.link_topic_to_dialogue_unit(dialogue_unit_id, topic)
-        
-        self.new_data_added = True
+
+    def vectorize_text(self, text):
+        """ Vectorize the input text using the selected embedding backend. """
+        return self.load_embedder().encode(text)
+
+    def add_dialogue_unit(self, prompt, response, topics=[], sentiment={}, intent=None):
+        """ Index a new entry to the current discussion. Returns the id of the new dialogue unit. """
+        with self.write_lock:
+            cursor = self.conn.cursor()
+            cursor.execute('INSERT INTO dialogue_units (prompt, response, intent, discussion_id) VALUES (?, ?, ?, ?)', (prompt, response, intent, self.current_discussion_id))
+            dialogue_unit_id = cursor.lastrowid
+            
+            # Insert sentiment scores
+            if sentiment and any([sentiment.get('positive_score', False), sentiment.get('negative_score', False)]):
+                cursor.execute('INSERT INTO sentiment_scores (dialogue_unit_id, positive_score, negative_score) VALUES (?, ?, ?)', 
+                    (dialogue_unit_id, sentiment.get('positive_score', 0), sentiment.get('negative_score', 0)))
+            
+            self.conn.commit()
+            
+            # It is expensive to build index everytime new dialogue init is created
+            # Thats why, if self.new_data_added is set true, on clean-up process index is rebuilt.
+            #self.rebuild_index()
+            
+            # Insert topics
+            for topic in topics:
+                self.add_topic(topic)
+                self.link_topic_to_dialogue_unit(dialogue_unit_id, topic)
+            
+            self.new_data_added = True
+        return dialogue_unit_id
+    
+    def update_dialogue_unit_metadata(self, dialogue_unit_id, topics=[], sentiment={}, intent=None):
+        """ Replace the topics, sentiment scores, and intent of an existing dialogue unit. """
+        with self.write_lock:
+            cursor = self.conn.cursor()
+            if intent:
+                cursor.execute('UPDATE dialogue_units SET intent = ? WHERE id = ?', (intent, dialogue_unit_id))
+            
+            if sentiment and any([sentiment.get('positive_score', False), sentiment.get('negative_score', False)]):
+                cursor.execute('INSERT OR REPLACE INTO sentiment_scores (dialogue_unit_id, positive_score, negative_score) VALUES (?, ?, ?)', 
+                    (dialogue_unit_id, sentiment.get('positive_score', 0), sentiment.get('negative_score', 0)))
+            
+            if topics:
+                cursor.execute('DELETE FROM dialogue_unit_topics WHERE dialogue_unit_id = ?', (dialogue_unit_id,))
+            
+            self.conn.commit()
+            
+            for topic in set(topics):
+                self.add_topic(topic)
+                self.link_topic_to_dialogue_unit(dialogue_unit_id, topic)
     
     def extract_discussion_id(self, discussion_id, include_random=False):
         
@@ -368,29 +617,32 @@ class VectorDB:
         params.append(discussion_id)
         sql_query = f"UPDATE discussions SET {', '.join(updates)} WHERE id = ?"
         
-        cursor = self.conn.cursor()
-        cursor.execute(sql_query, params)
-        self.conn.commit()
+        with self.write_lock:
+            cursor = self.conn.cursor()
+            cursor.execute(sql_query, params)
+            self.conn.commit()
 
     def assign_category(self, discussion_id, category):
-        cursor = self.conn.cursor()
-        cursor.execute('INSERT INTO categories (name, score, discussion_id) VALUES (?, ?, ?)', 
-            (category['name'].lower().title(), round(float(category['score']), 2), discussion_id))
-        self.conn.commit()
+        with self.write_lock:
+            cursor = self.conn.cursor()
+            cursor.execute('INSERT INTO categories (name, score, discussion_id) VALUES (?, ?, ?)', 
+                (category['name'].lower().title(), round(float(category['score']), 2), discussion_id))
+            self.conn.commit()
     
     def remove_category(self, discussion_id, name):
-        cursor = self.conn.cursor()
-        # First, check if the category exists
-        cursor.execute('SELECT * FROM categories WHERE discussion_id = ? AND name = ?', (discussion_id, name))
-        category = cursor.fetchone()
+        with self.write_lock:
+            cursor = self.conn.cursor()
+            # First, check if the category exists
+            cursor.execute('SELECT * FROM categories WHERE discussion_id = ? AND name = ?', (discussion_id, name))
+            category = cursor.fetchone()
         
-        if category is None:
-            # If the category does not exist, raise ValueError
-            raise ValueError(f"Category named '{name}' for discussion_id {discussion_id} not found.")
+            if category is None:
+                # If the category does not exist, raise ValueError
+                raise ValueError(f"Category named '{name}' for discussion_id {discussion_id} not found.")
         
-        cursor.execute('DELETE FROM categories WHERE discussion_id = ? AND name = ?', 
-            (discussion_id, name))
-        self.conn.commit()
+            cursor.execute('DELETE FROM categories WHERE discussion_id = ? AND name = ?', 
+                (discussion_id, name))
+            self.conn.commit()
     
     def retrieve_categories(self, discussion_id):
         cursor = self.conn.cursor()
@@ -399,18 +651,20 @@ class VectorDB:
         
     def add_topic(self, topic_name):
         """ Add a new topic to the topics table. """
-        cursor = self.conn.cursor()
-        cursor.execute("INSERT OR IGNORE INTO topics (name) VALUES (?)", (topic_name,))
-        self.conn.commit()
+        with self.write_lock:
+            cursor = self.conn.cursor()
+            cursor.execute("INSERT OR IGNORE INTO topics (name) VALUES (?)", (topic_name,))
+            self.conn.commit()
 
     def link_topic_to_dialogue_unit(self, dialogue_unit_id, topic_name):
         """ Link a topic to a conversation in the conversation_topics table. """
-        cursor = self.conn.cursor()
-        # Retrieve topic id by unique name
-        cursor.execute('SELECT id FROM topics WHERE name = ?', (topic_name,))
-        topic_id = cursor.fetchone()[0]
-        cursor.execute("INSERT INTO dialogue_unit_topics (dialogue_unit_id, topic_id) VALUES (?, ?)", (dialogue_unit_id, topic_id))
-        self.conn.commit()
+        with self.write_lock:
+            cursor = self.conn.cursor()
+            # Retrieve topic id by unique name
+            cursor.execute('SELECT id FROM topics WHERE name = ?', (topic_name,))
+            topic_id = cursor.fetchone()[0]
+            cursor.execute("INSERT INTO dialogue_unit_topics (dialogue_unit_id, topic_id) VALUES (?, ?)", (dialogue_unit_id, topic_id))
+            self.conn.commit()
 
     def rebuild_index(self, force_build_all=False):
         """ Rebuild the Annoy index with all entries from the database. """
@@ -440,7 +694,7 @@ class VectorDB:
     
     def find_similar_within_ids(self, vector, limit, allowed_ids):
         # Perform the unrestricted search
-        all_ids, distances = self.index.get_nns_by_vector(vector, n=limit*10, include_distances=True)  # Increase n if needed
+        all_ids, distances = self.load_or_initialize_index().get_nns_by_vector(vector, n=limit*10, include_distances=True)  # Increase n if needed
         logger.info("find_similar_within_ids: %s distances: %s" % (all_ids, list(map(lambda x: round(x, 3), distances))))
         
         # Rebuild_index uses special indexing to separate prompt and response
@@ -18,6 +18,7 @@ from deepgram import (
 # Library imports
 # Import log lonfig as a side effect only
 from .log_config import setup_logging
+from .RateLimiter import get_rate_limiter
 import logging
 logger = logging.getLogger(__name__)
 
@@ -77,12 +78,13 @@ class DeepgramIO:
             nonlocal connect_stream_start
             if connect_stream_start == 0:
                 connect_stream_start = time.time()
-            self.audio_queue.put(
-                deepgram.speak.v("1").stream(
+            # Tokens of the text to speech request are the characters of the text
+            with get_rate_limiter("deepgram").limit(len(text)):
+                audio = deepgram.speak.v("1").stream(
                     {"text": text},
                     SpeakOptions(model=voice_id)
                 ).stream
-            )
+            self.audio_queue.put(audio)
         
         segment = ""
         for segment_text in text_stream():
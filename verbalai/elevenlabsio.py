@@ -18,11 +18,16 @@ load_dotenv()
 
 # Import log lonfig as a side effect only
 from verbalai import log_config
+from verbalai.RateLimiter import get_rate_limiter
 import logging
 logger = logging.getLogger(__name__)
 
 # ElevenLabs API WebSocket URI
-stream_uri = "wss://api.elevenlabs.io/v1/text-to-speech/{voice_id}/stream-input?model_id={model_id}{output_format}&optimize_streaming_latency=4"
+stream_uri = "wss://api.elevenlabs.io/v1/text-to-speech/{voice_id}/stream-input?model_id={model_id}{output_format}&optimize_streaming_latency=4&inactivity_timeout={inactivity_timeout}"
+
+# Seconds the websocket may stay idle before ElevenLabs closes it (API default is 20, maximum is 180).
+# A longer timeout lets the connection opened ahead of the first turn wait for the user's question.
+inactivity_timeout = 180
 
 # Extra headers (API KEY) for ElevenLabs API WebSocket connection
 extra_headers = {
@@ -51,6 +56,8 @@ class ElevenlabsIO:
         self.playback_active = False
         self.playback_thread.start()
         self.remove_asterisks = remove_asterisks
+        # Websocket opened ahead of the next process call, see preconnect
+        self.preconnected = None
     
     def playback_audio(self):
         """Continuously play audio chunks from the queue."""
@@ -75,15 +82,58 @@ class ElevenlabsIO:
                 continue
         self.playback_active = False
 
+    def get_stream_uri(self, voice_id, model_id):
+        """ Construct the WebSocket URI for ElevenLabs API. """
+        # Wav format requires additional parameters for PCM (Pulse-code modulation) sample rate
+        return stream_uri.format(voice_id=voice_id, model_id=model_id, output_format=f"&output_format=pcm_{self.bit_rate}", inactivity_timeout=inactivity_timeout)
+    
+    def preconnect(self, voice_id, model_id):
+        """ Open the websocket ahead of the next process call, so that the first turn does not pay the TLS handshake. """
+        uri = self.get_stream_uri(voice_id, model_id)
+        ws = connect(uri, additional_headers=extra_headers)
+        self.close_preconnected()
+        self.preconnected = (uri, ws, time.time())
+        logger.info("Elevenlabs websocket preconnected.")
+    
+    def close_preconnected(self):
+        """ Close the unused preconnected websocket. """
+        if self.preconnected:
+            self.preconnected[1].close()
+            self.preconnected = None
+    
+    def open_stream(self, uri):
+        """ Open the text to speech stream, reusing the preconnected websocket if it is still open. """
+        preconnected, self.preconnected = self.preconnected, None
+        if preconnected:
+            preconnected_uri, ws, connected_time = preconnected
+            if preconnected_uri == uri and time.time() - connected_time < inactivity_timeout:
+                try:
+                    self.send_stream_start(ws)
+                    return ws
+                except ConnectionClosed:
+                    logger.info("Preconnected Elevenlabs websocket was closed, reconnecting.")
+            ws.close()
+        ws = connect(uri, additional_headers=extra_headers)
+        self.send_stream_start(ws)
+        return ws
+    
+    def send_stream_start(self, ws):
+        """ Send the initial message that starts the text to speech stream. """
+        ws.send(dumps(
+            dict(
+                text=" ",
+                try_trigger_generation=True,
+                generation_config=dict(
+                    chunk_length_schedule=[50],
+                ),
+            )
+        ))
+    
     def process(self, voice_id, model_id, text_stream, start_time):
         """ Stream text chunks via WebSocket to ElevenLabs and play received audio in real-time. """
         global stream_uri, extra_headers
         
-        # Wav format requires additional parameters for PCM (Pulse-code modulation) sample rate
-        output_format = f"&output_format=pcm_{self.bit_rate}"
-        
-        # Construct the WebSocket URI for ElevenLabs API
-        uri = stream_uri.format(voice_id=voice_id, model_id=model_id, output_format=output_format)
+        uri = self.get_stream_uri(voice_id, model_id)
         
         # Start the playback thread if it's not running
         # This ensures that the audio is played also from the second time and onwards
@@ -94,7 +144,10 @@ class ElevenlabsIO:
         
         self.audio_stream_start, text_stream_start, connect_stream_start = 0, 0, 0
         
-        with connect(uri, additional_headers=extra_headers) as ws:
+        # Stream holds its slot of the rate limiter until the websocket is closed,
+        # and the characters of the text are taken from the rate limits as they are sent
+        limiter = get_rate_limiter("elevenlabs")
+        with limiter.limit(), self.open_stream(uri) as ws:
             
             connect_stream_start = time.time()
             
@@ -107,16 +160,6 @@ class ElevenlabsIO:
                 frames_per_buffer=self.frames_per_buffer
             )
             
-            ws.send(dumps(
-                dict(
-                    text=" ",
-                    try_trigger_generation=True,
-                    generation_config=dict(
-                        chunk_length_schedule=[50],
-                    ),
-                )
-            ))
-
             lasttime = None
             audio_buffer = b''
             totaltime = 0
@@ -160,6 +203,14 @@ class ElevenlabsIO:
                 else:
                     logger.warn(f"Elevenlabs unknown response: {response}")
             
+            def send_text(text):
+                """ Send the text to ElevenLabs API, after its characters are allowed by the rate limits. """
+                limiter.acquire_tokens(len(text))
+                ws.send(dumps({
+                    "text": text,
+                    "try_trigger_generation": True
+                }))
+            
             segment = ""
             # Stream text chunks to ElevenLabs API
             for chunk in text_stream():
@@ -169,11 +220,8 @@ class ElevenlabsIO:
                 
                 if "." == chunk or "!" == chunk or "?" == chunk:
                     # Send the text chunk to ElevenLabs API
-                    ws.send(dumps({
-                        # Remove any asterisk action indicators from the segment
-                        "text": re.sub(r'\*.*?\*', '', segment + chunk) if self.remove_asterisks else (segment + chunk), 
-                        "try_trigger_generation": True
-                    }))
+                    # Remove any asterisk action indicators from the segment
+                    send_text(re.sub(r'\*.*?\*', '', segment + chunk) if self.remove_asterisks else (segment + chunk))
                     segment = ""
                 else:
                     segment += chunk
@@ -189,11 +237,8 @@ class ElevenlabsIO:
             
             # Rest of the text stream if it was not ended with . or ! or ?
             if segment:
-                ws.send(dumps({
-                    # Remove any asterisk action indicators from the segment
-                    "text": re.sub(r'\*.*?\*', '', segment) if self.remove_asterisks else segment, 
-                    "try_trigger_generation": True
-                }))
+                # Remove any asterisk action indicators from the segment
+                send_text(re.sub(r'\*.*?\*', '', segment) if self.remove_asterisks else segment)
                 segment = ""
             
             # Signal end of text and trigger any remaining audio generation
@@ -243,5 +288,6 @@ class ElevenlabsIO:
     def quit(self):
         """ Cleanup and close the PyAudio instance. """
         self.cleanup()
+        self.close_preconnected()
         if self.audio:
             self.audio.terminate()
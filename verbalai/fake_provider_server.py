@@ -0,0 +1,206 @@
+# fake_provider_server.py - A local Flask server standing in for the language model provider APIs
+import re
+import json
+import time
+import random
+import itertools
+import threading
+from werkzeug.serving import make_server, WSGIRequestHandler
+from flask import Flask, Blueprint, request, Response, jsonify, current_app
+
+from .LLMProvider import last_user_text
+
+# Routes of the provider APIs, registered to the app of each server
+provider = Blueprint("provider", __name__)
+
+# Responses of the requests without a matching recording. The metadata requests
+# are recognized from their system message, so that the whole pipeline can be run.
+# Metadata follows the schema of system_message_metadata_schema in prompts.
+default_response = "This is a response of the local fake provider server."
+default_metadata = json.dumps({
+    "topics": ["testing"],
+    "sentiment": {"positive_score": 0.5, "negative_score": 0.1},
+    "intent": "statement",
+    "tools": [],
+    "system_requires_more_information_to_use_tools": False
+})
+
+
+class KeepAliveRequestHandler(WSGIRequestHandler):
+    """ HTTP/1.1 request handler, so that the clients keep their connections alive and the streams are chunked. """
+    protocol_version = "HTTP/1.1"
+
+    def log_request(self, code="-", size="-"):
+        # Requests are not logged to the console of the chatbot
+        pass
+
+
+class ServerThread(threading.Thread):
+    """
+    Server of the fake provider APIs. Each server has its own timing, so that a slow and a fast
+    provider can be run side by side. With the stall rate, a share of the responses is delayed by
+    the stall delay before the first token, to reproduce the tail latency of the real providers.
+    """
+    def __init__(self, host="127.0.0.1", port=0, recordings_file=None, first_token_delay=0.3, token_delay=0.02, stall_rate=0.0, stall_delay=5.0):
+        threading.Thread.__init__(self, daemon=True)
+        self.app = Flask(__name__)
+        self.app.register_blueprint(provider)
+        self.app.config['RECORDINGS'] = load_recordings(recordings_file) if recordings_file else []
+        self.app.config['RECORDING_COUNTER'] = itertools.count()
+        self.app.config['FIRST_TOKEN_DELAY'] = first_token_delay
+        self.app.config['TOKEN_DELAY'] = token_delay
+        self.app.config['STALL_RATE'] = stall_rate
+        self.app.config['STALL_DELAY'] = stall_delay
+        self.srv = make_server(host, port, self.app, threaded=True, request_handler=KeepAliveRequestHandler)
+
+    @property
+    def url(self):
+        host, port = self.srv.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def run(self):
+        print(f"Serving {len(self.app.config['RECORDINGS'])} recorded responses on {self.srv.server_address}")
+        self.srv.serve_forever()
+
+    def shutdown(self):
+        self.srv.shutdown()
+
+
+def load_recordings(file_path):
+    """ Load the recorded responses from the JSON Lines file, see LLMProvider.record. """
+    with open(file_path, "r") as file:
+        return [json.loads(line) for line in file if line.strip()]
+
+
+def find_response(system, messages):
+    """
+    Find the recorded response of the request. Recordings of the same system message are preferred,
+    and among them the recording of the same prompt. Other matches are replayed in turns.
+    """
+    recordings = current_app.config['RECORDINGS']
+    prompt = last_user_text(messages)
+    candidates = [recording for recording in recordings if recording.get("system") and system.startswith(recording["system"])]
+    for recording in candidates:
+        if recording.get("prompt") == prompt:
+            return recording["text"]
+    candidates = candidates or recordings
+    if candidates:
+        return candidates[next(current_app.config['RECORDING_COUNTER']) % len(candidates)]["text"]
+    if '"sentiment"' in system and '"topics"' in system:
+        # Batched metadata of the deferred metadata mode is an array by the dialogue unit id
+        return "[]" if "<<dialogue_unit_id>>" in system else default_metadata
+    return default_response
+
+
+def system_text(system):
+    """ Get the text of the system parameter, given as text or as text blocks. """
+    if isinstance(system, list):
+        return "".join(block.get("text", "") for block in system)
+    return system or ""
+
+
+def split_tokens(text):
+    """ Split the text into the word tokens of the stream. """
+    return re.findall(r"\s*\S+", text) or [text]
+
+
+def count_tokens(text):
+    """ Estimate the tokens of the text, four characters per token. """
+    return max(1, len(text) // 4)
+
+
+def first_token_delay(config):
+    """ Get the delay of the first token, stalled at the stall rate. """
+    return config['FIRST_TOKEN_DELAY'] + (config['STALL_DELAY'] if random.random() < config['STALL_RATE'] else 0)
+
+
+def response_delay(config, text):
+    """ Get the delay of the whole response. """
+    return first_token_delay(config) + config['TOKEN_DELAY'] * (len(split_tokens(text)) - 1)
+
+
+def timed_tokens(config, text):
+    """ Yield the tokens of the text with the delay of the first and the rest of the tokens. """
+    for i, token in enumerate(split_tokens(text)):
+        time.sleep(first_token_delay(config) if i == 0 else config['TOKEN_DELAY'])
+        yield token
+
+
+def server_sent_event(data, event=None):
+    """ Format the server-sent event. """
+    return (f"event: {event}\n" if event else "") + f"data: {json.dumps(data) if not isinstance(data, str) else data}\n\n"
+
+
+@provider.route('/v1/messages', methods=['POST'])
+def anthropic_messages():
+    body = request.get_json()
+    model, messages = body.get("model"), body.get("messages", [])
+    text = find_response(system_text(body.get("system")), messages)
+    # Config is read before the streamed response leaves the app context
+    config = current_app.config
+    input_tokens = count_tokens(json.dumps(body.get("system", "")) + json.dumps(messages))
+    output_tokens = count_tokens(text)
+    usage = {"input_tokens": input_tokens, "output_tokens": output_tokens}
+    if not body.get("stream"):
+        time.sleep(response_delay(config, text))
+        return jsonify({
+            "id": "msg_fake", "type": "message", "role": "assistant", "model": model,
+            "content": [{"type": "text", "text": text}],
+            "stop_reason": "end_turn", "stop_sequence": None, "usage": usage
+        })
+
+    def events():
+        yield server_sent_event({"type": "message_start", "message": {
+            "id": "msg_fake", "type": "message", "role": "assistant", "model": model, "content": [],
+            "stop_reason": None, "stop_sequence": None, "usage": {"input_tokens": input_tokens, "output_tokens": 0}
+        }}, "message_start")
+        yield server_sent_event({"type": "content_block_start", "index": 0, "content_block": {"type": "text", "text": ""}}, "content_block_start")
+        for token in timed_tokens(config, text):
+            yield server_sent_event({"type": "content_block_delta", "index": 0, "delta": {"type": "text_delta", "text": token}}, "content_block_delta")
+        yield server_sent_event({"type": "content_block_stop", "index": 0}, "content_block_stop")
+        yield server_sent_event({"type": "message_delta", "delta": {"stop_reason": "end_turn", "stop_sequence": None}, "usage": {"output_tokens": output_tokens}}, "message_delta")
+        yield server_sent_event({"type": "message_stop"}, "message_stop")
+    return Response(events(), mimetype="text/event-stream")
+
+
+@provider.route('/v1/chat/completions', methods=['POST'])
+def openai_chat_completions():
+    body = request.get_json()
+    model, messages = body.get("model"), body.get("messages", [])
+    system = " ".join(message["content"] for message in messages if message["role"] == "system")
+    text = find_response(system, [message for message in messages if message["role"] != "system"])
+    # Config is read before the streamed response leaves the app context
+    config = current_app.config
+    usage = {"prompt_tokens": count_tokens(json.dumps(messages)), "completion_tokens": count_tokens(text)}
+    usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+    created = int(time.time())
+    if not body.get("stream"):
+        time.sleep(response_delay(config, text))
+        return jsonify({
+            "id": "chatcmpl-fake", "object": "chat.completion", "created": created, "model": model,
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+            "usage": usage
+        })
+
+    def chunk(delta, finish_reason=None):
+        return {
+            "id": "chatcmpl-fake", "object": "chat.completion.chunk", "created": created, "model": model,
+            "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}]
+        }
+
+    def events():
+        for i, token in enumerate(timed_tokens(config, text)):
+            yield server_sent_event(chunk({"role": "assistant", "content": token} if i == 0 else {"content": token}))
+        yield server_sent_event(chunk({}, "stop"))
+        if body.get("stream_options", {}).get("include_usage"):
+            yield server_sent_event({
+                "id": "chatcmpl-fake", "object": "chat.completion.chunk", "created": created, "model": model,
+                "choices": [], "usage": usage
+            })
+        yield server_sent_event("[DONE]")
+    return Response(events(), mimetype="text/event-stream")
+
+
+@provider.route('/v1/models', methods=['GET'])
+def models():
+    return jsonify({"data": [], "object": "list"})
@@ -1,4 +1,18 @@
 # gpt_token_calculator.py - A module
+import threading
+from functools import lru_cache
+
+# Import log lonfig as a side effect only
+from verbalai import log_config
+import logging
+logger = logging.getLogger(__name__)
+
+# Optional tokenizer for counting the OpenAI tokens locally
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
 # Prices for input and output tokens per million tokens in dollars
 # as per 2024-04-16
 token_prices = {
@@ -82,37 +96,130 @@ token_prices = {
     }
 }
 
+# Prompt cache writes and reads are priced relative to the input tokens by the provider.
+# OpenAI caches the prompts automatically without a write cost, and halves the price of the cached tokens.
+cache_price_multipliers = {
+    "anthropic": {"cache_write": 1.25, "cache_read": 0.1},
+    "openai": {"cache_write": 1.0, "cache_read": 0.5}
+}
+
+# Models without the token prices, warned once
+unpriced_models = set()
+
+
+@lru_cache(maxsize=None)
+def get_encoding(model):
+    """Get the tiktoken encoding of the OpenAI model, or None if it is not available."""
+    if tiktoken is None or not model.startswith("gpt"):
+        return None
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        return None
+
+
+def count_tokens(text, model=""):
+    """Count the tokens of the text locally. Without a tokenizer, token is estimated as 4 characters."""
+    encoding = get_encoding(model)
+    if encoding:
+        return len(encoding.encode(text))
+    return (len(text) + 3) // 4
+
+
+def messages_text(messages):
+    """Join the text contents of the Anthropic or OpenAI messages."""
+    texts = []
+    for message in messages or []:
+        content = message.get("content", "")
+        if isinstance(content, str):
+            texts.append(content)
+        else:
+            texts.extend(block.get("text", "") for block in content if block.get("type") == "text")
+    return "\n".join(texts)
+
+
 class GPTTokenCalculator:
     
-    def __init__(self):
+    def __init__(self, ledger=None, governor=None):
         self.total_input_tokens = 0
         self.total_output_tokens = 0
+        # Anthropic prompt cache writes and reads are reported apart from the input tokens
+        self.total_cache_write_tokens = 0
+        self.total_cache_read_tokens = 0
         self.cost = 0.0
+        # Usage ledger records every call, see UsageLedger
+        self.ledger = ledger
+        # Budget governor limits the spending, see BudgetGovernor
+        self.governor = governor
+        self.lock = threading.Lock()
 
-    def update_token_counts(self, message, model, response = ""):
-        """Update the token counts based on a message."""
+    def get_usage(self, message, model, response = "", messages = None):
+        """Get the input, output, cache write, and cache read tokens of a single call. Missing usage is counted locally."""
+        usage = getattr(message, 'usage', None)
         # Anthropic models
-        if hasattr(message, 'usage') and 'claude' in model:
-            self.total_input_tokens += message.usage.input_tokens
-            self.total_output_tokens += message.usage.output_tokens
-        # OpenAI models
-        elif hasattr(message, 'usage') and 'gpt' in model:
-            # Extract total token usage
-            total_tokens_used = message['usage']['total_tokens']
-
-            # Calculate output tokens. In estimate, token is 4 characters.
-            self.total_output_tokens += len(response)/4
-            
-            # Calculate input tokens
-            self.total_input_tokens += total_tokens_used - self.total_output_tokens
-            
-        self.cost += token_prices[model]['input'] * (self.total_input_tokens / 1000000)
-        self.cost += token_prices[model]['output'] * (self.total_output_tokens / 1000000)
+        if usage is not None and 'claude' in model:
+            return {
+                "input_tokens": usage.input_tokens,
+                "output_tokens": usage.output_tokens,
+                "cache_write_tokens": getattr(usage, 'cache_creation_input_tokens', 0) or 0,
+                "cache_read_tokens": getattr(usage, 'cache_read_input_tokens', 0) or 0
+            }
+        # OpenAI models, cached tokens are included in the prompt tokens
+        if usage is not None:
+            details = getattr(usage, 'prompt_tokens_details', None)
+            cached_tokens = (getattr(details, 'cached_tokens', 0) or 0) if details else 0
+            return {
+                "input_tokens": usage.prompt_tokens - cached_tokens,
+                "output_tokens": usage.completion_tokens,
+                "cache_write_tokens": 0,
+                "cache_read_tokens": cached_tokens
+            }
+        return {
+            "input_tokens": count_tokens(messages_text(messages), model),
+            "output_tokens": count_tokens(response, model),
+            "cache_write_tokens": 0,
+            "cache_read_tokens": 0
+        }
+
+    def get_call_cost(self, usage, model):
+        """Get the cost of a single call in dollars."""
+        prices = token_prices.get(model)
+        if prices is None:
+            # Calls of the model are not counted in the cost or limited by the budget
+            if model not in unpriced_models:
+                unpriced_models.add(model)
+                logger.warning(f"No token prices for the model '{model}', its calls are priced at $0.")
+            prices = {"input": 0.0, "output": 0.0}
+        multipliers = cache_price_multipliers["anthropic" if 'claude' in model else "openai"]
+        input_tokens = usage["input_tokens"] + \
+            usage["cache_write_tokens"] * multipliers["cache_write"] + \
+            usage["cache_read_tokens"] * multipliers["cache_read"]
+        return (prices['input'] * input_tokens + prices['output'] * usage["output_tokens"]) / 1000000
 
+    def update_token_counts(self, message, model, response = "", purpose = "response", latency = None, messages = None):
+        """
+        Update the token counts and the cost based on a single call, and record the call to the usage ledger.
+        
+        Message is the API response or the final stream message or chunk with the usage. If the usage is
+        not available, tokens are counted locally from the response text and the request messages.
+        """
+        usage = self.get_usage(message, model, response, messages)
+        cost = self.get_call_cost(usage, model)
+        with self.lock:
+            self.total_input_tokens += usage["input_tokens"]
+            self.total_output_tokens += usage["output_tokens"]
+            self.total_cache_write_tokens += usage["cache_write_tokens"]
+            self.total_cache_read_tokens += usage["cache_read_tokens"]
+            self.cost += cost
+        if self.governor:
+            self.governor.record(purpose, cost)
+        if self.ledger:
+            self.ledger.add(dict(model=model, purpose=purpose, latency=latency, cost=cost, **usage))
+        return usage
 
     def get_token_usage(self):
         """Get the total sum of input and output tokens."""
-        return self.total_input_tokens + self.total_output_tokens
+        return self.total_input_tokens + self.total_output_tokens + self.total_cache_write_tokens + self.total_cache_read_tokens
     
     def get_cost(self):
         """The the total cost of the used input and output tokens."""
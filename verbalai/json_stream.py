@@ -0,0 +1,106 @@
+# json_stream.py - A Python module for parsing JSON incrementally from a language model text stream.
+import json
+
+# Import log lonfig as a side effect only
+from verbalai import log_config
+import logging
+logger = logging.getLogger(__name__)
+
+
+class JSONStreamParser:
+    """
+    Incremental JSON parser that reports the complete items of an array property
+    of the top level JSON object, while the rest of the JSON is still arriving.
+
+    Text before the JSON object, like an intro sentence of the language model, is skipped.
+    Only the first top level object is parsed, the whole text is available in the text
+    attribute for parsing the complete object after the stream has ended.
+
+    Example, items of the tools array are reported as soon as each tools[i] object is closed:
+        parser = JSONStreamParser("tools", lambda index, item: print(index, item))
+        for chunk in text_stream:
+            parser.feed(chunk)
+    """
+
+    def __init__(self, array_key, on_item):
+        self.array_key = array_key
+        self.on_item = on_item
+        self.text = ""
+        self.position = 0
+        # Open containers as [type, key of the current object property or index of the current array item]
+        self.stack = []
+        self.in_string = False
+        self.escape = False
+        self.string_start = None
+        self.last_string = None
+        self.root_start = None
+        self.item_start = None
+        self.items = []
+        self.done = False
+
+    def feed(self, chunk):
+        """ Parse the next chunk of the text stream. """
+        self.text += chunk
+        while self.position < len(self.text) and not self.done:
+            self.scan(self.text[self.position], self.position)
+            self.position += 1
+
+    def at_item_level(self):
+        """ Is the parser directly inside the array property of the top level object. """
+        return len(self.stack) == 2 and self.stack[0] == ["object", self.array_key] and self.stack[1][0] == "array"
+
+    def scan(self, char, position):
+        """ Update the parser state with the next character. """
+        if self.in_string:
+            if self.escape:
+                self.escape = False
+            elif char == "\\":
+                self.escape = True
+            elif char == '"':
+                self.in_string = False
+                self.last_string = self.text[self.string_start + 1:position]
+            return
+        if not self.stack:
+            # Skip everything before the top level object
+            if char == "{":
+                self.root_start = position
+                self.stack.append(["object", None])
+            return
+        if char == '"':
+            self.in_string = True
+            self.string_start = position
+        elif char == ":":
+            if self.stack[-1][0] == "object":
+                self.stack[-1][1] = self.last_string
+        elif char == ",":
+            if self.stack[-1][0] == "array":
+                self.stack[-1][1] += 1
+        elif char in "{[":
+            if self.at_item_level():
+                self.item_start = position
+            self.stack.append(["object", None] if char == "{" else ["array", 0])
+        elif char in "}]":
+            self.stack.pop()
+            if self.item_start is not None and self.at_item_level():
+                self.report_item(self.stack[-1][1], self.text[self.item_start:position + 1])
+                self.item_start = None
+            if not self.stack:
+                self.close_root(position)
+
+    def close_root(self, position):
+        """ Stop parsing after the top level object, unless it was not JSON, like braces in the intro text. """
+        try:
+            json.loads(self.text[self.root_start:position + 1])
+            self.done = True
+        except json.JSONDecodeError:
+            self.last_string = None
+
+    def report_item(self, index, item_text):
+        """ Parse the complete array item and report it. """
+        try:
+            item = json.loads(item_text)
+        except json.JSONDecodeError as e:
+            logger.warning(f"Could not parse streamed {self.array_key}[{index}]: {e}")
+            return
+        self.items.append(item)
+        self.on_item(index, item)
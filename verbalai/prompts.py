@@ -73,7 +73,6 @@ Modify all outputs to exclude asterisks, action indicators, tone indicators, and
 *****
 
 You are speaking with a user (username): <<username>>
-Date and time is now: <<datetime>>
 The current session's discussion id is: <<discussion_id>>
 The first discussion between you and the user happened at: <<first_discussion_date>>
 The previous discussion details are: <<previous_discussion>>
@@ -81,6 +80,20 @@ The previous discussion details are: <<previous_discussion>>
 """
 
 
+# Current date and time is given in the end of the latest user message instead of the system
+# messages, so that the system messages stay the same and they can be cached by the provider
+datetime_message = """
+Date and time is now: <<datetime>>
+"""
+
+
+# Long-term memory relevant to the user's utterance is given in the end of the latest user message, see MemoryRetriever
+memory_context_message = """
+Relevant memory of the earlier discussions with the user:
+<<memory>>
+"""
+
+
 # Generate a summary -prompt
 summary_generator_prompt = """
 Generate a brief summary of the conversation given below:
@@ -88,6 +101,19 @@ Generate a brief summary of the conversation given below:
 <<summary>>
 """
 
+system_message_summary = "You summarize the discussions between the user and the AI assistant. Keep the names, facts, decisions, and open questions."
+
+# Merge a lower level summary into the summary of a discussion or a period -prompt
+summary_merge_prompt = """
+Update the <<level>> summary below with the new summary of a later part of it. Keep the result brief, and keep the earlier content unless the new summary replaces it.
+
+<<level>> summary:
+<<summary>>
+
+New summary:
+<<new_summary>>
+"""
+
 
 tool_schemas = {
   "general": {
@@ -450,6 +476,33 @@ tool_schemas = {
             ]
           }
         },
+      "retrieve_period_summary":
+        {
+          "description": "Retrieve the precomputed summary of a discussion, or the digest of the discussions of a week or a month. Prompts like 'What did we discuss last month?' would utilize this tool. Give the date within the week or the month, or the discussion id for a discussion summary. With a phrase, the summaries of the level most similar to the phrase are retrieved instead.",
+          "arguments": {
+            "type": "object",
+            "properties": {
+              "level": {
+                "type": "string",
+                "description": "Level of the summary.",
+                "enum": ["discussion", "week", "month"]
+              },
+              "date": {
+                "type": ["string", "null"],
+                "description": "A date within the week or the month, in ISO 8601 format. Defaults to today."
+              },
+              "discussion_id": {
+                "$ref": "#/definitions/discussionId"
+              },
+              "phrase": {
+                "type": ["string", "null"],
+                "description": "The query phrase will be compared/matched against the summaries."
+              }
+            },
+            "required": ["level"],
+            "additionalProperties": False
+          }
+        },
       "retrieve_discussion_statistics": 
         {
           # Example prompt added to help Claude Haiku model on selecting correct arguments.
@@ -523,10 +576,6 @@ Response format:
 Always provide the whole schema in the given format.
 <<tools>><<tools_epilogue>>
 Respond with a JSON string only. Property names must be enclosed in double quotes. Do not generate intros, outros, explanations, etc.
-
-*****
-
-Date and time is now: <<datetime>>
 """
 
 
@@ -558,14 +607,44 @@ system_message_metadata_schema = """
 """
 
 
-def render_selected_schemas(tool_args):
-    """Render selected schemas based on tool arguments"""
+# Metadata of several stored dialogue units is deduced in a single request
+# in the deferred metadata mode, see MetadataEnricher
+system_message_metadata_batch = """
+Deduce topics, sentiment, and intent of the user's input in each of the given dialogue units.
+
+Response format:
+[
+    {
+        "id": <<dialogue_unit_id>>,
+        "topics": ["<<Topic>>",],
+        "sentiment": {
+            "positive_score": <<positive_score_from_0.0_to_1.0>>,
+            "negative_score": <<negative_score_from_0.0_to_1.0>>
+        },
+        "intent": "<<intent>>"
+    },
+]
+Always provide one object for each dialogue unit, with the id of the dialogue unit.
+Respond with a JSON array only. Property names must be enclosed in double quotes. Do not generate intros, outros, explanations, etc.
+"""
+
+
+def render_selected_schemas(tool_args, compact=False, descriptions=True):
+    """
+    Render selected schemas based on tool arguments.
+    
+    Compact rendering minifies the JSON, moves the enums shared by several properties to the
+    definitions, and leaves out the argument descriptions, if descriptions is False. Human readable
+    format gives only the first sentence of each tool description.
+    """
     global tool_schemas
     result, human_format = "", ""
     for group, content in collect_schemas(tool_args, tool_schemas).items():
         # Print the header
         result += "\n" + content['header'] + "\n"
         human_format += "\n" + content['header'] + "\n"
+        if compact:
+            content = compact_schemas(content, descriptions)
         # Convert the schemas dictionary for this group to a JSON string and print it
         if "definitions" in content:
             data = {
@@ -575,12 +654,73 @@ def render_selected_schemas(tool_args):
         else:
             data = content['schemas']
         for tool, schema in content['schemas'].items():
-            human_format += f"\n- {tool}: " + schema['description'] + "\n"
-        result += "\n" + json.dumps(data) + "\n"
+            description = schema['description'].split(". ")[0].rstrip(".") + "." if compact else schema['description']
+            human_format += f"\n- {tool}: " + description + "\n"
+        result += "\n" + (json.dumps(data, separators=(",", ":")) if compact else json.dumps(data)) + "\n"
     # Return both machine targeted json string and human readable text
     return result, human_format
 
 
+def compact_schemas(content, descriptions=True):
+    """Get a copy of the group schemas with the shared enums moved to the definitions, and optionally without the argument descriptions"""
+    content = json.loads(json.dumps(content))
+    definitions = content.get("definitions", {})
+    
+    def strip_descriptions(node, in_properties=False):
+        # Keys of the properties are property names, so a property called description is kept
+        if isinstance(node, dict):
+            if not in_properties and isinstance(node.get("description"), str):
+                del node["description"]
+            for key, value in node.items():
+                strip_descriptions(value, key == "properties" and not in_properties)
+        elif isinstance(node, list):
+            for item in node:
+                strip_descriptions(item)
+    
+    # Collect the properties with an enum by the property name
+    enum_properties = []
+    def find_enums(node):
+        if isinstance(node, dict):
+            for name, value in node.get("properties", {}).items():
+                if isinstance(value, dict) and isinstance(value.get("enum"), list):
+                    enum_properties.append((name, value))
+            for value in node.values():
+                find_enums(value)
+        elif isinstance(node, list):
+            for item in node:
+                find_enums(item)
+    
+    for schema in content["schemas"].values():
+        # Some arguments are given as a plain properties dictionary without the object type
+        properties_only = "type" not in schema["arguments"]
+        if not descriptions:
+            strip_descriptions(schema["arguments"], properties_only)
+        find_enums({"properties": schema["arguments"]} if properties_only else schema["arguments"])
+    if not descriptions:
+        strip_descriptions(definitions, True)
+    find_enums({"properties": definitions})
+    
+    # Replace the enums used more than once with a reference to a shared definition,
+    # types are left to the properties, because they may differ by nullability
+    shared_enums = {}
+    for name, value in enum_properties:
+        shared_enums.setdefault(json.dumps(value["enum"]), []).append((name, value))
+    for properties in shared_enums.values():
+        if len(properties) < 2:
+            continue
+        name = properties[0][0] + "Enum"
+        while name in definitions:
+            name += "_"
+        definitions[name] = {"enum": properties[0][1]["enum"]}
+        for _, value in properties:
+            value.pop("enum")
+            value["$ref"] = f"#/definitions/{name}"
+    
+    if definitions:
+        content["definitions"] = definitions
+    return content
+
+
 def collect_schemas(tool_args, tool_schemas):
     """Collect schemas specified in tool_args from tool_schemas"""
     
@@ -0,0 +1,155 @@
+# startup.py - A module for lazy and background initialization of the heavy application components.
+import time
+import threading
+from contextlib import contextmanager
+
+# Import log lonfig as a side effect only
+from verbalai import log_config
+import logging
+logger = logging.getLogger(__name__)
+
+
+class StartupProfiler:
+    """ Collects the time spent on initializing each application component. """
+
+    def __init__(self):
+        self.start_time = time.perf_counter()
+        self.timings = []
+        self.pending = set()
+        self.lock = threading.Lock()
+
+    @contextmanager
+    def measure(self, name):
+        """ Measure the time spent inside the context for the named component. """
+        thread_name = threading.current_thread().name
+        with self.lock:
+            self.pending.add(name)
+        start_time = time.perf_counter()
+        try:
+            yield
+        finally:
+            duration = time.perf_counter() - start_time
+            with self.lock:
+                self.pending.discard(name)
+                self.timings.append((name, start_time - self.start_time, duration, thread_name))
+            logger.info(f"Startup component '{name}' initialized in {round(duration, 4)} seconds ({thread_name}).")
+
+    def report(self):
+        """ Format the per-component timing breakdown as text lines. """
+        with self.lock:
+            timings = sorted(self.timings, key=lambda timing: timing[1])
+            pending = sorted(self.pending)
+        lines = [f"{'Component':<24}{'Start (s)':>10}{'Duration (s)':>14}  Thread"]
+        for name, start, duration, thread_name in timings:
+            lines.append(f"{name:<24}{start:>10.3f}{duration:>14.3f}  {thread_name}")
+        for name in pending:
+            lines.append(f"{name:<24}{'':>10}{'loading...':>14}")
+        lines.append(f"{'Total elapsed':<24}{'':>10}{time.perf_counter() - self.start_time:>14.3f}")
+        return lines
+
+    def print_report(self):
+        """ Print the per-component timing breakdown. """
+        print("# Startup profile:")
+        for line in self.report():
+            print(f"# {line}")
+
+
+class LazyComponent:
+    """
+    A proxy that creates the wrapped component on the first attribute access.
+
+    Component can also be created ahead of time in a background thread with the
+    preload method, so that the first real use does not pay the creation cost.
+    """
+
+    def __init__(self, name, factory, profiler=None):
+        self.name = name
+        self.factory = factory
+        self.profiler = profiler
+        self.instance = None
+        self.lock = threading.Lock()
+
+    @property
+    def loaded(self):
+        """ Has the component been created already. """
+        return self.instance is not None
+
+    def get(self):
+        """ Get the component, creating it on the first call. """
+        if self.instance is None:
+            with self.lock:
+                if self.instance is None:
+                    if self.profiler:
+                        with self.profiler.measure(self.name):
+                            self.instance = self.factory()
+                    else:
+                        self.instance = self.factory()
+        return self.instance
+
+    def preload(self):
+        """ Create the component in a background thread. """
+        def preload_worker():
+            try:
+                self.get()
+            except Exception as e:
+                # The first real use will retry the creation and raise the error
+                logger.error(f"Error preloading component '{self.name}'; {e}")
+        thread = threading.Thread(target=preload_worker, name=f"preload-{self.name}", daemon=True)
+        thread.start()
+        return thread
+
+    def __getattr__(self, attribute):
+        return getattr(self.get(), attribute)
+
+
+class WarmUp:
+    """
+    Runs the warm-up tasks of the application components in background threads.
+
+    Warm-up tasks take the cold-start costs, like lazy kernel initialization and
+    connection handshakes, off the first turn. The first turn waits for the readiness.
+    """
+
+    def __init__(self, profiler=None):
+        self.profiler = profiler
+        self.start_time = time.perf_counter()
+        self.threads = []
+        self.errors = {}
+        self.finish_times = {}
+
+    def start(self, name, task):
+        """ Start the named warm-up task in a background thread. """
+        def warm_up_worker():
+            try:
+                if self.profiler:
+                    with self.profiler.measure(name):
+                        task()
+                else:
+                    task()
+            except Exception as e:
+                # Warm-up is an optimization only, the first real use will retry and raise the error
+                self.errors[name] = str(e)
+                logger.error(f"Error warming up component '{name}'; {e}")
+            finally:
+                self.finish_times[name] = time.perf_counter() - self.start_time
+        thread = threading.Thread(target=warm_up_worker, name=f"warm-up-{name}", daemon=True)
+        self.threads.append(thread)
+        thread.start()
+        return thread
+
+    @property
+    def ready(self):
+        """ Have all the started warm-up tasks completed. """
+        return not any(thread.is_alive() for thread in self.threads)
+
+    def wait(self, timeout=None):
+        """ Wait until all the warm-up tasks have completed, or the timeout (seconds) has passed. Returns the readiness. """
+        deadline = None if timeout is None else time.perf_counter() + timeout
+        for thread in list(self.threads):
+            thread.join(None if deadline is None else max(0, deadline - time.perf_counter()))
+        return self.ready
+
+    @property
+    def ready_time(self):
+        """ Seconds from the start of the warm-up to the completion of the last task. """
+        return max(self.finish_times.values(), default=0.0) if self.ready else None
@@ -0,0 +1,136 @@
+# streaming.py - A Python module for speculative language model response streaming and turn timing.
+import time
+import threading
+from queue import Queue
+
+# Import log lonfig as a side effect only
+from verbalai import log_config
+import logging
+logger = logging.getLogger(__name__)
+
+
+class TurnTimer:
+    """
+    Records the start and end times of the phases of a single turn.
+
+    Phases may run concurrently, for example the metadata retrieval and the response
+    stream, and the timer reports how much of their durations overlapped.
+    """
+
+    def __init__(self):
+        self.start_time = time.perf_counter()
+        self.phases = {}
+        self.marks = {}
+        self.lock = threading.Lock()
+
+    def start(self, name):
+        """ Record the start of the named phase. """
+        with self.lock:
+            self.phases[name] = [time.perf_counter() - self.start_time, None]
+
+    def end(self, name):
+        """ Record the end of the named phase. """
+        with self.lock:
+            if name in self.phases and self.phases[name][1] is None:
+                self.phases[name][1] = time.perf_counter() - self.start_time
+
+    def mark(self, name):
+        """ Record a single point of time, like the first token of the response, unless already recorded. """
+        with self.lock:
+            self.marks.setdefault(name, time.perf_counter() - self.start_time)
+
+    def overlap(self, first, second):
+        """ Seconds the two phases were running at the same time. """
+        with self.lock:
+            if first not in self.phases or second not in self.phases:
+                return 0.0
+            now = time.perf_counter() - self.start_time
+            (first_start, first_end), (second_start, second_end) = self.phases[first], self.phases[second]
+        return max(0.0, min(first_end or now, second_end or now) - max(first_start, second_start))
+
+    def summary(self):
+        """ Get the phase start times and durations, and the marks, in seconds from the start of the turn. """
+        now = time.perf_counter() - self.start_time
+        with self.lock:
+            data = {}
+            for name, (start, end) in self.phases.items():
+                data[f"{name}_start"] = round(start, 4)
+                data[f"{name}_duration"] = round((end or now) - start, 4)
+            for name, value in self.marks.items():
+                data[name] = round(value, 4)
+        return data
+
+
+class SpeculativeStream:
+    """
+    Reads a text stream in a background thread into a buffer.
+
+    The stream can be opened before it is known whether the response is needed in its
+    current form, and cancelled if it is not. Reading the stream yields the buffered
+    chunks first, and then the rest of the chunks as they arrive.
+
+    The open_stream argument is a function that takes the cancellation event and
+    returns a context manager yielding an iterable of text chunks.
+    """
+
+    def __init__(self, open_stream, turn_timer=None, name="response"):
+        self.open_stream = open_stream
+        self.turn_timer = turn_timer
+        self.name = name
+        self.queue = Queue()
+        self.cancelled = threading.Event()
+        self.finished = False
+        self.thread = threading.Thread(target=self.read_stream, name=f"stream-{name}", daemon=True)
+        self.thread.start()
+
+    def read_stream(self):
+        """ Read the chunks of the stream to the buffer until the stream ends or it is cancelled. """
+        if self.turn_timer:
+            self.turn_timer.start(self.name)
+        try:
+            if self.cancelled.is_set():
+                return
+            with self.open_stream(self.cancelled) as stream:
+                try:
+                    for chunk in stream:
+                        if self.cancelled.is_set():
+                            break
+                        if self.turn_timer:
+                            self.turn_timer.mark(f"{self.name}_first_token")
+                        self.queue.put(chunk)
+                finally:
+                    # Closing the generator closes the HTTP response of a cancelled stream
+                    if hasattr(stream, "close"):
+                        stream.close()
+        except Exception as e:
+            # Errors are raised to the reader of the stream
+            self.queue.put(e)
+        finally:
+            if self.turn_timer:
+                self.turn_timer.end(self.name)
+            self.queue.put(None)
+
+    def cancel(self):
+        """ Cancel the stream, the chunks generated so far are discarded. """
+        if not self.cancelled.is_set():
+            self.cancelled.set()
+            logger.info(f"Speculative {self.name} stream cancelled.")
+
+    def __iter__(self):
+        while True:
+            chunk = self.queue.get()
+            if chunk is None:
+                self.finished = True
+                return
+            if isinstance(chunk, Exception):
+                raise chunk
+            yield chunk
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        # Stop reading the stream if it was not read to the end
+        if not self.finished:
+            self.cancel()
+        return False
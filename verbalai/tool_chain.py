@@ -1,6 +1,6 @@
 # tool_chain.py - A module to chain AI chat function calling tools together
-from anthropic import Anthropic
 from verbalai.claude_tools import schemas
+from verbalai.LLMProvider import AnthropicProvider, create_anthropic_client, usage_tokens
 from dotenv import load_dotenv
 from verbalai.log_config import setup_logging
 import logging
@@ -28,8 +28,10 @@ token_prices = {
 }
 
 class ToolChain:
-    def __init__(self, model="claude-3-haiku-20240307"):
-        self.gpt_client = Anthropic()
+    def __init__(self, model="claude-3-haiku-20240307", provider=None):
+        # Client of the provider shares the pooled connections of the provider
+        self.provider = provider or AnthropicProvider(create_anthropic_client())
+        self.gpt_client = self.provider.client
         self.model = model
         self.total_input_tokens = 0
         self.total_output_tokens = 0
@@ -44,6 +46,19 @@ class ToolChain:
             self.cost += token_prices[self.model]['input'] * (self.total_input_tokens / 1000000)
             self.cost += token_prices[self.model]['output'] * (self.total_output_tokens / 1000000)
 
+    def _create_tool_message(self, messages, tool_config):
+        """Create the tool message within the rate limits shared with the other Anthropic calls."""
+        with self.provider.limit("", [messages, tool_config], 500) as permit:
+            tool_message = self.gpt_client.beta.tools.messages.create(
+                model=self.model,
+                messages=messages,
+                max_tokens=500,
+                temperature=0,
+                tools=tool_config
+            )
+            permit.used_tokens = usage_tokens(tool_message)
+        return tool_message
+
     def get_tool_messages(self, tool_name, text, callbacks):
 
         self.inference_message_word_count = 0
@@ -56,13 +71,7 @@ class ToolChain:
         
         messages = [{"role": "user", "content": [{"type": "text", "text": text}]}]
 
-        tool_message = self.gpt_client.beta.tools.messages.create(
-            model=self.model,
-            messages=messages,
-            max_tokens=500,
-            temperature=0,
-            tools=tool_config
-        )
+        tool_message = self._create_tool_message(messages, tool_config)
 
         # Update token counts
         self._update_token_counts(tool_message)
@@ -114,13 +123,7 @@ class ToolChain:
 
         messages = [{"role": "user", "content": [{"type": "text", "text": text}]}]
 
-        tool_message = self.gpt_client.beta.tools.messages.create(
-            model=self.model,
-            messages=messages,
-            max_tokens=500,
-            temperature=0,
-            tools=tool_config
-        )
+        tool_message = self._create_tool_message(messages, tool_config)
 
         # Update token counts
         self._update_token_counts(tool_message)
@@ -167,13 +170,7 @@ class ToolChain:
             )
 
             # Get the final message
-            final_message = self.gpt_client.beta.tools.messages.create(
-                model=self.model,
-                messages=messages,
-                max_tokens=500,
-                temperature=0,
-                tools=tool_config
-            )
+            final_message = self._create_tool_message(messages, tool_config)
             
             # TODO: How about chained tools?
             # For instance, if a result list is given, the next tool could be called on the selected item in the list
@@ -4,22 +4,25 @@ import os
 import re
 import sys
 import time
+import copy
 import json
 import argparse
 import traceback
 import subprocess
 from queue import Empty
 from threading import Thread
+from functools import lru_cache
 from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
 # Installed packages
 import keyboard
-from anthropic import Anthropic
-from openai import OpenAI
 from colorama import init, Fore, Style, Back
 # Library imports
 from .prompts import (
     previous_context,
     system_message,
+    datetime_message,
+    memory_context_message,
     summary_generator_prompt,
     system_message_metadata,
     render_selected_schemas,
@@ -28,9 +31,13 @@ from .prompts import (
     system_message_metadata_tools_epilogue,
     system_message_metadata_schema_tools_part
 )
-from .audio_stream_server import ServerThread
-from .deepgramio import DeepgramIO
-from .VectorDB import VectorDB
+from .VectorDB import VectorDB, embedding_backends
+from .startup import StartupProfiler, LazyComponent, WarmUp
+from .streaming import SpeculativeStream, TurnTimer
+from .MetadataEnricher import MetadataEnricher
+from .json_stream import JSONStreamParser
+from .ToolScheduler import ToolScheduler
+from .ContextWindowManager import ContextWindowManager, get_context_token_budget
 # NOTE: tool chain and intent module has been disabled
 # these and associated variables can be uncommented,
 # if developing the sub project related to them
@@ -39,7 +46,21 @@ from .VectorDB import VectorDB
 # providing tools in system prompt as json schemas
 #from .commands import predict_intent
 #from .tool_chain import ToolChain
-from .gpt_token_calculator import GPTTokenCalculator
+from .gpt_token_calculator import GPTTokenCalculator, token_prices
+from .UsageLedger import UsageLedger
+from .BudgetGovernor import BudgetGovernor
+from .ModelRouter import ModelRouter, load_router_rules
+from .ResponseCache import ResponseCache
+from .FeedbackScheduler import FeedbackScheduler
+from .TurnScheduler import TurnScheduler
+from .SummaryWorker import SummaryWorker
+from .SummaryTree import SummaryTree, digest_periods, parse_date
+from .MemoryRetriever import MemoryRetriever
+from .MetadataCache import MetadataCache
+from .ConversationOrchestrator import ConversationOrchestrator
+from .LLMProvider import AnthropicProvider, OpenAIProvider, create_anthropic_client, create_openai_client
+from .HedgedProvider import HedgedProvider, default_latency_slos
+from .RateLimiter import RateLimitCancelled, configure_rate_limiter, parse_rate_limit, report as rate_limit_report
 
 # Import log lonfig as a side effect only
 from .log_config import setup_logging
@@ -47,6 +68,8 @@ import logging
 logger = logging.getLogger(__name__)
 
 # Check if ffmpeg is installed
+# The result is cached so that the subprocess is spawned only once and only when needed
+@lru_cache(maxsize=None)
 def is_ffmpeg_installed():
     try:
         subprocess.run(["ffmpeg", "-version"], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
@@ -55,16 +78,6 @@ def is_ffmpeg_installed():
         return False
 
 
-# Additional imports for file and URL processing
-try:
-    from pydub import AudioSegment
-    if not is_ffmpeg_installed():
-        raise ImportError("ffmpeg is required for MP3 processing but not found. Download from: https://ffmpeg.org/")
-except ImportError as e:
-    AudioSegment = None
-    ffmpeg_error = str(e)
-
-
 # Load environment variables from a .env file
 from dotenv import load_dotenv
 load_dotenv()
@@ -86,8 +99,25 @@ ascii_art = """
 # Initialize the colorama module for colored text output
 init(autoreset=True)
 
-# Initialize the VectorDB instance
-vector_db = VectorDB()
+# Startup profiler for the per-component initialization timings
+startup_profiler = StartupProfiler()
+
+# Print the startup profile after the initialization
+startup_profile = False
+
+# Warm-up tasks run in the background during the initialization,
+# the first turn waits for them to complete, see gpt_inference
+warm_up = WarmUp(startup_profiler)
+
+# Maximum seconds the first turn waits for the warm-up to complete
+warm_up_timeout = 30
+
+# Text embedding backend for the VectorDB: torch, torch-int8, onnx, or onnx-int8
+embedding_backend = os.getenv("EMBEDDING_BACKEND", "torch")
+
+# Initialize the VectorDB instance lazily on the first use,
+# embedding model and vector index are loaded in the background in main
+vector_db = LazyComponent("vector_db", lambda: VectorDB(embedding_backend=embedding_backend), startup_profiler)
 
 # Initialize the ToolChain instance
 #tool_chain = None
@@ -148,6 +178,18 @@ openai_models = [
 # Command extraction model
 command_extraction_model = "claude-3-haiku-20240307"
 
+# Mark the system messages as the Anthropic prompt cache breakpoints
+prompt_caching = True
+
+# Render the tool schemas and the previous discussion of the system messages in a compact form
+compact_prompts = False
+
+# Include the argument descriptions in the compact tool schemas
+schema_descriptions = True
+
+# Print the estimated tokens of the system prompt sections
+prompt_report = False
+
 # Available models for the chatbot
 available_models = anthropic_models + openai_models
 
@@ -192,17 +234,107 @@ username = "VerbalHuman"
 # Initialize the audio recorder
 audio_recorder = None
 
+# Base URL of the model provider API, empty for the default URL of the provider
+provider_base_url = ""
+
+# API key of the local fake provider server, the real keys are not sent to it
+provider_api_key = None
+
+# Replay the recorded responses from the local fake provider server, see fake_provider_server
+fake_provider = False
+fake_first_token_delay = 0.3
+fake_token_delay = 0.02
+
+# JSON Lines file of the recorded responses, replayed by the fake provider server
+llm_recordings = ""
+
+# Seconds a provider request may wait for the connection or the next chunk of the response
+request_timeout = 60.0
+
+# Hedge the requests exceeding the latency SLO of their purpose with a duplicate
+# request, or with the hedge model, see HedgedProvider. Hedged requests are billed too,
+# so they are sent only when enabled with --hedged_requests
+hedged_requests = False
+latency_slos = [f"{purpose}={seconds}" for purpose, seconds in default_latency_slos.items()]
+hedge_model = None
+
+# Rate limits shared by the calls to the provider APIs, in the format
+# provider=requests:tokens:in_flight per minute, see RateLimiter
+rate_limits = []
+
 # Initialize the GPT clients
 # Note: dotenv handles the API key loading
-# Initialize the Anthropic client
-gpt_client = Anthropic()
+# Clients and their SDK imports are created on the first use,
+# so that only the client of the selected model is ever created
+gpt_client = LazyComponent("anthropic_client", lambda: create_anthropic_client(provider_base_url or None, provider_api_key, request_timeout), startup_profiler)
+gpt_client_openai = LazyComponent("openai_client", lambda: create_openai_client(provider_base_url or None, provider_api_key, request_timeout), startup_profiler)
 
-# Initialize the OpenAI client
-gpt_client_openai = OpenAI()
+# Initialize the provider of the selected model in main, see LLMProvider
+gpt_provider = None
 
 # Initialize the session message buffer
 messages = []
 
+# Input token budget of the requests, None for the budget of the selected model
+context_token_budget = None
+
+# Number of user turns after which the tool outputs are evicted from the requests
+tool_output_turns = 2
+
+# Messages of the requests are built from the session messages under the token budget.
+# Older messages are sent as a rolling summary, see handle_summary_creation
+context_window = ContextWindowManager()
+
+# Are function calling tools given in the command line, see render_selected_schemas in main
+function_calling_tools_enabled = False
+
+# Metadata is retrieved in a background thread, concurrently with the response stream
+metadata_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="metadata")
+
+# Maximum seconds a turn waits for a single function calling tool
+tool_timeout = 20
+
+# Timing of the latest turn for the inference log
+turn_timing = {}
+
+# JSON file of the response model routing rules, see ModelRouter
+router_rules_file = ""
+
+# Initialize the model router without rules, all responses use the selected model
+model_router = ModelRouter()
+
+# Routing signals and the routed model of the latest turn for the inference log
+turn_route = {}
+
+# Answer the repeated final prompts from the semantic response cache, see ResponseCache
+response_cache_enabled = False
+response_cache_similarity = 0.92
+response_cache_ttl = 3600
+
+# Initialize the response cache, when enabled in main
+response_cache = None
+
+# Seconds without new speech before the intermediate feedback is requested
+feedback_debounce = 0.5
+
+# Initialize the feedback scheduler in main, see FeedbackScheduler
+feedback_scheduler = None
+
+# Initialize the turn scheduler in main. Turns modifying the messages are executed one at a time, see TurnScheduler
+turn_scheduler = None
+
+# Run the conversation on an asyncio event loop instead of the hotkey threads,
+# the feedback scheduler, and the turn scheduler, see ConversationOrchestrator
+async_orchestrator = False
+orchestrator = None
+
+# Store the dialogue units without metadata and deduce the metadata
+# later in background batches, see MetadataEnricher
+deferred_metadata = False
+
+# Initialize the metadata enricher for the deferred metadata mode
+metadata_enricher = None
+
 # Initialize the meessage counter for monitoring the API request usage
 inference_message_word_count = 0
 
@@ -237,10 +369,55 @@ deepgram_streamer = None
 # GPT API token cost calculator
 gpt_token_calculator = None
 
+# Usage ledger records the tokens, latency, and cost of each language model call
+usage_ledger = None
+
+# Session spending limits in dollars, None for unlimited, see BudgetGovernor
+budget_soft_limit = None
+budget_hard_limit = None
+
+# Spending limits by the call purpose in dollars, given as purpose=limit
+budget_purpose_limits = []
+
+# Cheaper model of the same provider for the responses after the soft limit
+budget_fallback_model = None
+
+# Initialize the budget governor without limits
+budget_governor = BudgetGovernor()
+
 # Summary generator settings
 summary_index = 0
 summary_message_count = 10
 
+# Model of the summaries, by default the cheapest model of the selected provider
+summary_model = None
+
+# Initialize the background summary worker in main, see SummaryWorker
+summary_worker = None
+
+# Period of the digests the discussion summaries are merged into: week or month
+digest_period = "month"
+
+# Initialize the hierarchical summaries in main, see SummaryTree
+summary_tree = None
+
+# Inject the long-term memory relevant to the utterance to each final request,
+# instead of the previous discussion summaries in the system message, see MemoryRetriever
+memory_retrieval = True
+memory_top_k = 5
+memory_token_budget = 400
+
+# Initialize the memory retriever in main
+memory_retriever = None
+
+# Metadata of the repeated message windows is cached, see MetadataCache. Size 0 disables the cache
+metadata_cache_size = 256
+metadata_cache_ttl = 3600
+metadata_cache_file = ""
+
+# Initialize the metadata cache in main
+metadata_cache = None
+
 ###################################################
 # CONSOLE MAGIC
 ###################################################
@@ -354,6 +531,22 @@ def assign_category(kwargs):
         return f"There was a problem on assigning category to the discussion; {e}", False
 
 
+def retrieve_period_summary(kwargs):
+    try:
+        level = kwargs["level"]
+        if kwargs.get("phrase"):
+            nodes = summary_tree.find(kwargs["phrase"], level)
+        elif level == "discussion":
+            nodes = summary_tree.retrieve_summaries(level, discussion_id=vector_db.extract_discussion_id(kwargs.get("discussion_id") or "current"))
+        else:
+            nodes = summary_tree.retrieve_summaries(level, day=parse_date(kwargs["date"]) if kwargs.get("date") else None)
+        if not nodes:
+            return f"No {level} summaries found.", True
+        return f"Summaries: {[{'level': node['level'], 'period': node['period'], 'summary': node['summary']} for node in nodes]}", True
+    except Exception as e:
+        return f"There was a problem on retrieving the summary; {e}", False
+
+
 callbacks = {
     "assign_category": lambda kwargs: assign_category(kwargs),
     "modify_discussion": lambda kwargs: modify_discussion(kwargs),
@@ -363,16 +556,27 @@ callbacks = {
     "find_discussions": lambda kwargs: find_discussions(kwargs),
     "find_dialogue_units": lambda kwargs: find_dialogue_units(kwargs),
     "retrieve_discussion_statistics": lambda kwargs: retrieve_discussion_statistics(kwargs),
+    "retrieve_period_summary": lambda kwargs: retrieve_period_summary(kwargs),
     "upsert_data_entry": lambda kwargs: upsert_data_entry(kwargs),
     "retrieve_data_entry": lambda kwargs: retrieve_data_entry(kwargs)
 }
 
+# Independent tools of a turn are called concurrently, also while the rest
+# of the metadata is still being generated, see prompt.
+# Tools writing to the database are serialized by the write lock of VectorDB,
+# and they are waited for without the timeout, since their writes can not be cancelled.
+tool_scheduler = ToolScheduler(
+    callbacks,
+    timeout=tool_timeout,
+    write_tools=["assign_category", "modify_discussion", "remove_category", "upsert_data_entry"]
+)
+
 
 ###################################################
 # LANGUAGE INFERENCE
 ###################################################
 
-def prompt(text, final=False):
+def prompt(text, final=False, cancelled=None):
     """
     Processes and displays a given text input in the chat system, and optionally 
     initiates a text-to-speech conversion of the generated response.
@@ -387,6 +591,8 @@ def prompt(text, final=False):
                               affecting the mode of response generation and potentially 
                               initiating text-to-speech conversion.
       Defaults to False.
+    - cancelled (threading.Event, optional): Cancellation event of a feedback request.
+                              Cancelled feedback is not printed.
 
     Global Variables:
     - inference_message_word_count (int): A counter for the total word count of messages 
@@ -406,6 +612,7 @@ def prompt(text, final=False):
 
     Returns:
     - str: The generated response to the input text, for logging or further processing.
+      None, if the feedback was cancelled.
     """
     
     global gpt_token_calculator, inference_message_word_count, gpt_model, system_message, messages, username, response_token_limit, feedback_token_limit, voice_model_id, elevenlabs_streamer, disable_voice_output, verbose, deepgram_streamer, deepgram_voice_id, command_extraction_model, low_confidence_threshold, intent_model_path, system_message_tools_human_format
@@ -428,209 +635,313 @@ def prompt(text, final=False):
     intent = ""
     tools = []
     
+    turn_timer = TurnTimer()
+    
     # Retrieve user prompt metadata and function calling tool extraction with GPT
+    # in the background, concurrently with the response stream.
     # Metadata function relies on the global messages variable
     latest_messages = messages[-5:]
-    metadata = gpt_retrieve_metadata(latest_messages)
-    if metadata:
-        topics = metadata.get("topics", [])
-        sentiment = metadata.get("sentiment", {})
-        intent = metadata.get("intent", "")
-        tools = metadata.get("tools", [])
-        # There is a change that part of the tools require information
-        # but some do not, so this flag should not prevent the complete tools
-        # to be excluded from execution. Better name would be:
-        # system_requires_more_information_to_execute_any_of_the_tools i.e.e none of the
-        # tools can not be executed without more information...
-        system_requires_more_information_to_use_tools = metadata.get("system_requires_more_information_to_use_tools", True)
-    
-    logger.info(metadata)
+    metadata = None
+    
+    def wait_for_metadata():
+        """ Wait for the metadata retrieval and set the metadata fields. """
+        nonlocal metadata, topics, sentiment, intent, tools
+        if metadata is not None:
+            return
+        if metadata_future is None:
+            metadata = {}
+            return
+        try:
+            metadata = metadata_future.result()
+        except Exception as e:
+            # Response may have been streamed already, so the turn continues without metadata
+            logger.error(f"Error retrieving metadata; {e}")
+            metadata = {}
+        if metadata:
+            topics = metadata.get("topics", [])
+            sentiment = metadata.get("sentiment", {})
+            intent = metadata.get("intent", "")
+            tools = metadata.get("tools", [])
+            # There is a change that part of the tools require information
+            # but some do not, so this flag should not prevent the complete tools
+            # to be excluded from execution. Better name would be:
+            # system_requires_more_information_to_execute_any_of_the_tools i.e.e none of the
+            # tools can not be executed without more information...
+            system_requires_more_information_to_use_tools = metadata.get("system_requires_more_information_to_use_tools", True)
+        logger.info(metadata)
+    
+    # Repeated questions are answered from the semantic response cache without the language model calls
+    cache_hit = None
+    if response_cache and final:
+        try:
+            cache_hit = response_cache.lookup(text)
+        except Exception as e:
+            logger.error(f"Error looking up the response cache; {e}")
+    if cache_hit:
+        metadata = {}
+        topics, sentiment, intent = cache_hit["topics"], cache_hit["sentiment"], cache_hit["intent"]
+    
+    # System message is static, the current datetime is appended to the request messages
+    system = system_message
+    
+    # Purpose of the response calls in the usage ledger
+    purpose = "response" if final else "feedback"
+    
+    # Signals of the turn for routing the response model, intent and tools are known after the metadata
+    route_signals = {"words": len(text.split()), "intent": "", "tools": 0, "history": len(messages), "final": final}
+    
+    def plan_response():
+        """ Route the response model, and downgrade the model, output tokens, and context as the budget limits approach. """
+        routed_model, rule = model_router.route(route_signals)
+        planned = budget_governor.plan(
+            purpose,
+            routed_model,
+            response_token_limit if final else feedback_token_limit,
+            context_window.token_budget
+        )
+        turn_route.clear()
+        turn_route.update(route_signals, rule=rule, model=planned[0])
+        logger.info(f"Response model routed: {turn_route}")
+        return planned
+    
+    if not cache_hit:
+        response_model, max_tokens, context_budget = plan_response()
+    
+    # Long-term memory of the final response is retrieved once per turn, on the stream thread
+    memory = None
+    
+    def get_memory():
+        """ Get the memory context block relevant to the user's utterance. """
+        nonlocal memory
+        if memory is None:
+            memory = ""
+            if memory_retriever and final:
+                try:
+                    memory = memory_retriever.build_context(text)
+                except Exception as e:
+                    logger.error(f"Error retrieving memory; {e}")
+        return memory
+    
+    # Log last 5 messages without index error
+    #logger.info(messages[-min(len(messages), 5):])
+    
+    @contextmanager
+    def get_gpt_stream(cancelled=None):
+        """ Get the GPT API stream for generating responses. """
+        # Messages are built at the stream start, so that a restarted stream includes the tool results
+        request_messages = append_datetime(append_memory(context_window.build(messages, system, context_budget), get_memory()))
+        stream_start_time = time.time()
+        try:
+            with gpt_provider.stream(
+                response_model,
+                system,
+                request_messages,
+                max_tokens,
+                system_suffix = " - Answer shortly by few words only." if not final else "",
+                prompt_caching = prompt_caching,
+                purpose = purpose,
+                cancelled = cancelled
+            ) as stream:
+                try:
+                    yield stream.text_stream
+                finally:
+                    # Usage of a cancelled stream is counted locally from the request and the streamed text
+                    gpt_token_calculator.update_token_counts(stream.usage, stream.model, stream.text, purpose, time.time() - stream_start_time, stream.messages)
+        except RateLimitCancelled:
+            # Cancelled stream is not needed, and it is not an error
+            raise
+        except Exception as e:
+            logger.error(f"Error getting GPT stream: {e}")
+            raise
+    
+    @contextmanager
+    def get_cached_stream(cancelled=None):
+        """ Get the cached response as a text stream. """
+        yield iter([cache_hit["response"]])
+    
+    # Response does not depend on the metadata unless tools are executed, so the response
+    # stream is opened speculatively without waiting for the metadata. If tools are needed,
+    # the speculative stream is cancelled and restarted with the tool results.
+    logger.info(f"Open GPT text stream. Start timer.")
+    start_time = time.time()
+    speculative_stream = SpeculativeStream(get_cached_stream if cache_hit else get_gpt_stream, turn_timer)
+    speculation = "cached" if cache_hit else "used"
+    
+    # Tool entries and calls started from the metadata stream by the tool index
+    early_tool_calls = {}
+    
+    def dispatch_tool(i, entry):
+        """ Call the tool as soon as its entry is complete in the metadata stream. """
+        # Tools are started in order only, the rest are left for the tool loop below
+        # after the first tool that needs more information or the previous results
+        if len(early_tool_calls) != i:
+            return
+        if entry.get("details_are_missing", True) or entry.get("arguments_relies_on_previous_tool_results", True):
+            return
+        if entry.get("tool") not in callbacks or "arguments" not in entry:
+            return
+        # Response will be restarted with the tool results
+        speculative_stream.cancel()
+        logger.info(f"Tool #{i} '{entry['tool']}' started from the metadata stream.")
+        early_tool_calls[i] = (entry, tool_scheduler.submit(entry["tool"], entry["arguments"]))
+    
+    # In the deferred metadata mode, metadata is deduced after the turn, see gpt_inference
+    if not deferred_metadata and not cache_hit:
+        metadata_future = start_metadata_retrieval(latest_messages, turn_timer, dispatch_tool if final and function_calling_tools_enabled else None)
+    else:
+        metadata_future = None
+    
+    # Tools are executed only for the final response
+    if final and function_calling_tools_enabled:
+        wait_for_metadata()
 
     if final and tools:
         
+        speculative_stream.cancel()
+        speculation = "restarted"
+        
         # If tools are found, use them to infer extra content to the messages
         
-        # TODO: At the moment, consequencing tools do not known the results provided
-        # by the earlier tool. That could be achieved by including metadata retrieval to the loop
-        # and let LLM construct arguments again. If messages contain the former results, LLM could
-        # possibly infer the correct arguments based on the last result. But on the other hand,
-        # for efficiency, there can be cases where former results has no effect of the latter
-        # tools. Also, intent, sentiment, and topics are redundant in the latter tools so the 
+        # Tools are called by the tool scheduler. Independent tools are called concurrently,
+        # and a tool relying on the previous tool results waits for the earlier tools,
+        # after which its arguments are deduced again with their results.
+        # Intent, sentiment, and topics are redundant in the latter tools so the 
         # metadata retrieval system prompt might benefit on being different compared to the initial one
         print("")
         for i, entry in enumerate(tools):
-            
-            # TODO: Previous tool relation has not been implemented yet
-            tool, args, arguments_relies_on_previous_tool_results, details_are_missing = \
-                entry["tool"], entry["arguments"], entry["arguments_relies_on_previous_tool_results"], entry["details_are_missing"]
-            
-            if details_are_missing:
-                print(f"{Fore.MAGENTA}✗ Tool #{i} '{tool}' requires more information to be used.\n")
+            if entry["details_are_missing"]:
+                print(f"{Fore.MAGENTA}✗ Tool #{i} '{entry['tool']}' requires more information to be used.\n")
+                # Tools after the tool requiring more information are not called
+                tools = tools[:i]
                 break
-            
-            if arguments_relies_on_previous_tool_results:
-                # Load new metadata with the previous tool results collected in the messages
-                
-                # TODO: It might be possible to strealine this process by retrieving only the necessary arguments
-                # instead of calling whole metaata retrieval, but on the other hand, the previous context and results
-                # needs to be provided because the following tool execution depends on the previous results
-                # which needs to contain both the original prompt and the medioric results
-                messages[-1]["content"].append({"type": "text", "text": f"Skip arguments and tools if the preconditions given by the user are not met in the previous system output results."})
-                
-                new_metadata = gpt_retrieve_metadata(messages[-5:])
-                logger.info(f"New metadata: {new_metadata}")
-                # Skip the tool if preconditions are not met
-                if not new_metadata or new_metadata["skip_tools_due_to_unsatisfied_preconditions_found_from_previous_tool_results_and_user_specifications"]:
-                    break
-                new_tools = new_metadata.get("tools", [])
-                # Only a single new tool is allowed
-                # There is a potential infinite loop if there are multiple tools
-                # and they could always refer to previous tools results
-                # TODO: tool index (i) could be uuid instead of index?
-                # in such way we could match the right tool here rather than
-                # ambiguous check of the first or i:th tool...
-                new_tool = {}
-                if len(new_tools) > 0:
-                    if len(new_tools) - 1 >= i and new_tools[i]["tool"] == tool:
-                        new_tool = new_tools[i]
-                    if new_tools[0]["tool"] == tool:
-                        new_tool = new_tools[0]
-                if new_tool:
-                    # Skip the tool?
-                    if new_metadata["system_requires_more_information_to_use_tools"] or new_tool["details_are_missing"]:
-                        break
-                    # There should be new arguments instead of the original old arguments, that can be used to call the tool
-                    args = new_tool["arguments"]
-                else:
-                    # If new tool is not found or there is a mismatch, the tool will be skipped altogether
-                    break
-            
-            success = False
-            response = ""
-            tool_messages = []
-            predicted_tool = tool
-            
-            if predicted_tool in callbacks:
-                try:
-                    # Call the callback function for the tool
-                    tool_answer, success = callbacks[predicted_tool](args)
-                    
-                    logger.info(f"Tool #{i} '{predicted_tool}' response ({success}): '{tool_answer}'.")
-                    
-                    # Sometimes chat hallusinates the assistent message in a form of the below
-                    # message. As a workaround, I'll pass just general information that
-                    # the tool has been called and the system is waiting for the output.
-                    #assistant_message = f"Calling tool: {predicted_tool}. Input: {args}"
-                    assistant_message = f"Called tool #{i} with given arguments. Waiting for output..."
-                    user_message = f"User role: system. Output: {tool_answer}"
-                    # Note: Tool schema words count is not included
-                    inference_message_word_count += len(assistant_message.split(" "))
-                    inference_message_word_count += len(user_message.split(" "))
-                    
-                    tool_messages = [
-                        {"role": "assistant", "content": [
-                                {"type": "text", "text": assistant_message}
-                            ]
-                        },
-                        {
-                            "role": "user",
-                            "content": [
-                                # Limit input to 4k chars
-                                {"type": "text", "text": user_message[:4096]}
-                            ]
-                        }
-                    ]
-                    
-                    if success:
-                        print(f"{Fore.YELLOW}✓ Tool #{i} {predicted_tool} called.\n")
-                    else:
-                        response = f"Error executing tool #{i}: {predicted_tool}; {tool_answer}"
-                        print(f"{Fore.RED}✗ {response}\n")
-                    
-                    intent = predicted_tool
-                    
-                except Exception as e:
-                    response = f"Error executing tool #{i}: {predicted_tool}; {e}"
-                    print(f"\n{Fore.RED}✗ {response}\n")
-                
-            else:
-                print(f"\n{Fore.YELLOW}? Tool #{i} not found: {predicted_tool}\n")
-            
-            # If tool processing succeeded, add the tool messages
-            if tool_messages:
-                messages.extend(tool_messages)
-            # else, add error response to messages
-            elif response:
-                messages.extend([
+        
+        def create_tool_messages(result):
+            """ Create the assistant and user messages for the tool result. """
+            i, predicted_tool = result["index"], result["tool"]
+            if result["status"] == "called":
+                # Sometimes chat hallusinates the assistent message in a form of the below
+                # message. As a workaround, I'll pass just general information that
+                # the tool has been called and the system is waiting for the output.
+                #assistant_message = f"Calling tool: {predicted_tool}. Input: {args}"
+                assistant_message = f"Called tool #{i} with given arguments. Waiting for output..."
+                user_message = f"User role: system. Output: {result['answer']}"
+                return [
+                    {"role": "assistant", "content": [
+                            {"type": "text", "text": assistant_message}
+                        ]
+                    },
+                    {
+                        "role": "user",
+                        "content": [
+                            # Limit input to 4k chars
+                            {"type": "text", "text": user_message[:4096]}
+                        ]
+                    }
+                ]
+            elif result["status"] in ["error", "timeout"]:
+                return [
                     {
                         "role": "assistant", 
                         "content": [{"type": "text", "text": "Processing the tool function request..."}]
                     },
                     {
                         "role": "user", 
-                        "content": [{"type": "text", "text": f"User role: system. Output: {response}"}]
+                        "content": [{"type": "text", "text": f"User role: system. Output: Error executing tool #{i}: {predicted_tool}; {result['error']}"}]
                     }
-                ])
-    
-    # Generate the system message with the current datetime
-    system = system_message.replace("<<datetime>>", time.strftime("%Y-%m-%d %H:%M:%S"))
-    
-    # Log last 5 messages without index error
-    #logger.info(messages[-min(len(messages), 5):])
+                ]
+            return []
+        
+        def resolve_tool_arguments(i, entry, previous_results):
+            """ Deduce the arguments of the tool relying on the previous tool results. Returns None, if the tool should be skipped. """
+            # Load new metadata with the previous tool results in the context
+            
+            # TODO: It might be possible to strealine this process by retrieving only the necessary arguments
+            # instead of calling whole metaata retrieval, but on the other hand, the previous context and results
+            # needs to be provided because the following tool execution depends on the previous results
+            # which needs to contain both the original prompt and the medioric results
+            context = messages + [message for result in previous_results for message in create_tool_messages(result)]
+            context[-1] = {
+                "role": context[-1]["role"],
+                "content": context[-1]["content"] + [{"type": "text", "text": f"Skip arguments and tools if the preconditions given by the user are not met in the previous system output results."}]
+            }
+            
+            new_metadata = gpt_retrieve_metadata(context[-5:], purpose="tool")
+            logger.info(f"New metadata: {new_metadata}")
+            # Skip the tool if preconditions are not met
+            if not new_metadata or new_metadata.get("skip_tools_due_to_unsatisfied_preconditions_found_from_previous_tool_results_and_user_specifications", True):
+                return None
+            new_tools = new_metadata.get("tools", [])
+            # Only a single new tool is allowed
+            # There is a potential infinite loop if there are multiple tools
+            # and they could always refer to previous tools results
+            # TODO: tool index (i) could be uuid instead of index?
+            # in such way we could match the right tool here rather than
+            # ambiguous check of the first or i:th tool...
+            new_tool = {}
+            if len(new_tools) > 0:
+                if len(new_tools) - 1 >= i and new_tools[i]["tool"] == entry["tool"]:
+                    new_tool = new_tools[i]
+                if new_tools[0]["tool"] == entry["tool"]:
+                    new_tool = new_tools[0]
+            # If new tool is not found or there is a mismatch, the tool will be skipped altogether
+            if not new_tool or new_metadata.get("system_requires_more_information_to_use_tools", True) or new_tool["details_are_missing"]:
+                return None
+            # There should be new arguments instead of the original old arguments, that can be used to call the tool
+            return new_tool["arguments"]
+        
+        # Tools started from the metadata stream already are not called again
+        started_tools = {i: future for i, (entry, future) in early_tool_calls.items() if i < len(tools) and entry == tools[i]}
+        
+        # Results are handled in the original order of the tools
+        for result in tool_scheduler.run(tools, resolve_tool_arguments, started_tools):
+            
+            i, predicted_tool = result["index"], result["tool"]
+            
+            logger.info(f"Tool #{i} '{predicted_tool}' result: {result}.")
+            
+            if result["status"] == "called":
+                if result["success"]:
+                    print(f"{Fore.YELLOW}✓ Tool #{i} {predicted_tool} called.\n")
+                else:
+                    print(f"{Fore.RED}✗ Error executing tool #{i}: {predicted_tool}; {result['answer']}\n")
+                intent = predicted_tool
+            elif result["status"] in ["error", "timeout"]:
+                print(f"\n{Fore.RED}✗ Error executing tool #{i}: {predicted_tool}; {result['error']}\n")
+            elif result["status"] == "not_found":
+                print(f"\n{Fore.YELLOW}? Tool #{i} not found: {predicted_tool}\n")
+            
+            tool_messages = create_tool_messages(result)
+            if result["status"] == "called":
+                # Note: Tool schema words count is not included
+                for message in tool_messages:
+                    inference_message_word_count += len(message["content"][0]["text"].split(" "))
+            messages.extend(tool_messages)
+            if tool_messages:
+                # Stale tool output is replaced in the requests with a stub telling how to call the tool again
+                context_window.register_tool_output(tool_messages[-1], predicted_tool, result["arguments"])
     
-    start_time = None
-    @contextmanager
-    def get_gpt_stream():
-        """ Get the GPT API stream for generating responses. """
-        nonlocal start_time
-        try:
-            logger.info(f"Open GPT text stream. Start timer.")
-            start_time = time.time()
-            # Check if the GPT model is an Anthropic model
-            if gpt_model in anthropic_models:
-                with gpt_client.messages.stream(
-                    model = gpt_model,
-                    messages = messages,
-                    max_tokens = response_token_limit if final else feedback_token_limit,
-                    system = system + (" - Answer shortly by few words only." if not final else "")
-                ) as stream:
-                    yield stream.text_stream
-                    gpt_token_calculator.update_token_counts(stream.get_final_message(), gpt_model)
-            # Else assume OpenAI model
-            else:
-                def openai_stream():
-                    chat_messages = [{"role": "system", "content": system + (" - Answer shortly by few words only." if not final else "")}] + messages
-                    chunks = gpt_client_openai.chat.completions.create(
-                        model = gpt_model,
-                        messages = chat_messages,
-                        max_tokens = response_token_limit if final else feedback_token_limit,
-                        stream = True,
-                    )
-                    for chunk in chunks:
-                        if chunk.choices[0].delta.content:
-                            yield chunk.choices[0].delta.content
-                    
-                    # TODO: collect contents from chat_messages
-                    # gpt_token_calculator.update_token_counts(chunks, gpt_model, chat_messages)
-                # Yield the generator itself for with context
-                yield openai_stream()
-                
-        except Exception as e:
-            logger.error(f"Error getting GPT stream: {e}")
-            raise
+        # Route the restarted response again with the intent and the tools
+        route_signals.update(intent=intent, tools=len(tools))
+        response_model, max_tokens, context_budget = plan_response()
+        
+        # Restart the response stream with the tool results in the messages
+        logger.info(f"Open GPT text stream. Start timer.")
+        start_time = time.time()
+        speculative_stream = SpeculativeStream(get_gpt_stream, turn_timer, "restarted_response")
     
     streamer = elevenlabs_streamer if elevenlabs_streamer else deepgram_streamer
     
-    with get_gpt_stream() as gpt_stream:
+    with speculative_stream as gpt_stream:
 
         response = ""
         
-        # Freezed cursor indicates that system is outputting, not waiting for an input
-        freeze_cursor()
-        
         # Print the current time and the user's input in green/yellow color
         color = Fore.GREEN if final else Fore.YELLOW
-        print(Fore.WHITE + time.strftime("%Y-%m-%dT%H:%M:%S") + " " + color, end="", flush=True)
+        
+        if final:
+            # Freezed cursor indicates that system is outputting, not waiting for an input
+            freeze_cursor()
+            print(Fore.WHITE + time.strftime("%Y-%m-%dT%H:%M:%S") + " " + color, end="", flush=True)
         
         def text_stream():
             """ Stream the text from the GPT API response to console and text to speech service at the same time. """
@@ -675,12 +986,33 @@ def prompt(text, final=False):
                 "content": [{"type": "text", "text": response.strip()}]
             })
         else:
-            # Print the response to the console in real-time
             # This is the feedback response, so we won't use the text-to-speech service
-            # or store the response in the messages buffer until the final response is requested
+            # or store the response in the messages buffer until the final response is requested.
+            # Short feedback is printed at once, unless newer speech or a final request cancelled it
             for t in gpt_stream:
-                print(color + t, end="", flush=True)
+                if cancelled and cancelled.is_set():
+                    break
                 response += t
+            if cancelled and cancelled.is_set():
+                logger.info(f"Feedback cancelled after {len(response)} characters.")
+                return None, topics, sentiment, intent
+            freeze_cursor()
+            print(Fore.WHITE + time.strftime("%Y-%m-%dT%H:%M:%S") + " " + color + response, end="", flush=True)
+        
+        # Metadata is needed for storing the dialogue unit
+        wait_for_metadata()
+        report_turn_timing(turn_timer, speculation if function_calling_tools_enabled or cache_hit else ("deferred_metadata" if deferred_metadata else "no_tools"))
+        
+        if response_cache and final:
+            latency = time.perf_counter() - turn_timer.start_time
+            if cache_hit:
+                response_cache.record_hit_latency(cache_hit, latency)
+            elif not tools and intent not in callbacks:
+                # Responses relying on the tool results are not cached
+                try:
+                    response_cache.add(text, response.strip(), topics, sentiment, intent, latency)
+                except Exception as e:
+                    logger.error(f"Error adding the response to the cache; {e}")
         
         # Increase the message word count for total GPT API usage indication
         inference_message_word_count += len(response.strip().split(" "))
@@ -689,38 +1021,44 @@ def prompt(text, final=False):
         return response, topics, sentiment, intent
 
 
-def gpt_retrieve_content(messages, system_message, max_tokens = 100, model = None):
-    
-    global gpt_model, anthropic_models, gpt_client_openai, gpt_client, gpt_token_calculator
+def append_datetime(messages):
+    """ Append the current date and time to the latest user message of the request messages. """
+    return append_user_text(messages, datetime_message.replace("<<datetime>>", time.strftime("%Y-%m-%d %H:%M:%S")))
+
+
+def append_memory(messages, memory):
+    """ Append the long-term memory context block to the latest user message of the request messages. """
+    return append_user_text(messages, memory_context_message.replace("<<memory>>", memory)) if memory else messages
+
+
+def append_user_text(messages, text):
+    """ Append the text block to the latest user message of the request messages, without modifying the messages. """
+    if messages and messages[-1]["role"] == "user":
+        return messages[:-1] + [{"role": "user", "content": messages[-1]["content"] + [{"type": "text", "text": text}]}]
+    return messages + [{"role": "user", "content": [{"type": "text", "text": text}]}]
+
+
+def gpt_retrieve_content(messages, system_message, max_tokens = 100, model = None, purpose = "metadata"):
     
-    result = None
+    global gpt_model, gpt_provider, gpt_token_calculator
     
     model = model if model else gpt_model
     
-    if gpt_model in anthropic_models:
-        message = gpt_client.messages.create(
-            model = model,
-            messages = messages,
-            max_tokens = max_tokens,
-            system = system_message,
-            temperature = 0
-        )
-        result = message.content[0].text
-        gpt_token_calculator.update_token_counts(message, model)
-    # Else assume OpenAI model
-    else:
-        chat_messages = [
-            {"role": "system", "content": system_message},
-        ] + messages
-        message = gpt_client_openai.chat.completions.create(
-            model = model,
-            messages = chat_messages,
-            max_tokens = max_tokens,
-            temperature = 0
-        )
-        result = message.choices[0].message.content
-        gpt_token_calculator.update_token_counts(message, model, result)
-    return result
+    budget_governor.check(purpose)
+    
+    start_time = time.time()
+    
+    response = gpt_provider.complete(model, system_message, messages, max_tokens, temperature = 0, prompt_caching = prompt_caching, purpose = purpose)
+    gpt_token_calculator.update_token_counts(response.usage, response.model, response.text, purpose, time.time() - start_time, response.messages)
+    return response.text
+
+
+def count_discarded_usage(response, purpose):
+    """ Count the usage of the hedged call response that lost the race, see HedgedProvider. """
+    try:
+        gpt_token_calculator.update_token_counts(response.usage, response.model, response.text, purpose, None, response.messages)
+    except Exception as e:
+        logger.error(f"Error counting the usage of the discarded {purpose} response; {e}")
 
 
 def extract_and_parse_json_block(text):
@@ -760,22 +1098,88 @@ def extract_and_parse_json_block(text):
     return {}
 
 
-def gpt_retrieve_metadata(messages):
+def gpt_retrieve_content_stream(messages, system_message, max_tokens = 100, model = None, purpose = "metadata"):
+    """ Stream the response text chunks of the language model, see gpt_retrieve_content. """
+    
+    global gpt_model, gpt_provider, gpt_token_calculator
+    
+    model = model if model else gpt_model
+    
+    budget_governor.check(purpose)
+    
+    start_time = time.time()
+    
+    with gpt_provider.stream(model, system_message, messages, max_tokens, temperature = 0, prompt_caching = prompt_caching, purpose = purpose) as stream:
+        yield from stream.text_stream
+    gpt_token_calculator.update_token_counts(stream.usage, stream.model, stream.text, purpose, time.time() - start_time, stream.messages)
+
+
+def gpt_retrieve_metadata(messages, on_tool=None, purpose="metadata"):
+    """
+    Retrieve the metadata of the latest messages.
+    
+    If on_tool callback is given, metadata is streamed and the callback is called with
+    the index and the entry of each tool, as soon as the entry is complete in the stream.
+    Metadata of a repeated message window is returned from the metadata cache.
+    """
     
     global system_message_metadata, command_extraction_model
     
-    result = gpt_retrieve_content(
-        messages, 
-        system_message_metadata.replace("<<datetime>>", time.strftime("%Y-%m-%d %H:%M:%S")),
+    # Cache key has the current date, but not the time appended to the request
+    if metadata_cache:
+        cache_key = MetadataCache.create_key(command_extraction_model, system_message_metadata, messages)
+        metadata = metadata_cache.get(cache_key)
+        if metadata is not None:
+            logger.info("Metadata retrieved from the metadata cache.")
+            if on_tool:
+                for i, entry in enumerate(metadata.get("tools", [])):
+                    on_tool(i, copy.deepcopy(entry))
+            return copy.deepcopy(metadata)
+    
+    arguments = (
+        append_datetime(messages),
+        system_message_metadata,
         500,
         # Haiku is cheap and works surprisingly well.
-        command_extraction_model
+        command_extraction_model,
+        purpose
     )
     
-    return extract_and_parse_json_block(result) if result else {}
+    if on_tool:
+        parser = JSONStreamParser("tools", on_tool)
+        for chunk in gpt_retrieve_content_stream(*arguments):
+            parser.feed(chunk)
+        result = parser.text
+    else:
+        result = gpt_retrieve_content(*arguments)
+    
+    metadata = extract_and_parse_json_block(result) if result else {}
+    if metadata_cache and metadata:
+        metadata_cache.put(cache_key, copy.deepcopy(metadata))
+    return metadata
 
 
-def gpt_inference(text, final=False):
+def start_metadata_retrieval(messages, turn_timer, on_tool=None):
+    """ Start the metadata retrieval in a background thread and return the future of the result. """
+    def retrieve_metadata():
+        turn_timer.start("metadata")
+        try:
+            return gpt_retrieve_metadata(messages, on_tool)
+        finally:
+            turn_timer.end("metadata")
+    return metadata_executor.submit(retrieve_metadata)
+
+
+def report_turn_timing(turn_timer, speculation):
+    """ Log the timing of the turn phases, and how much the metadata retrieval and the response stream overlapped. """
+    global turn_timing
+    turn_timing = turn_timer.summary()
+    turn_timing["speculative_stream"] = speculation
+    turn_timing["metadata_response_overlap"] = round(turn_timer.overlap("metadata", "response"), 4)
+    logger.info(f"Turn timing: {turn_timing}")
+
+
+def gpt_inference(text, final=False, cancelled=None):
     """
     Conducts GPT inference on the provided text prompt and logs the prompt, response, 
     and metadata to a JSON Lines file within the session directory.
@@ -793,6 +1197,8 @@ def gpt_inference(text, final=False):
     - final (bool, optional): A flag indicating whether the prompt is considered final,
                               affecting the response's mode of generation. Defaults to 
                               False.
+    - cancelled (threading.Event, optional): Cancellation event of a feedback request, 
+                              see FeedbackScheduler. Cancelled feedback is not stored.
 
     Global Variables:
     - audio_recorder: A global object that holds session-related information, including
@@ -808,23 +1214,34 @@ def gpt_inference(text, final=False):
     the verbose flag, and returns False. On success, it returns True.
     """
     global verbose, vector_db
+    # Cold-start costs should not land on the first turn, wait for the warm-up.
+    # Waiting returns immediately after the warm-up has completed.
+    warm_up.wait(timeout=warm_up_timeout)
     try:
         # Perform GPT inference on the given text prompt
-        response_text, topics, sentiment, intent = prompt(text, final)
+        response_text, topics, sentiment, intent = prompt(text, final, cancelled)
     except Exception as e:
         logger.error(f"Error on processing text; {e}")
         print(f"Error on processing text; {e}")
         if verbose:
             traceback.print_exc()
         return False
+    
+    # Words of the cancelled feedback are in the messages for the next request
+    if response_text is None:
+        return False
         
-    vector_db.add_dialogue_unit(
+    dialogue_unit_id = vector_db.add_dialogue_unit(
         text, 
         response_text, 
         topics, 
         sentiment, 
         intent
     )
+    
+    # Topics, sentiment, and intent are deduced later in a batch with other units
+    if metadata_enricher:
+        metadata_enricher.add(dialogue_unit_id, text, response_text)
 
     # Log the prompt, response, and metadata to a JSON Lines file
     timestamp = time.strftime("%Y%m%d-%H%M%S")
@@ -839,7 +1256,9 @@ def gpt_inference(text, final=False):
             "sentiment": sentiment, 
             "intent": intent, 
             "timestamp": timestamp, 
-            "final": final
+            "final": final,
+            "timing": dict(turn_timing, queue_wait=(orchestrator or turn_scheduler).current_wait() if orchestrator or turn_scheduler else None),
+            "route": dict(turn_route)
         }
         # Convert the dictionary to a JSON string and write it to the file with a newline
         json_line = json.dumps(data) + "\n"
@@ -871,6 +1290,10 @@ def process_text(text, word_buffer, print_buffer):
     Global Variables:
     - feedback_word_buffer_limit (int): The maximum number of words allowed in the 
                                         buffer before triggering GPT inference.
+    - feedback_scheduler: Runs the feedback requests off this thread, see 
+                          FeedbackScheduler.
+    - orchestrator: Runs the feedback requests on the event loop instead of the 
+                    feedback scheduler, see ConversationOrchestrator.
 
     The function first checks if the input text is non-empty and not just whitespace. 
     If so, it prints the text and adds its words to the word buffer. Then, it checks if 
@@ -878,9 +1301,10 @@ def process_text(text, word_buffer, print_buffer):
     concatenates the buffered words into a single string and passes this string to the 
     GPT inference function, specifying that the response should be considered as 
     intermediate feedback (not final). After inference, it clears the buffer to reset 
-    the process for subsequent inputs.
+    the process for subsequent inputs. Feedback request is debounced and run by the 
+    feedback scheduler, and newer speech supersedes the pending or in-flight feedback.
     """
-    global feedback_word_buffer_limit, audio_recorder
+    global feedback_word_buffer_limit, audio_recorder, feedback_scheduler, orchestrator
     if text.strip() != "":
         if audio_recorder.pause:
             print_buffer.extend(text)
@@ -891,12 +1315,32 @@ def process_text(text, word_buffer, print_buffer):
                 print_buffer.clear()
             print(f"> {text}")
         word_buffer.extend(text.split(" "))
-    if ((len(word_buffer) + 1) > feedback_word_buffer_limit) and not audio_recorder.pause:
+    feedback_busy = orchestrator.feedback_busy() if orchestrator else feedback_scheduler.busy()
+    if word_buffer and ((len(word_buffer) + 1) > feedback_word_buffer_limit or feedback_busy) and not audio_recorder.pause:
         # Perform GPT inference on the collected prompt,
         # but make the response an intermediate feedback only
         text = " ".join(word_buffer)
         word_buffer.clear()
-        gpt_inference(text, final=False)
+        if orchestrator:
+            orchestrator.submit_feedback(text)
+        else:
+            feedback_scheduler.submit(text)
+
+
+def run_feedback(text, cancelled):
+    """
+    Perform the intermediate feedback inference of the feedback scheduler as a preemptible turn.
+    Returns False, if the turn was skipped in the queue, and the text was not sent.
+    """
+    result = turn_scheduler.execute("feedback", lambda cancelled: gpt_inference(text, final=False, cancelled=cancelled), cancelled, preemptible=True)
+    if result:
+        blink_cursor()
+    return result is not None
+
+
+def feedback_inference(text, cancelled):
+    """ Perform the intermediate feedback inference of the conversation orchestrator as a preemptible turn. """
+    if gpt_inference(text, final=False, cancelled=cancelled):
         blink_cursor()
 
 
@@ -980,40 +1424,37 @@ def handle_summary_creation(final=False):
     summary_index = end_index
     
     if previous_context:
-        try:
-            print(Fore.YELLOW + f"\nGenerating {"final " if final else ""}summary...", end="", flush=True)
-            # Generate a summary prompt with the previous context
-            with gpt_client.messages.stream(
-                model = gpt_model,
-                messages = [{
-                    "role": "user", 
-                    "content": [{"type": "text", "text": summary_generator_prompt.replace("<<summary>>", previous_context)}]
-                }],
-                max_tokens = 1024
-            ) as gpt_stream:
-                # Log the prompt, response, and metadata to a JSON Lines file
-                timestamp = time.strftime("%Y%m%d-%H%M%S")
-                filename = f"summary_{timestamp}.txt"
-                file_path = os.path.join(audio_recorder.session_dir, filename)
-                with open(file_path, "a") as file:
-                    summary = "".join(gpt_stream.text_stream)
-                    file.write(summary)
-                    vector_db.add_dialogue_unit(
-                        prompt=summary,
-                        response="",
-                        intent="create_summary"
-                    )
-                    # Update tokens used
-                    if gpt_model in anthropic_models:
-                        gpt_token_calculator.update_token_counts(gpt_stream.get_final_message(), gpt_model)
-                    
-                print(f" See the file: {file_path}." + Style.NORMAL)
-        except Exception as e:
-            logger.error(f" Error generating summary; {e}")
+        # Summary is generated in the background from the snapshot of the messages
+        print(Fore.YELLOW + f"\nGenerating {"final " if final else ""}summary in the background with {summary_model}." + Style.NORMAL)
+        summary_worker.submit(previous_context, end_index, final)
     else:
         logger.info("No more conversation history to summarize.")
 
 
+def store_summary(summary, end_index, final=False):
+    """ Write the summary generated by the summary worker to the session file, the context window, and the database. """
+    timestamp = time.strftime("%Y%m%d-%H%M%S")
+    filename = f"summary_{timestamp}.txt"
+    file_path = os.path.join(audio_recorder.session_dir, filename)
+    with open(file_path, "a") as file:
+        file.write(summary)
+    # Summarized messages are sent as a part of the rolling summary from now on
+    context_window.add_summary(summary, end_index)
+    vector_db.add_dialogue_unit(
+        prompt=summary,
+        response="",
+        intent="create_summary"
+    )
+    logger.info(f"Summary of the messages before index {end_index} written to the file: {file_path}")
+    # Chunk summary is merged into the summary of the discussion
+    try:
+        summary_tree.add_chunk(summary, vector_db.current_discussion_id)
+    except Exception as e:
+        logger.error(f"Error merging the chunk summary into the discussion summary; {e}")
+    if final:
+        print(Fore.YELLOW + f"Summary ready. See the file: {file_path}." + Style.NORMAL)
+
+
 def summary_generator():
     """
     Generates a summary of the conversation from the messages stored in the chat history.
@@ -1038,7 +1479,7 @@ def summary_generator():
         audio_recorder.pause = True
         freeze_cursor()
         # Force create summary because the user have requested so
-        handle_summary_creation(final=True)
+        turn_scheduler.execute("summary", lambda cancelled: handle_summary_creation(final=True))
         audio_recorder.pause = False
         blink_cursor()
 
@@ -1088,6 +1529,16 @@ def short_feedback():
         blink_cursor()
 
 
+def clear_history(cancelled):
+    """ Clear the message history and the rolling summary of the context window. """
+    global summary_index
+    # Pending summaries refer to the messages being cleared
+    summary_worker.wait()
+    messages.clear()
+    context_window.clear()
+    summary_index = 0
+
+
 def clear_message_history():
     """
     Clears the message history stored in the chat system.
@@ -1109,8 +1560,7 @@ def clear_message_history():
         audio_recorder.pause = True
         freeze_cursor()
         
-        # Clear the message history
-        messages.clear()
+        turn_scheduler.execute("clear", clear_history)
         print("Message history cleared.")
         
         audio_recorder.pause = False
@@ -1131,7 +1581,9 @@ def activate_text_input():
             print("\nText prompt (skip with enter):")
             user_input = input("> ").strip()
             if user_input:
-                gpt_inference(user_input, final=True)
+                # Spoken words of the cancelled pending feedback precede the text prompt
+                text = " ".join([feedback_scheduler.cancel(), user_input]).strip()
+                turn_scheduler.execute("text_prompt", lambda cancelled: gpt_inference(text, final=True))
             audio_recorder.pause = False
             blink_cursor()
         except EOFError:
@@ -1181,10 +1633,11 @@ def listen_for_flush_command():
                     print(Fore.RED + f"\r\nPlease wait for GPT inference." + Fore.WHITE)
                 else:
                     print(Fore.RED + f"\r\nListener paused. Please wait for GPT inference." + Fore.WHITE)
-                # Perform a full length GPT inference on the collected prompt
-                prompt = " ".join(audio_recorder.word_buffer)
+                # Perform a full length GPT inference on the collected prompt,
+                # including the words of the cancelled pending feedback
+                prompt = " ".join([feedback_scheduler.cancel()] + audio_recorder.word_buffer).strip()
                 audio_recorder.word_buffer.clear()
-                gpt_inference(prompt, final=True)
+                turn_scheduler.execute("final", lambda cancelled: gpt_inference(prompt, final=True))
                 # Provide feedback to user to resume the recording mode
                 print(Fore.RED + f"Resume back to the recording mode with {hotkey_pause}." + Fore.WHITE)
                 # Clear the word buffer after processing
@@ -1245,6 +1698,76 @@ def manage_word_buffer(text_queue):
             continue
 
 
+###################################################
+# CONVERSATION EVENT HANDLERS
+###################################################
+
+async def on_transcript(orchestrator, text):
+    """ Process the recognized text on the event loop, see process_text. """
+    process_text(text, orchestrator.word_buffer, orchestrator.print_buffer)
+
+
+async def on_flush(orchestrator, _):
+    """ Pause or resume the listener, and perform the full length inference of the collected words, see listen_for_flush_command. """
+    # Toggled before the inference, so that the next hotkey press resumes the listener
+    audio_recorder.toggle_listener = not audio_recorder.toggle_listener
+    if not audio_recorder.toggle_listener:
+        if orchestrator.word_buffer:
+            if disable_voice_recognition:
+                print(Fore.RED + f"\r\nPlease wait for GPT inference." + Fore.WHITE)
+            else:
+                print(Fore.RED + f"\r\nListener paused. Please wait for GPT inference." + Fore.WHITE)
+            # Words of the cancelled pending feedback precede the collected words
+            prompt = " ".join([orchestrator.take_feedback()] + orchestrator.word_buffer).strip()
+            orchestrator.word_buffer.clear()
+            await orchestrator.run_turn("final", lambda cancelled: gpt_inference(prompt, final=True))
+            print(Fore.RED + f"Resume back to the recording mode with {hotkey_pause}." + Fore.WHITE)
+        elif disable_voice_recognition:
+            print(Fore.RED + f"No words collected for inference. Resume to input mode with {hotkey_prompt}." + Fore.WHITE)
+        else:
+            print(Fore.RED + f"No words collected for inference. Resume to recording mode with {hotkey_pause}." + Fore.WHITE)
+    else:
+        if not disable_voice_recognition:
+            print(Fore.BLUE + "Resuming listener..." + Fore.WHITE)
+        blink_cursor()
+
+
+async def on_text_prompt(orchestrator, _):
+    """ Prompt the user for the text input in a worker thread, and perform the inference of the text, see activate_text_input. """
+    audio_recorder.pause = True
+    freeze_cursor()
+    print("\nText prompt (skip with enter):")
+    try:
+        user_input = (await orchestrator.run_blocking(input, "> ")).strip()
+    except EOFError:
+        user_input = ""
+    if user_input:
+        # Spoken words of the cancelled pending feedback precede the text prompt
+        text = " ".join([orchestrator.take_feedback(), user_input]).strip()
+        await orchestrator.run_turn("text_prompt", lambda cancelled: gpt_inference(text, final=True))
+    audio_recorder.pause = False
+    blink_cursor()
+
+
+async def on_summary(orchestrator, _):
+    """ Create the summary of the conversation on request, see summary_generator. """
+    audio_recorder.pause = True
+    freeze_cursor()
+    await orchestrator.run_turn("summary", lambda cancelled: handle_summary_creation(final=True))
+    audio_recorder.pause = False
+    blink_cursor()
+
+
+async def on_clear(orchestrator, _):
+    """ Clear the message history, see clear_message_history. """
+    audio_recorder.pause = True
+    freeze_cursor()
+    await orchestrator.run_turn("clear", clear_history)
+    print("Message history cleared.")
+    audio_recorder.pause = False
+    blink_cursor()
+
+
 ###################################################
 # HELPERS FOR MAIN FUNCTION
 ###################################################
@@ -1283,6 +1806,81 @@ def import_audiorecorder_module(recorder_type):
     return AudioRecorder
 
 
+def report_prompt_sections(name, prompt, sections):
+    """ Log the estimated tokens of the system prompt sections and print them, if requested from the command line. """
+    total = ContextWindowManager.estimate_tokens(prompt)
+    tokens = {section: ContextWindowManager.estimate_tokens(text) if text else 0 for section, text in sections.items()}
+    # Rest of the prompt is the static instructions of the template
+    tokens = {"instructions": max(0, total - sum(tokens.values())), **tokens}
+    lines = [f"{'Section':<24}{'Tokens':>10}"]
+    for section, count in tokens.items():
+        lines.append(f"{section:<24}{count:>10}")
+    lines.append(f"{'Total':<24}{total:>10}")
+    if prompt_report:
+        print(f"# {name} system prompt tokens (estimated):")
+        for line in lines:
+            print(f"# {line}")
+    logger.info(f"{name} system prompt tokens (estimated):\n" + "\n".join(lines))
+
+
+def report_startup_profile():
+    """ Log the startup profile and print it, if requested from the command line. """
+    if startup_profile:
+        startup_profiler.print_report()
+    logger.info("Startup profile:\n" + "\n".join(startup_profiler.report()))
+
+
+def warm_up_vector_db():
+    """ Load the embedding model and the vector index, and run the first queries ahead of time. """
+    with startup_profiler.measure("embedding_model"):
+        vector_db.load_embedder()
+    with startup_profiler.measure("vector_index"):
+        vector_db.load_or_initialize_index()
+    vector_db.warm_up()
+
+
+def warm_up_gpt_client():
+    """ Open the connection to the model provider API ahead of the first turn. """
+    gpt_provider.warm_up()
+
+
+def report_readiness():
+    """ Wait for the warm-up, report the readiness for the first turn, and report the startup profile. """
+    if warm_up.wait(timeout=warm_up_timeout):
+        print(f"# Ready for the first turn. Warm-up completed in {warm_up.ready_time:.2f} seconds.")
+        logger.info(f"Warm-up completed in {round(warm_up.ready_time, 4)} seconds.")
+    else:
+        print(f"# Warm-up is still running after {warm_up_timeout} seconds. The first turn may be slower.")
+        logger.warning(f"Warm-up is still running after {warm_up_timeout} seconds.")
+    for name, error in warm_up.errors.items():
+        print(f"# Warm-up of {name} failed: {error}")
+    report_startup_profile()
+
+
+def start_readiness_report():
+    """ Report the readiness in the background, so that listening is not delayed by the warm-up. """
+    Thread(target=report_readiness, name="readiness-report", daemon=True).start()
+
+
+def start_orchestrator():
+    """
+    Start the conversation on the event loop of the orchestrator. Hotkeys and the transcripts
+    of the audio recorder are posted to the loop as events, without the threads waiting for them.
+    """
+    global orchestrator
+    orchestrator = ConversationOrchestrator(feedback_inference, feedback_debounce)
+    orchestrator.on("transcript", on_transcript)
+    orchestrator.on("flush", on_flush)
+    orchestrator.on("text_prompt", on_text_prompt)
+    orchestrator.on("summary", on_summary)
+    orchestrator.on("clear", on_clear)
+    orchestrator.bridge(audio_recorder.text_queue, "transcript")
+    keyboard.add_hotkey(hotkey_pause, orchestrator.post, args=("flush",))
+    keyboard.add_hotkey(hotkey_prompt, orchestrator.post, args=("text_prompt",))
+    keyboard.add_hotkey(hotkey_summarize, orchestrator.post, args=("summary",))
+    keyboard.add_hotkey(hotkey_clear, orchestrator.post, args=("clear",))
+
+
 def validate_wav_args(sample_rate):
     """Validate WAV format arguments."""
     if sample_rate not in valid_wav_sample_rates:
@@ -1338,8 +1936,47 @@ def main():
     - `-do`, `--disable_voice_output`: Disable output audio.
     - `-di`, `--disable_voice_recognition`: Disable voice recognition.
     - `-sf`, `--summary_file`: Import previous context for the discussion from the summary file.
+    - `-eb`, `--embedding_backend`: Select the text embedding backend of the vector database.
+    - `-sp`, `--startup_profile`: Print a per-component startup timing breakdown.
+    - `-wt`, `--warm_up_timeout`: Maximum seconds the first turn waits for the warm-up.
+    - `-tt`, `--tool_timeout`: Maximum seconds a turn waits for a single function calling tool.
+    - `-dm`, `--deferred_metadata`: Deduce the metadata of the dialogue units later in background batches.
+    - `-cb`, `--context_token_budget`: Set the input token budget of the requests.
+    - `-te`, `--tool_output_turns`: Set the number of turns after which the tool outputs are evicted from the requests.
+    - `-pc`, `--prompt_caching`: Toggle the Anthropic prompt caching of the system messages.
+    - `-cp`, `--compact_prompts`: Render the tool schemas and the previous discussion in a compact form.
+    - `-sd`, `--schema_descriptions`: Toggle the argument descriptions of the compact tool schemas.
+    - `-pr`, `--prompt_report`: Print the estimated tokens of the system prompt sections.
+    - `-bs`, `--budget_soft_limit`: Set the session cost after which the responses are downgraded.
+    - `-bh`, `--budget_hard_limit`: Set the session cost after which the calls are refused.
+    - `-bl`, `--budget_purpose_limits`: Set the cost limits by the call purpose.
+    - `-bm`, `--budget_fallback_model`: Set the cheaper model for the responses after the soft limit.
+    - `-rr`, `--router_rules`: Route the response model of each turn with the rules of the JSON file.
+    - `-rc`, `--response_cache`: Answer the repeated final prompts from the semantic response cache.
+    - `-rs`, `--response_cache_similarity`: Set the minimum prompt similarity of a response cache hit.
+    - `-rt`, `--response_cache_ttl`: Set the maximum age of a cached response in seconds.
+    - `-fd`, `--feedback_debounce`: Set the seconds without new speech before the feedback is requested.
+    - `-sm`, `--summary_model`: Select the model of the background summaries.
+    - `-dp`, `--digest_period`: Select the period of the digests the discussion summaries are merged into.
+    - `-mr`, `--memory_retrieval`: Toggle the per-turn retrieval of the relevant long-term memory.
+    - `-mk`, `--memory_top_k`: Set the maximum number of retrieved memory items per turn.
+    - `-mb`, `--memory_token_budget`: Set the token budget of the retrieved memory.
+    - `-mc`, `--metadata_cache_size`: Set the maximum number of the cached metadata windows.
+    - `-mt`, `--metadata_cache_ttl`: Set the maximum age of the cached metadata in seconds.
+    - `-mf`, `--metadata_cache_file`: Persist the metadata cache to the JSON file.
+    - `-ao`, `--async_orchestrator`: Toggle running the conversation on an asyncio event loop.
+    - `-pb`, `--provider_base_url`: Set the base URL of the model provider API.
+    - `-fp`, `--fake_provider`: Toggle the local fake provider server replaying the recorded responses.
+    - `-ff`, `--fake_first_token_delay`: Set the seconds before the first token of the fake provider.
+    - `-ft`, `--fake_token_delay`: Set the seconds between the tokens of the fake provider.
+    - `-lr`, `--llm_recordings`: Set the JSON Lines file the responses are recorded to, or replayed from.
+    - `-rq`, `--request_timeout`: Set the seconds a provider request may wait for the connection or the next chunk.
+    - `-hd`, `--hedged_requests`: Toggle the hedged requests of the calls exceeding their latency SLO.
+    - `-ls`, `--latency_slos`: Set the latency SLOs by the call purpose.
+    - `-hm`, `--hedge_model`: Select the model of the hedged requests.
+    - `-rl`, `--rate_limits`: Set the rate limits of the provider APIs.
     """
-    global gpt_token_calculator, audio_recorder, feedback_word_buffer_limit, voice_id, gpt_model, username, verbose, available_models, elevenlabs_streamer, phrase_time_limit, calibration_time, elevenlabs_output_format, disable_voice_output, disable_voice_recognition, summary, summary_file, elevenlabs_output_sample_rate, elevenlabs_output_bit_rate, audio_file_source, audio_recorder_type, audio_dir, audio_host, audio_port, audio_stream, deepgram_streamer, use_deepgram_streamer, session_id, intent_model_path, low_confidence_threshold, deepgram_voice_id, system_message_metadata, system_message_metadata_schema_tools_part, system_message_metadata_tools_epilogue, system_message_metadata_schema, system_message, system_message_tools_human_format
+    global rate_limits, request_timeout, hedged_requests, latency_slos, hedge_model, gpt_provider, provider_base_url, provider_api_key, fake_provider, fake_first_token_delay, fake_token_delay, llm_recordings, async_orchestrator, orchestrator, metadata_cache, metadata_cache_size, metadata_cache_ttl, metadata_cache_file, memory_retrieval, memory_top_k, memory_token_budget, memory_retriever, digest_period, summary_tree, summary_model, summary_worker, turn_scheduler, feedback_debounce, feedback_scheduler, response_cache, response_cache_enabled, response_cache_similarity, response_cache_ttl, model_router, router_rules_file, budget_governor, budget_soft_limit, budget_hard_limit, budget_purpose_limits, budget_fallback_model, usage_ledger, prompt_caching, compact_prompts, prompt_report, context_token_budget, tool_output_turns, embedding_backend, startup_profile, warm_up_timeout, function_calling_tools_enabled, deferred_metadata, metadata_enricher, gpt_token_calculator, audio_recorder, feedback_word_buffer_limit, voice_id, gpt_model, username, verbose, available_models, elevenlabs_streamer, phrase_time_limit, calibration_time, elevenlabs_output_format, disable_voice_output, disable_voice_recognition, summary, summary_file, elevenlabs_output_sample_rate, elevenlabs_output_bit_rate, audio_file_source, audio_recorder_type, audio_dir, audio_host, audio_port, audio_stream, deepgram_streamer, use_deepgram_streamer, session_id, intent_model_path, low_confidence_threshold, deepgram_voice_id, system_message_metadata, system_message_metadata_schema_tools_part, system_message_metadata_tools_epilogue, system_message_metadata_schema, system_message, system_message_tools_human_format
     
     # Parse command-line arguments
     parser = argparse.ArgumentParser(description="Bidirectional Chat with Speech Recognition")
@@ -1397,19 +2034,238 @@ def main():
     
     parser.add_argument("-t", "--function_calling_tools", type=str, nargs='+', help="Include function calling tools. You may define them as a list group(s) (general, discussion) or more precisely by sub group (general.retrieve_data_entry, discussion.retrieve_discussion_by_id) or even by removing certain schema (general, ~general.upsert_data_entry): (default: \"\")", default="")
     
+    parser.add_argument("-tt", "--tool_timeout", type=float, help=f"Maximum seconds a turn waits for a single function calling tool. Independent tools are called concurrently (default: {tool_timeout})", default=tool_timeout)
+    
+    parser.add_argument("-eb", "--embedding_backend", type=str, choices=embedding_backends, help=f"Text embedding backend for the vector database (default: {embedding_backend})", default=embedding_backend)
+    
+    parser.add_argument("-sp", "--startup_profile", "--startup-profile", action=('store_false' if startup_profile else 'store_true'), help=f"Print a per-component startup timing breakdown (default: {startup_profile})")
+    
+    parser.add_argument("-dm", "--deferred_metadata", "--deferred-metadata", action=('store_false' if deferred_metadata else 'store_true'), help=f"Store the dialogue units right away and deduce their topics, sentiment, and intent later in background batches. Not available with function calling tools (default: {deferred_metadata})")
+    
+    parser.add_argument("-cb", "--context_token_budget", type=int, help=f"Input token budget of the response requests. Recent messages are sent verbatim and older messages as a rolling summary. Defaults to the budget of the selected model (default: {context_token_budget})", default=context_token_budget)
+    
+    parser.add_argument("-te", "--tool_output_turns", type=int, help=f"Number of user turns after which the function calling tool outputs are replaced in the requests with a stub, that tells how to call the tool again. Older tool outputs are replaced earlier, if the token budget is tight (default: {tool_output_turns})", default=tool_output_turns)
+    
+    parser.add_argument("-pc", "--prompt_caching", action=('store_false' if prompt_caching else 'store_true'), help=f"Toggle the Anthropic prompt caching of the static system messages of the response and metadata requests. Date and time is given in the latest user message instead (default: {prompt_caching})")
+    
+    parser.add_argument("-cp", "--compact_prompts", action=('store_false' if compact_prompts else 'store_true'), help=f"Render the tool schemas as minified JSON with the shared enums in the definitions, shorten the human readable tool descriptions, and leave empty fields out of the previous discussion (default: {compact_prompts})")
+    
+    parser.add_argument("-sd", "--schema_descriptions", action=('store_false' if schema_descriptions else 'store_true'), help=f"Toggle the argument descriptions of the compact tool schemas (default: {schema_descriptions})")
+    
+    parser.add_argument("-pr", "--prompt_report", action=('store_false' if prompt_report else 'store_true'), help=f"Print the estimated tokens of each system prompt section of the metadata and response requests (default: {prompt_report})")
+    
+    parser.add_argument("-bs", "--budget_soft_limit", type=float, help=f"Session cost in dollars, after which the responses are shorter and generated with the fallback model. Context window is halved already when 80%% of the limit is reached (default: {budget_soft_limit})", default=budget_soft_limit)
+    
+    parser.add_argument("-bh", "--budget_hard_limit", type=float, help=f"Session cost in dollars, after which the language model calls are refused (default: {budget_hard_limit})", default=budget_hard_limit)
+    
+    parser.add_argument("-bl", "--budget_purpose_limits", type=str, nargs='+', help=f"Session cost limits in dollars by the call purpose: response, feedback, metadata, summary, or tool. For example: metadata=0.05 summary=0.02 (default: {budget_purpose_limits})", default=budget_purpose_limits)
+    
+    parser.add_argument("-bm", "--budget_fallback_model", type=str, help=f"Cheaper model of the same provider for the responses after the budget soft limit (default: {budget_fallback_model})", default=budget_fallback_model)
+    
+    parser.add_argument("-rr", "--router_rules", type=str, help=f"JSON file of the rules for routing the response model of each turn by the utterance length, intent, tools, and history size. Models must be of the same provider as the selected model (default: \"{router_rules_file}\")", default=router_rules_file)
+    
+    parser.add_argument("-rc", "--response_cache", action=('store_false' if response_cache_enabled else 'store_true'), help=f"Answer the repeated final prompts from the earlier responses without the language model calls, if the prompts are similar enough. Responses relying on the function calling tools are not cached (default: {response_cache_enabled})")
+    
+    parser.add_argument("-rs", "--response_cache_similarity", type=float, help=f"Minimum cosine similarity of the prompt embeddings for a response cache hit (default: {response_cache_similarity})", default=response_cache_similarity)
+    
+    parser.add_argument("-rt", "--response_cache_ttl", type=int, help=f"Maximum age of a cached response in seconds. Recent responses of the earlier discussions are cached too (default: {response_cache_ttl})", default=response_cache_ttl)
+    
+    parser.add_argument("-fd", "--feedback_debounce", type=float, help=f"Seconds without new speech before the intermediate feedback is requested. Newer speech and the final prompt cancel the feedback in flight (default: {feedback_debounce})", default=feedback_debounce)
+    
+    parser.add_argument("-sm", "--summary_model", type=str, help=f"Model of the same provider for the discussion summaries generated in the background. Defaults to {anthropic_models[-1]} or gpt-3.5-turbo by the provider of the selected model (default: {summary_model})", default=summary_model)
+    
+    parser.add_argument("-dp", "--digest_period", type=str, choices=digest_periods, help=f"Period of the digests the summaries of the earlier discussions are merged into (default: {digest_period})", default=digest_period)
+    
+    parser.add_argument("-mr", "--memory_retrieval", action=('store_false' if memory_retrieval else 'store_true'), help=f"Retrieve the summaries and the dialogue units of the earlier discussions relevant to each final prompt, instead of giving the previous discussion summaries in the system message (default: {memory_retrieval})")
+    
+    parser.add_argument("-mk", "--memory_top_k", type=int, help=f"Maximum number of the retrieved memory items per turn (default: {memory_top_k})", default=memory_top_k)
+    
+    parser.add_argument("-mb", "--memory_token_budget", type=int, help=f"Token budget of the retrieved memory per turn (default: {memory_token_budget})", default=memory_token_budget)
+    
+    parser.add_argument("-mc", "--metadata_cache_size", type=int, help=f"Maximum number of the message windows in the metadata cache, 0 disables the cache (default: {metadata_cache_size})", default=metadata_cache_size)
+    
+    parser.add_argument("-mt", "--metadata_cache_ttl", type=int, help=f"Maximum age of the cached metadata in seconds. Metadata is cached for the current date only (default: {metadata_cache_ttl})", default=metadata_cache_ttl)
+    
+    parser.add_argument("-mf", "--metadata_cache_file", type=str, help=f"JSON file the metadata cache is loaded from and saved to on exit (default: \"{metadata_cache_file}\")", default=metadata_cache_file)
+    
+    parser.add_argument("-ao", "--async_orchestrator", action=('store_false' if async_orchestrator else 'store_true'), help=f"Run the conversation on an asyncio event loop: hotkeys and transcripts are posted as events, turns run as tasks with structured cancellation, and no threads poll for them (default: {async_orchestrator})", default=async_orchestrator)
+    
+    parser.add_argument("-pb", "--provider_base_url", type=str, help=f"Base URL of the model provider API, for a proxy or a compatible server (default: \"{provider_base_url}\")", default=provider_base_url)
+    
+    parser.add_argument("-fp", "--fake_provider", action=('store_false' if fake_provider else 'store_true'), help=f"Start a local fake provider server replaying the recorded responses with the configured token timing, for benchmarks without network (default: {fake_provider})", default=fake_provider)
+    
+    parser.add_argument("-ff", "--fake_first_token_delay", type=float, help=f"Seconds before the first token of the fake provider response (default: {fake_first_token_delay})", default=fake_first_token_delay)
+    
+    parser.add_argument("-ft", "--fake_token_delay", type=float, help=f"Seconds between the tokens of the fake provider response (default: {fake_token_delay})", default=fake_token_delay)
+    
+    parser.add_argument("-lr", "--llm_recordings", type=str, help=f"JSON Lines file the model responses are recorded to, or replayed from with the fake provider (default: \"{llm_recordings}\")", default=llm_recordings)
+    
+    parser.add_argument("-rq", "--request_timeout", type=float, help=f"Seconds a provider request may wait for the connection or the next chunk of the response (default: {request_timeout})", default=request_timeout)
+    
+    parser.add_argument("-hd", "--hedged_requests", action=('store_false' if hedged_requests else 'store_true'), help=f"Send a hedged request when a call exceeds the latency SLO of its purpose, or fails. The first responder wins and the other request is cancelled (default: {hedged_requests})", default=hedged_requests)
+    
+    parser.add_argument("-ls", "--latency_slos", type=str, nargs='+', help=f"Latency SLOs in seconds by the call purpose: response, feedback, metadata, summary, or tool. Time to the first token of the streamed calls, and the total time of the others (default: {latency_slos})", default=latency_slos)
+    
+    parser.add_argument("-hm", "--hedge_model", type=str, help=f"Model of the hedged requests, also of the other provider, but not with the provider base URL. Defaults to the model of the call (default: {hedge_model})", default=hedge_model)
+    
+    parser.add_argument("-rl", "--rate_limits", type=str, nargs='+', help=f"Rate limits of the provider APIs: anthropic, openai, deepgram, or elevenlabs, shared by all the calls. Requests over the limits are queued. Format is provider=requests:tokens:in_flight per minute, empty fields are not limited, and tokens of the text to speech are characters. For example: anthropic=50:40000:4 elevenlabs=::2 (default: {rate_limits})", default=rate_limits)
+    
+    parser.add_argument("-wt", "--warm_up_timeout", type=float, help=f"Maximum seconds the first turn waits for the component warm-up (default: {warm_up_timeout})", default=warm_up_timeout)
+    
     args = parser.parse_args()
     
     if args.gpt_model not in available_models:
         parser.error(f"The specified model is not supported. Please choose from the following models: {models}")
     
+    if args.summary_model and (args.summary_model not in available_models or (args.summary_model in anthropic_models) != (args.gpt_model in anthropic_models)):
+        parser.error(f"The summary model must be one of the models of the same provider as the selected model: {models}")
+    
+    if args.budget_fallback_model and (args.budget_fallback_model not in available_models or (args.budget_fallback_model in anthropic_models) != (args.gpt_model in anthropic_models)):
+        parser.error(f"The budget fallback model must be one of the available models of the same provider as the selected model: {models}")
+    
+    router_rules = []
+    if args.router_rules:
+        try:
+            router_rules = load_router_rules(args.router_rules)
+        except (OSError, ValueError) as e:
+            parser.error(f"Invalid router rules file '{args.router_rules}': {e}")
+        for rule in router_rules:
+            if rule["model"] not in available_models or (rule["model"] in anthropic_models) != (args.gpt_model in anthropic_models):
+                parser.error(f"Routed model '{rule['model']}' must be one of the available models of the same provider as the selected model: {models}")
+    
+    purpose_limits = {}
+    for purpose_limit in args.budget_purpose_limits:
+        try:
+            purpose, limit = purpose_limit.split("=")
+            purpose_limits[purpose.strip()] = float(limit)
+        except ValueError:
+            parser.error(f"Invalid budget purpose limit '{purpose_limit}', use the format purpose=limit, for example: metadata=0.05")
+    
+    slos = {}
+    for purpose_slo in args.latency_slos:
+        try:
+            purpose, seconds = purpose_slo.split("=")
+            slos[purpose.strip()] = float(seconds)
+        except ValueError:
+            parser.error(f"Invalid latency SLO '{purpose_slo}', use the format purpose=seconds, for example: response=2.0")
+    
+    provider_limits = []
+    for rate_limit in args.rate_limits:
+        try:
+            provider_limits.append(parse_rate_limit(rate_limit))
+        except ValueError as e:
+            parser.error(f"Invalid rate limit '{rate_limit}', use the format provider=requests:tokens:in_flight, for example: anthropic=50:40000:4; {e}")
+    
+    if args.hedge_model and args.hedge_model not in available_models:
+        parser.error(f"Hedge model '{args.hedge_model}' must be one of the available models: {models}")
+    if args.hedged_requests and args.hedge_model and args.provider_base_url and (args.hedge_model in anthropic_models) != (args.gpt_model in anthropic_models):
+        parser.error("Hedge model of the other provider can not be used with the provider base URL, because the base URL is of the provider of the selected model.")
+    
+    # Calls of a model without prices would not be counted in the cost or limited by the budget
+    selected_models = [args.gpt_model, args.summary_model, args.budget_fallback_model, args.hedge_model] + [rule["model"] for rule in router_rules]
+    for model in selected_models:
+        if model and model not in token_prices:
+            parser.error(f"Model '{model}' has no token prices in gpt_token_calculator, so its cost could not be counted.")
+    
+    if args.deferred_metadata and args.function_calling_tools:
+        parser.error("Deferred metadata can not be used with function calling tools, because the tools are deduced with the metadata.")
+    
     if audio_dir and not os.path.exists(audio_dir):
         os.makedirs(audio_dir, exist_ok=True)
             
     logger.info("Program started.")
-        
+    
+    startup_profile = args.startup_profile
+    
+    # Set the text embedding backend before the vector database is first used
+    embedding_backend = args.embedding_backend
+    
+    # Set the Anthropic Claude GPT model
+    gpt_model = args.gpt_model
+    
+    # Set the input token budget of the requests
+    context_token_budget = args.context_token_budget or get_context_token_budget(gpt_model)
+    context_window.token_budget = context_token_budget
+    tool_output_turns = args.tool_output_turns
+    context_window.tool_output_turns = tool_output_turns
+    
+    # Set the prompt caching of the Anthropic system messages
+    prompt_caching = args.prompt_caching
+    prompt_report = args.prompt_report
+    
+    # Set the maximum time the first turn waits for the warm-up
+    warm_up_timeout = args.warm_up_timeout
+    
+    # Select the provider of the model, and replace it with the local fake provider server when requested
+    provider_base_url = args.provider_base_url
+    fake_provider = args.fake_provider
+    fake_first_token_delay = args.fake_first_token_delay
+    fake_token_delay = args.fake_token_delay
+    llm_recordings = args.llm_recordings
+    if fake_provider:
+        # Flask is imported only when the fake provider is used
+        from .fake_provider_server import ServerThread as FakeProviderServerThread
+        fake_provider_server = FakeProviderServerThread(
+            recordings_file=llm_recordings or None,
+            first_token_delay=fake_first_token_delay,
+            token_delay=fake_token_delay
+        )
+        fake_provider_server.start()
+        def fake_provider_url(model):
+            """ Get the base URL of the provider API of the model on the fake provider server, which serves the OpenAI API under the /v1 path. """
+            return fake_provider_server.url if model in anthropic_models else f"{fake_provider_server.url}/v1"
+        provider_base_url = fake_provider_url(gpt_model)
+        provider_api_key = "fake"
+    request_timeout = args.request_timeout
+    # Calls of all the components to the same provider share its rate limiter
+    rate_limits = args.rate_limits
+    for provider_limit in provider_limits:
+        configure_rate_limiter(*provider_limit)
+    # Recordings are replayed, not recorded to, by the fake provider
+    record_file = llm_recordings if llm_recordings and not fake_provider else None
+    if gpt_model in anthropic_models:
+        gpt_provider = AnthropicProvider(gpt_client, record_file)
+    else:
+        gpt_provider = OpenAIProvider(gpt_client_openai, record_file)
+    
+    # Slow and failed calls are hedged, also with a model of the other provider
+    hedged_requests = args.hedged_requests
+    latency_slos = args.latency_slos
+    hedge_model = args.hedge_model
+    if hedged_requests:
+        if hedge_model and (hedge_model in anthropic_models) != (gpt_model in anthropic_models):
+            # Client of the other provider does not use the base URL of the selected model
+            hedge_base_url = fake_provider_url(hedge_model) if fake_provider else None
+            if hedge_model in anthropic_models:
+                hedge_client = LazyComponent("hedge_anthropic_client", lambda: create_anthropic_client(hedge_base_url, provider_api_key, request_timeout), startup_profiler)
+                hedge_provider = AnthropicProvider(hedge_client, record_file)
+            else:
+                hedge_client = LazyComponent("hedge_openai_client", lambda: create_openai_client(hedge_base_url, provider_api_key, request_timeout), startup_profiler)
+                hedge_provider = OpenAIProvider(hedge_client, record_file)
+        else:
+            hedge_provider = gpt_provider
+        gpt_provider = HedgedProvider(gpt_provider, hedge_provider, hedge_model, slos, count_discarded_usage)
+    
+    # Load and warm up the heavy components and the provider connection in the background,
+    # while the rest of the application, the voice output and the microphone calibration are initialized
+    warm_up.start("vector_db", warm_up_vector_db)
+    warm_up.start("gpt_connection", warm_up_gpt_client)
+    
+    # Load the recent responses to the response cache in the background
+    response_cache_enabled = args.response_cache
+    if response_cache_enabled:
+        response_cache_similarity = args.response_cache_similarity
+        response_cache_ttl = args.response_cache_ttl
+        response_cache = ResponseCache(vector_db.vectorize_text, response_cache_similarity, response_cache_ttl)
+        warm_up.start("response_cache", lambda: response_cache.load(
+            [unit for unit in vector_db.retrieve_recent_dialogue_units(response_cache_ttl) if unit["intent"] not in callbacks]
+        ))
+    
     if args.use_deepgram_streamer:
         # Initialize the Deepgram streamer
-        deepgram_streamer = DeepgramIO()
+        with startup_profiler.measure("tts_streamer"):
+            from .deepgramio import DeepgramIO
+            deepgram_streamer = DeepgramIO()
     else:
         # Set the output audio format for Eleven Labs
         elevenlabs_output_format = args.output_audio_format
@@ -1446,13 +2302,36 @@ def main():
             kwargs = {"sample_rate": elevenlabs_output_sample_rate, "bit_rate": elevenlabs_output_bit_rate, "audio_buffer_in_seconds": initial_buffer_size}
         
         # Initialize the Eleven Labs streamer with the appropriate arguments
-        elevenlabs_streamer = ElevenlabsIO(**kwargs)
+        with startup_profiler.measure("tts_streamer"):
+            elevenlabs_streamer = ElevenlabsIO(**kwargs)
     
     # Set the word buffer limit
     feedback_word_buffer_limit = args.feedback_limit
     
-    # Set the Anthropic Claude GPT model
-    gpt_model = args.gpt_model
+    # Feedback requests are debounced and run off the transcript thread
+    feedback_debounce = args.feedback_debounce
+    
+    # Event loop of the conversation debounces the feedback and executes the turns itself, see start_orchestrator
+    async_orchestrator = args.async_orchestrator
+    if not async_orchestrator:
+        feedback_scheduler = FeedbackScheduler(run_feedback, feedback_debounce)
+        # Final prompts, text prompts, summaries, and feedback modify the messages one at a time by priority
+        turn_scheduler = TurnScheduler()
+    
+    # Summaries are generated in the background with a cheap model, turns do not wait for them
+    summary_model = args.summary_model or (anthropic_models[-1] if args.gpt_model in anthropic_models else "gpt-3.5-turbo")
+    summary_worker = SummaryWorker(
+        lambda messages, system, max_tokens: gpt_retrieve_content(messages, system, max_tokens, summary_model, "summary"),
+        store_summary
+    )
+    
+    # Chunk summaries are merged into the discussion summaries, and those into the week or month digests
+    digest_period = args.digest_period
+    summary_tree = SummaryTree(
+        vector_db,
+        lambda messages, system, max_tokens: gpt_retrieve_content(messages, system, max_tokens, summary_model, "summary"),
+        digest_period
+    )
     
     # Initialize the tool chain with the selected GPT model
     #tool_chain = ToolChain(model=gpt_model)
@@ -1463,8 +2342,20 @@ def main():
     # Set the low confidence threshold for the command model
     low_confidence_threshold = args.low_confidence_threshold
     
+    # Set the response model routing rules
+    router_rules_file = args.router_rules
+    model_router = ModelRouter(router_rules, gpt_model)
+    
+    # Set the session spending limits
+    budget_soft_limit = args.budget_soft_limit
+    budget_hard_limit = args.budget_hard_limit
+    budget_purpose_limits = args.budget_purpose_limits
+    budget_fallback_model = args.budget_fallback_model
+    budget_governor = BudgetGovernor(budget_soft_limit, budget_hard_limit, purpose_limits, budget_fallback_model)
+    
     # Initialize token calculator for estimating GPT costs
-    gpt_token_calculator = GPTTokenCalculator()
+    usage_ledger = UsageLedger(vector_db)
+    gpt_token_calculator = GPTTokenCalculator(usage_ledger, budget_governor)
     
     # Set the Eleven Labs voice ID
     voice_id = args.voice_id
@@ -1488,6 +2379,10 @@ def main():
     # Disable Elevenlabs voice output
     disable_voice_output = args.disable_voice_output
     
+    # Open the text to speech websocket ahead of the first turn
+    if elevenlabs_streamer and not disable_voice_output:
+        warm_up.start("tts_connection", lambda: elevenlabs_streamer.preconnect(voice_id, voice_model_id))
+    
     # Disable Google voice recognition
     disable_voice_recognition = args.disable_voice_recognition
     
@@ -1520,19 +2415,52 @@ def main():
     audio_recorder_type = args.audio_recorder_type
     
     # Import the correct audio recorder module based on the command line recorder type argument
-    audio_recorder_class = import_audiorecorder_module(audio_recorder_type)
-    
-    # Initialize the AudioRecorder instance
-    audio_recorder = audio_recorder_class(language=args.language)
+    with startup_profiler.measure("audio_recorder"):
+        audio_recorder_class = import_audiorecorder_module(audio_recorder_type)
+        
+        # Initialize the AudioRecorder instance
+        audio_recorder = audio_recorder_class(language=args.language)
     
     # Initialize session id for the application via VectorDB class
-    session_id = vector_db.create_new_session()
-    
-    if not summary:
-        summary = vector_db.retrieve_last_discussion_summaries()
+    with startup_profiler.measure("session"):
+        session_id = vector_db.create_new_session()
+        
+        memory_retrieval = args.memory_retrieval
+        if not summary and not memory_retrieval:
+            # Summary of the previous discussion is a single precomputed node. Databases
+            # created before the summary nodes fall back to the latest chunk summaries
+            nodes = summary_tree.retrieve_summaries("discussion", discussion_id=vector_db.latest_discussion_id)
+            summary = nodes[0]["summary"] if nodes else vector_db.retrieve_last_discussion_summaries()
+    
+    # Relevant memory is retrieved per turn instead of the fixed previous discussion summaries
+    if memory_retrieval:
+        memory_top_k = args.memory_top_k
+        memory_token_budget = args.memory_token_budget
+        memory_retriever = MemoryRetriever(vector_db, memory_top_k, memory_token_budget)
+    
+    # Summaries of the earlier discussions are merged into the digests in the background, the turns do not wait for them
+    Thread(target=summary_tree.roll_up, args=(vector_db.current_discussion_id,), name="summary-roll-up", daemon=True).start()
+    
+    # Repeated metadata retrievals of the same message window return from the cache
+    metadata_cache_size = args.metadata_cache_size
+    if metadata_cache_size > 0:
+        metadata_cache_ttl = args.metadata_cache_ttl
+        metadata_cache_file = args.metadata_cache_file
+        metadata_cache = MetadataCache(metadata_cache_size, metadata_cache_ttl, metadata_cache_file or None)
+    
+    # Start the background metadata enrichment of the stored dialogue units
+    deferred_metadata = args.deferred_metadata
+    if deferred_metadata:
+        metadata_enricher = MetadataEnricher(
+            vector_db,
+            lambda messages, system, max_tokens: gpt_retrieve_content(messages, system, max_tokens, command_extraction_model)
+        )
     
     # Build up system metadata schema based on the function calling tools dependencities
-    tool_schemas, human_formatted_tools = render_selected_schemas(args.function_calling_tools)
+    compact_prompts = args.compact_prompts
+    tool_schemas, human_formatted_tools = render_selected_schemas(args.function_calling_tools, compact_prompts, args.schema_descriptions)
+    function_calling_tools_enabled = bool(tool_schemas)
+    tool_scheduler.timeout = args.tool_timeout
     system_message_metadata_schema = system_message_metadata_schema.replace("<<tools_part>>", system_message_metadata_schema_tools_part if tool_schemas else "")
     system_message_metadata = system_message_metadata.\
         replace("<<response_schema>>", system_message_metadata_schema).\
@@ -1540,48 +2468,72 @@ def main():
         replace("<<tools_epilogue>>", system_message_metadata_tools_epilogue if tool_schemas else "")
     
     logger.info(f"System message for metadata: {system_message_metadata}")
+    report_prompt_sections("Metadata", system_message_metadata, {
+        "response_schema": system_message_metadata_schema,
+        "tool_schemas": tool_schemas,
+        "tools_epilogue": system_message_metadata_tools_epilogue if tool_schemas else ""
+    })
     
     # Build up common system message
     system_message_tools_human_format = system_message_tools_human_format.replace("<<tools>>", human_formatted_tools) if tool_schemas else ""
+    persona_description = vector_db.retrieve_data_entry("key", "persona_description")[0].get("value", "")
+    if memory_retrieval:
+        # Content of the previous discussion is retrieved per turn, when relevant
+        previous_discussion = json.dumps({key: value for key, value in (vector_db.previous_discussion or {}).items() if key in ["discussion_id", "title", "starttime"]}, ensure_ascii=False, default=str)
+    elif compact_prompts:
+        # Empty fields are left out of the minified previous discussion
+        previous_discussion = json.dumps({key: value for key, value in (vector_db.previous_discussion or {}).items() if value not in (None, "", [], {})}, separators=(",", ":"), ensure_ascii=False, default=str)
+    else:
+        previous_discussion = str(vector_db.previous_discussion)
+    previous_context_summary = previous_context.replace("<<summary>>", summary) if summary else ""
     system_message = system_message.\
         replace("<<tools>>", system_message_tools_human_format).\
         replace("<<username>>", username).\
-        replace("<<persona_description>>", (vector_db.retrieve_data_entry("key", "persona_description")[0].get("value", ""))).\
+        replace("<<persona_description>>", persona_description).\
         replace("<<discussion_id>>", str(vector_db.current_discussion_id)).\
-        replace("<<previous_discussion>>", str(vector_db.previous_discussion)).\
+        replace("<<previous_discussion>>", previous_discussion).\
         replace("<<first_discussion_date>>", vector_db.first_discussion_date).\
-        replace("<<previous_context>>", previous_context.\
-            replace("<<summary>>", summary) if summary else "")
+        replace("<<previous_context>>", previous_context_summary)
     
     logger.info(f"System message: {system_message}")
-    
-    # Start the flush command listener thread
-    flush_thread = Thread(target=listen_for_flush_command, daemon=True)
-    flush_thread.start()
-    
-    # Create a thread targeting the activate_text_input function
-    input_thread = Thread(target=activate_text_input, daemon=True)
-    input_thread.start()
-    
-    # Create a thread targeting the activate_text_input function
-    summary_thread = Thread(target=summary_generator, daemon=True)
-    summary_thread.start()
-    
-    # Clear message history
-    clear_history_thread = Thread(target=clear_message_history, daemon=True)
-    clear_history_thread.start()
-    
-    # Short feedback
-    #short_feedback_thread = Thread(target=short_feedback, daemon=True)
-    #short_feedback_thread.start()
-    
-    # Start the word buffer manager thread
-    buffer_manager_thread = Thread(
-        target=manage_word_buffer, 
-        args=(audio_recorder.text_queue,), 
-        daemon=True
-    )
-    buffer_manager_thread.start()
+    report_prompt_sections("Response", system_message, {
+        "persona": persona_description,
+        "tools": system_message_tools_human_format,
+        "previous_discussion": previous_discussion,
+        "previous_context": previous_context_summary
+    })
+    
+    if async_orchestrator:
+        # Hotkeys and transcripts are handled on the event loop of the conversation
+        start_orchestrator()
+    else:
+        # Start the flush command listener thread
+        flush_thread = Thread(target=listen_for_flush_command, daemon=True)
+        flush_thread.start()
+        
+        # Create a thread targeting the activate_text_input function
+        input_thread = Thread(target=activate_text_input, daemon=True)
+        input_thread.start()
+        
+        # Create a thread targeting the activate_text_input function
+        summary_thread = Thread(target=summary_generator, daemon=True)
+        summary_thread.start()
+        
+        # Clear message history
+        clear_history_thread = Thread(target=clear_message_history, daemon=True)
+        clear_history_thread.start()
+        
+        # Short feedback
+        #short_feedback_thread = Thread(target=short_feedback, daemon=True)
+        #short_feedback_thread.start()
+        
+        # Start the word buffer manager thread
+        buffer_manager_thread = Thread(
+            target=manage_word_buffer, 
+            args=(audio_recorder.text_queue,), 
+            daemon=True
+        )
+        buffer_manager_thread.start()
     
     # ANSI escape codes for screen clear and cursor home
     print(chr(27) + "[2J" + chr(27) + "[;H")
@@ -1602,6 +2554,8 @@ def main():
         # Open server with audio directory and port
         # Start the Flask server in a separate thread
         if audio_stream:
+            # Flask is imported only when the audio files are streamed
+            from .audio_stream_server import ServerThread
             server_thread = ServerThread(host=audio_host, port=audio_port, audio_dir=audio_dir)
             server_thread.start()
             # Set the audio file source to the local server URL
@@ -1609,6 +2563,7 @@ def main():
             if not audio_file_source.startswith(('http://', 'https://')):
                 audio_file_source = f"http://{audio_host}:{audio_port}/stream_audio?filename={audio_file_source}"
 
+        start_readiness_report()
         # server_thread.join()
         # When server is running:
         audio_recorder.file_source(audio_file_source, stream=audio_stream)
@@ -1619,6 +2574,10 @@ def main():
             "calibration_time": calibration_time,
             "save_audio_to_file": save_audio_to_file
         }
+        # Report readiness and startup profile as soon as the listening has started,
+        # some recorders keep blocking in start_listening until the listening ends
+        kwargs["on_listening_started"] = start_readiness_report
+        kwargs["startup_profiler"] = startup_profiler
         blink_cursor()
         audio_recorder.start_listening(**kwargs)
         # Print the hotkeys for user interaction
@@ -1627,13 +2586,17 @@ def main():
     else:
         print(f"# You can enter text commands using {invert_text(hotkey_prompt)}.\n# To summarize dialogue, use {invert_text(hotkey_summarize)}.\n# Clear message history: {invert_text(hotkey_clear)}. Exit the bot: {invert_text(hotkey_exit)}.")
         print("############################################################\n")
+        start_readiness_report()
 
     #blink_cursor()
 
     try:
         # Keep the main thread alive
-        while audio_recorder.active:
-            time.sleep(1)
+        if orchestrator:
+            orchestrator.wait()
+        else:
+            while audio_recorder.active:
+                time.sleep(1)
     except KeyboardInterrupt:
         # Exit the program on keyboard interrupt
         audio_recorder.active = False
@@ -1641,10 +2604,34 @@ def main():
             server_thread.shutdown()
     finally:
         logger.info("Shutting down processes...")
-        # Check if there are messages left to be summarized
+        # Wait for the turn in execution before the final summary
+        if orchestrator:
+            orchestrator.stop()
+        else:
+            feedback_scheduler.stop()
+            turn_scheduler.stop()
+        # Check if there are messages left to be summarized, and wait for the queued summaries
         handle_summary_creation(final=True)
-        # Store token cost
-        vector_db.update_discussion_cost(gpt_token_calculator.get_cost())
+        summary_worker.stop()
+        # Enrich the rest of the dialogue units before the cost is stored
+        if metadata_enricher:
+            metadata_enricher.stop()
+        # Write the rest of the usage records, discussion cost is updated with them
+        usage_ledger.stop()
+        logger.info(f"Usage by purpose: {vector_db.retrieve_usage_summary()}")
+        if response_cache:
+            print(response_cache.report())
+            logger.info(response_cache.report())
+        if metadata_cache:
+            metadata_cache.save()
+            print(metadata_cache.report())
+            logger.info(metadata_cache.report())
+        if hedged_requests:
+            print(gpt_provider.report())
+            logger.info(gpt_provider.report())
+        if rate_limits:
+            print(rate_limit_report())
+            logger.info(rate_limit_report())
         # Cleanup the resources and exit the program
         logger.info("Rebuilding vector database index.")
         vector_db.rebuild_index()